@@ -0,0 +1,139 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from engine import Board
+from selfplay import Policy
+
+
+class AIDriver:
+    """Runs a policy on a worker thread so a UI loop never blocks on a search.
+
+    request() searches a copy of the board and hands the move to
+    on_move(move, generation) from the worker thread; the UI thread then
+    calls accept(generation), which is False for a result that has been
+    superseded. Every request, ponder or cancel starts a new generation, so
+    a cancelled search can finish in the background without its move being
+    played. When the policy's agent has a stop() method, cancelling also
+    cuts its search short. The next search waits for the stopped one to
+    finish and then calls resume(), so a stop can never be lost by
+    arriving before the search it targets has started.
+
+    If the policy raises, the driver stops thinking, keeps the exception in
+    error and calls on_move(None, generation) so the UI thread can report
+    it; the exception then propagates to threading.excepthook. The next
+    request, ponder or cancel clears error.
+
+    With ponder_limit > 0, ponder() keeps searching the opponent's position
+    for up to that many seconds. The MCTS agent reuses the resulting tree
+    and the alpha-beta agent its transposition table once the opponent has
+    moved.
+    """
+
+    def __init__(self, policy: Policy, on_move: Callable[[int, int], None],
+                 stop: Optional[Callable[[], None]] = None, ponder_limit: float = 0.0,
+                 resume: Optional[Callable[[], None]] = None):
+        self.policy = policy
+        self.on_move = on_move
+        self.stop = stop
+        self.resume = resume
+        self.ponder_limit = ponder_limit if stop is not None else 0.0
+        self.generation = 0
+        self.thinking = False
+        self.pondering = False
+        self.error = None  # exception of the latest failed search
+        self.lock = threading.Lock()
+        self.worker = None  # thread of the latest request or ponder
+        self.last_seconds = 0.0
+
+    def request(self, board: Board) -> int:
+        """Start searching board for a move and return the generation of the request"""
+        with self.lock:
+            generation = self.interrupt()
+            self.thinking = True
+            self.start_worker(self.search, board, generation, 'ai-search')
+        return generation
+
+    def ponder(self, board: Board):
+        """Search the opponent's position until the next request, cancel or ponder_limit"""
+        if self.ponder_limit <= 0:
+            return
+        with self.lock:
+            generation = self.interrupt()
+            self.pondering = True
+            self.start_worker(self.think_ahead, board, generation, 'ai-ponder')
+
+    def cancel(self):
+        """Abandon the search or ponder in progress"""
+        with self.lock:
+            self.interrupt()
+
+    def interrupt(self) -> int:
+        """Start a new generation and stop the running search; call with the lock held"""
+        self.generation += 1
+        if (self.thinking or self.pondering) and self.stop is not None:
+            self.stop()
+        self.thinking = self.pondering = False
+        self.error = None
+        return self.generation
+
+    def start_worker(self, target: Callable, board: Board, generation: int, name: str):
+        """Run target(board copy, generation, previous worker) on a new thread; call with the lock held"""
+        self.worker = threading.Thread(target=target, args=(board.copy(), generation, self.worker),
+                                       name=name, daemon=True)
+        self.worker.start()
+
+    def begin(self, generation: int, previous: Optional[threading.Thread]) -> bool:
+        """On the worker thread: let the previous search see its stop, resume the agent and say whether to run"""
+        if self.resume is None:
+            return self.current(generation)
+        if previous is not None:
+            previous.join()
+        with self.lock:
+            # interrupt() stops under the same lock, so no stop can slip in between
+            if not self.current(generation):
+                return False
+            self.resume()
+            return True
+
+    def current(self, generation: int) -> bool:
+        return generation == self.generation
+
+    def accept(self, generation: int) -> bool:
+        """Claim the move delivered for generation; False if it was cancelled or superseded"""
+        with self.lock:
+            if not (self.thinking and self.current(generation)):
+                return False
+            self.thinking = False
+            return True
+
+    def search(self, board: Board, generation: int, previous: Optional[threading.Thread]):
+        if not self.begin(generation, previous):
+            return
+        start = time.perf_counter()
+        try:
+            move = self.policy(board)
+        except BaseException as error:
+            # Without this the UI would wait on thinking forever
+            with self.lock:
+                failed = self.current(generation)
+                if failed:
+                    self.thinking = False
+                    self.error = error
+            if failed:
+                self.on_move(None, generation)
+            raise
+        if self.current(generation):
+            self.last_seconds = time.perf_counter() - start
+            self.on_move(move, generation)
+
+    def think_ahead(self, board: Board, generation: int, previous: Optional[threading.Thread]):
+        if not self.begin(generation, previous):
+            return
+        # Each call reuses the previous one's tree or table, so repeated searches keep deepening
+        deadline = time.monotonic() + self.ponder_limit
+        while self.current(generation) and time.monotonic() < deadline:
+            self.policy(board)
+        with self.lock:
+            if self.current(generation):
+                self.pondering = False
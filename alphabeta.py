@@ -0,0 +1,265 @@
+import random
+import threading
+import time
+from typing import List, Tuple
+
+from engine import LINES, MASK_CELLS, SUB_BOARD_STATES, TERNARY, Board, move_to_action
+
+WIN_SCORE = 1000000
+INFINITY = 10 * WIN_SCORE
+MATE_BOUND = WIN_SCORE - 100  # beyond this a score is a win or loss a known number of plies away (games last <= 81)
+
+# Evaluation weights, in points for the player the score is computed for
+SUB_BOARD_WEIGHT = 100   # per sub-board won
+META_THREAT_WEIGHT = 80  # per open meta-board line with two of our sub-boards
+THREAT_WEIGHT = 8        # per open sub-board line with two of our cells
+FREEDOM_WEIGHT = 30      # side to move may play anywhere
+
+# Transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def count_threats(own: int, other: int) -> int:
+    """Count lines holding two of own's cells and none of other's"""
+    return sum(1 for line in LINES if not other & line and len(MASK_CELLS[own & line]) == 2)
+
+
+# THREATS[TERNARY[x] + 2 * TERNARY[o]] is X's open two-in-a-lines minus O's, for every legal sub-board
+THREATS = [0] * SUB_BOARD_STATES
+for x_mask in range(512):
+    for o_mask in range(512):
+        if not x_mask & o_mask:
+            THREATS[TERNARY[x_mask] + 2 * TERNARY[o_mask]] = count_threats(x_mask, o_mask) - count_threats(o_mask, x_mask)
+THREATS = tuple(THREATS)
+
+# Zobrist keys: a mark of either player on any cell, the forced sub-board (-1..8) and the side to move
+zobrist_random = random.Random(20240601)
+ZOBRIST_CELL = tuple(tuple(zobrist_random.getrandbits(64) for _ in range(81)) for _ in range(2))
+ZOBRIST_FORCED = tuple(zobrist_random.getrandbits(64) for _ in range(10))
+ZOBRIST_SIDE = zobrist_random.getrandbits(64)
+
+
+def score_to_table(score: int, ply: int) -> int:
+    """Make a win/loss score counted from the root count from the node at ply instead"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score: int, ply: int) -> int:
+    """Inverse of score_to_table for a node probed at ply"""
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the deadline passes"""
+
+
+def zobrist_hash(board: Board) -> int:
+    """Compute the Zobrist hash of a position from scratch"""
+    h = ZOBRIST_FORCED[board.forced + 1]
+    if board.player:
+        h ^= ZOBRIST_SIDE
+    for p in range(2):
+        for b in range(9):
+            for c in MASK_CELLS[board.masks[p][b]]:
+                h ^= ZOBRIST_CELL[p][b * 9 + c]
+    return h
+
+
+def evaluate(board: Board) -> int:
+    """Score a non-terminal position for the player to move"""
+    xs, os_ = board.masks
+    x_meta, o_meta = board.meta
+    claimed = x_meta | o_meta
+    score = 0
+    for b in range(9):
+        if not claimed >> b & 1:
+            score += THREAT_WEIGHT * THREATS[TERNARY[xs[b]] + 2 * TERNARY[os_[b]]]
+    score += SUB_BOARD_WEIGHT * (len(MASK_CELLS[x_meta]) - len(MASK_CELLS[o_meta]))
+    score += META_THREAT_WEIGHT * THREATS[TERNARY[x_meta] + 2 * TERNARY[o_meta]]
+    if board.player:
+        score = -score
+    if board.forced < 0 or not board.empty[board.forced]:
+        score += FREEDOM_WEIGHT
+    return score
+
+
+class AlphaBetaAgent:
+    """Negamax alpha-beta searcher with iterative deepening under a per-move deadline.
+
+    Positions are hashed with Zobrist keys into a fixed-size transposition
+    table that keeps the deeper entry on collision unless the stored one is
+    from an older search. Moves are ordered by the table move, two killer
+    moves per ply and the history heuristic.
+    """
+
+    def __init__(self, time_limit: float = 0.2, max_depth: int = 64, table_bits: int = 18):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        size = 1 << table_bits
+        self.table_mask = size - 1
+        self.tt_key = [0] * size
+        self.tt_depth = [-1] * size
+        self.tt_score = [0] * size
+        self.tt_flag = [EXACT] * size
+        self.tt_move = [-1] * size
+        self.tt_age = [0] * size
+        self.age = 0
+        self.deadline = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()  # set by stop(), cleared only by resume()
+        self.last_stats = {}
+
+    def choose_action(self, main_board: List[List[str]], meta_board: List[List[str]],
+                      last_move: Tuple[int, int], current_player: str) -> Tuple[int, int, int, int]:
+        """Choose an action for the player to move within the search deadline"""
+        board = Board.from_lists(main_board, meta_board, last_move, current_player)
+        return move_to_action(self.choose_move(board))
+
+    def choose_move(self, board: Board) -> int:
+        """Search from an engine board with iterative deepening and return the best move found"""
+        with self.lock:
+            self.age += 1
+            self.nodes = 0
+            self.tt_probes = 0
+            self.tt_hits = 0
+            self.killers = [[-1, -1] for _ in range(self.max_depth + 1)]
+            self.history = [[0] * 81 for _ in range(2)]
+            start = time.perf_counter()
+            self.deadline = start + self.time_limit
+
+            h = zobrist_hash(board)
+            moves = board.legal_moves()
+            best_move, best_score, depth_reached = moves[0], 0, 0
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    move, score = self.search_root(board, h, depth, best_move)
+                except SearchTimeout:
+                    break
+                best_move, best_score, depth_reached = move, score, depth
+                if abs(score) >= WIN_SCORE - self.max_depth or depth >= board.empty_total:
+                    break
+
+            elapsed = time.perf_counter() - start
+            self.last_stats = {
+                'depth': depth_reached,
+                'score': best_score,
+                'nodes': self.nodes,
+                'nodes_per_second': self.nodes / elapsed if elapsed > 0 else 0.0,
+                'tt_hit_rate': self.tt_hits / self.tt_probes if self.tt_probes else 0.0,
+            }
+            return best_move
+
+    def stop(self):
+        """Make a running search return its best move so far; later searches stay cut short until resume()"""
+        self.stop_event.set()
+
+    def resume(self):
+        """Let searches run to their budget again; called by whoever starts the next search after a stop()"""
+        self.stop_event.clear()
+
+    def search_root(self, board: Board, h: int, depth: int, first_move: int) -> Tuple[int, int]:
+        """Search all root moves to depth, trying first_move first; return (best move, score)"""
+        moves = self.order_moves(board.legal_moves(), first_move, 0, board.player)
+        alpha, best_move = -INFINITY, moves[0]
+        for move in moves:
+            score = -self.negamax(board, self.child_hash(board, h, move), depth - 1, -INFINITY, -alpha, 1)
+            if score > alpha:
+                alpha, best_move = score, move
+        self.store(h, depth, alpha, EXACT, best_move)
+        return best_move, alpha
+
+    def child_hash(self, board: Board, h: int, move: int) -> int:
+        """Play move on board and return the updated hash; the caller undoes the move"""
+        h ^= ZOBRIST_CELL[board.player][move] ^ ZOBRIST_FORCED[board.forced + 1] ^ ZOBRIST_SIDE
+        board.play(move)
+        return h ^ ZOBRIST_FORCED[board.forced + 1]
+
+    def order_moves(self, moves: List[int], tt_move: int, ply: int, player: int) -> List[int]:
+        """Order moves: table move, then killers, then by history score"""
+        history = self.history[player]
+        killers = self.killers[ply]
+        moves = sorted(moves, key=lambda move: -history[move])
+        front = [move for move in (tt_move, killers[0], killers[1]) if move in moves]
+        if front:
+            front = list(dict.fromkeys(front))
+            moves = front + [move for move in moves if move not in front]
+        return moves
+
+    def store(self, h: int, depth: int, score: int, flag: int, move: int):
+        """Store an entry unless a deeper entry from the current search occupies the slot"""
+        i = h & self.table_mask
+        if self.tt_age[i] == self.age and self.tt_depth[i] > depth and self.tt_key[i] != h:
+            return
+        self.tt_key[i] = h
+        self.tt_depth[i] = depth
+        self.tt_score[i] = score
+        self.tt_flag[i] = flag
+        self.tt_move[i] = move
+        self.tt_age[i] = self.age
+
+    def negamax(self, board: Board, h: int, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Score the position (with the move just played) for the player to move, undoing that move on return"""
+        try:
+            self.nodes += 1
+            if not self.nodes & 1023 and (time.perf_counter() >= self.deadline or self.stop_event.is_set()):
+                raise SearchTimeout()
+            if board.winner >= 0:
+                # The player who just moved won
+                return -WIN_SCORE + ply
+            if not board.empty_total:
+                return 0
+            if depth <= 0:
+                return evaluate(board)
+
+            # Transposition table probe
+            self.tt_probes += 1
+            i = h & self.table_mask
+            tt_move = -1
+            if self.tt_key[i] == h and self.tt_depth[i] >= 0:
+                self.tt_hits += 1
+                tt_move = self.tt_move[i]
+                if self.tt_depth[i] >= depth:
+                    # Win/loss scores are stored relative to their node; this node may sit at another ply
+                    score, flag = score_from_table(self.tt_score[i], ply), self.tt_flag[i]
+                    if flag == EXACT:
+                        return score
+                    if flag == LOWER and score >= beta:
+                        return score
+                    if flag == UPPER and score <= alpha:
+                        return score
+
+            original_alpha = alpha
+            player = board.player
+            best_score, best_move = -INFINITY, -1
+            for move in self.order_moves(board.legal_moves(), tt_move, ply, player):
+                score = -self.negamax(board, self.child_hash(board, h, move), depth - 1, -beta, -alpha, ply + 1)
+                if score > best_score:
+                    best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    # Beta cutoff: remember the refutation
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1], killers[0] = killers[0], move
+                    self.history[player][move] += depth * depth
+                    break
+
+            if best_score <= original_alpha:
+                flag = UPPER
+            elif best_score >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self.store(h, depth, score_to_table(best_score, ply), flag, best_move)
+            return best_score
+        finally:
+            board.undo()
@@ -1,11 +1,83 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from medium import QLearningAgent
+from engine import Board, move_to_action
+from persistence import ModelStore
+from mapped_table import MappedQTable
+from parallel import ParallelMCTSAgent
+from alphabeta import AlphaBetaAgent
+from sessions import SessionStore
+from trainer import TrainingActor
+from replay import PrioritizedReplayBuffer
+from book import BOOK_FILE, OpeningBook
+from game_log import LOG_DIR, GameLog
+from perf import Gauge, Histogram, render
 import numpy as np
 import os
+import random
+import atexit
+import time
+
+TABLE_FILE = 'q_learning_model.qtb'
+# Optional hard ceilings for the in-memory Q-table; least used states are evicted beyond them
+QTABLE_MAX_STATES = int(os.environ.get('QTABLE_MAX_STATES', 0)) or None
+QTABLE_MAX_BYTES = int(os.environ.get('QTABLE_MAX_BYTES', 0)) or None
+# Transitions kept for prioritised replay; 0 turns replay off
+REPLAY_CAPACITY = int(os.environ.get('REPLAY_CAPACITY', 65536))
+# Directory of the append-only log of finished games
+GAME_LOG_DIR = os.environ.get('GAME_LOG_DIR', LOG_DIR)
 
 app = Flask(__name__)
-agent = QLearningAgent()
-agent.load_model()  # Load existing model if available
+agent = QLearningAgent(max_states=QTABLE_MAX_STATES, max_bytes=QTABLE_MAX_BYTES)
+agent.load_model()  # Load existing model (snapshot plus update log) if available
+if os.path.exists(TABLE_FILE):
+    # Shared read-only base table; the pickle snapshot and log hold changes on top of it
+    agent.attach_table(MappedQTable(TABLE_FILE))
+if REPLAY_CAPACITY:
+    agent.replay = PrioritizedReplayBuffer(REPLAY_CAPACITY)
+# "hard": UCT search capped at 200 ms per move, run on every core; created before any threads start
+mcts_agent = ParallelMCTSAgent(time_limit=0.2)
+atexit.register(mcts_agent.close)
+alphabeta_agent = AlphaBetaAgent(time_limit=0.2)  # "expert": iterative-deepening alpha-beta, 200 ms per move
+# Opening moves for every difficulty but easy come from the offline-searched book when one is built
+book = OpeningBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
+store = ModelStore(agent)  # Logs each update; fsyncs and snapshots in the background
+store.start()
+atexit.register(store.close)
+# Only the actor thread writes to agent; moves read the snapshots it publishes to actor.reader
+actor = TrainingActor(agent, max_queue=1000, batch_size=32)
+actor.start()
+atexit.register(actor.close)  # Runs before store.close, so queued updates reach the log
+agents = {'medium': actor.reader, 'hard': mcts_agent, 'expert': alphabeta_agent}
+DIFFICULTIES = ('easy',) + tuple(agents)  # Accepted by /api/move, /api/games and /api/train/batch
+sessions = SessionStore(max_sessions=10000, idle_timeout=1800)  # Games played through /api/games
+game_log = GameLog(GAME_LOG_DIR)  # Every finished session and browser game, for retraining and results
+atexit.register(game_log.close)
+
+# Performance metrics served by /api/perf
+request_seconds = Histogram('uttt_request_seconds', 'API request time by endpoint and phase', ('endpoint', 'phase'))
+choose_seconds = Histogram('uttt_choose_action_seconds', 'Move selection time by difficulty', ('difficulty',))
+search_agents = {'hard': mcts_agent, 'expert': alphabeta_agent}
+perf_metrics = [
+    request_seconds,
+    choose_seconds,
+    Gauge('uttt_qtable_entries', 'States in the Q-table, including the mapped base table', agent.count_states),
+    Gauge('uttt_qtable_bytes', 'Approximate memory held by the in-memory Q-table', agent.approximate_bytes),
+    Gauge('uttt_qtable_evictions', 'States evicted to keep the Q-table within its cap',
+          lambda: agent.learning_metrics.get('evicted_states', 0)),
+    Gauge('uttt_search_rate', 'Nodes (expert) or iterations (hard) per second of the last search',
+          lambda: {(name,): search.last_stats.get('nodes_per_second', search.last_stats.get('iterations_per_second', 0))
+                   for name, search in search_agents.items()}, ('difficulty',)),
+    Gauge('uttt_training_queue_depth', 'Training jobs waiting for the actor', actor.queue.qsize),
+    Gauge('uttt_training_rejected', 'Training jobs dropped because the queue stayed full', lambda: actor.rejected),
+    Gauge('uttt_replay_size', 'Transitions held in the replay buffer', lambda: len(agent.replay or ())),
+    Gauge('uttt_sessions', 'Live game sessions', lambda: len(sessions)),
+    Gauge('uttt_logged_games', 'Finished games in the game log', lambda: game_log.games),
+    Gauge('uttt_book_lookups', 'Opening book lookups of in-book plies by result',
+          lambda: {('hit',): book.hits, ('miss',): book.misses} if book is not None else {}, ('result',)),
+    actor.job_seconds,
+    store.flush_seconds,
+    store.snapshot_seconds,
+]
 
 @app.route('/')
 def serve_index():
@@ -19,39 +91,136 @@ def serve_css(path):
 def serve_js(path):
     return send_from_directory('js', path)
 
+WIRE_FORMATS = ('lists', 'string', 'packed')
+
+def decode_position(data):
+    """Decode a request's position straight into the engine in the format it names.
+
+    'lists': mainBoard/metaBoard arrays with lastMove and currentPlayer;
+    'string': a 93-character state string (Board.to_state_string);
+    'packed': the base-3 packed integer of Board.key(), sent as a decimal string.
+    Raises ValueError for a missing or malformed position in any format.
+    """
+    wire_format = data.get('format', 'lists')
+    if wire_format == 'string':
+        position = data.get('position')
+        if not isinstance(position, str):
+            raise ValueError('position must be a state string')
+        return Board.from_state_string(position)
+    if wire_format == 'packed':
+        position = data.get('position')
+        if not isinstance(position, (str, int)) or isinstance(position, bool):
+            raise ValueError('position must be a packed key as a decimal string')
+        try:
+            key = int(position)
+        except ValueError:
+            raise ValueError('position must be a packed key as a decimal string') from None
+        return Board.from_key(key)
+    main_board, meta_board = data.get('mainBoard'), data.get('metaBoard')
+    last_move, current_player = data.get('lastMove'), data.get('currentPlayer')
+    if not is_grid(main_board, 9) or not is_grid(meta_board, 3):
+        raise ValueError('mainBoard must be 9x9 and metaBoard 3x3')
+    if last_move is not None and not (isinstance(last_move, list) and len(last_move) == 2
+                                      and all(type(v) is int and 0 <= v < 3 for v in last_move)):
+        raise ValueError('lastMove must be null or [row, col] of a sub-board')
+    if current_player not in ('X', 'O'):
+        raise ValueError('currentPlayer must be X or O')
+    try:
+        return Board.from_lists(main_board, meta_board, last_move, current_player)
+    except TypeError:
+        raise ValueError('board cells must be strings or null') from None
+
+def is_grid(rows, size):
+    """Whether rows is a size x size list of lists"""
+    return isinstance(rows, list) and len(rows) == size and all(isinstance(row, list) and len(row) == size
+                                                                  for row in rows)
+
+def encode_position(board, wire_format):
+    """Response fields for a position in the requested format"""
+    if wire_format == 'string':
+        return {'position': board.to_state_string()}
+    if wire_format == 'packed':
+        # Decimal string: the key does not fit in a JavaScript number
+        return {'position': str(board.key())}
+    main_board, meta_board = board.to_lists('')
+    return {'mainBoard': main_board, 'metaBoard': meta_board}
+
+def decode_state(state, wire_format):
+    """Decode a training state into the engine: packed keys arrive as decimal strings, other formats as state strings.
+
+    Raises ValueError for a malformed state, so the request thread can reject it before it is queued.
+    """
+    if wire_format == 'packed':
+        if not isinstance(state, (str, int)) or isinstance(state, bool):
+            raise ValueError('state must be a packed key as a decimal string')
+        try:
+            return Board.from_key(int(state))
+        except ValueError:
+            raise ValueError(f'malformed packed state {state!r}') from None
+    if not isinstance(state, str):
+        raise ValueError('state must be a state string')
+    return Board.from_state_string(state)
+
+def is_action(action):
+    """Whether action is a [subBoardI, subBoardJ, subI, subJ] list of ints 0-2"""
+    return isinstance(action, list) and len(action) == 4 and all(type(v) is int and 0 <= v < 3 for v in action)
+
+def decode_transition(data):
+    """Validate a /api/train body into (state, action, reward, next_state, next_valid_actions); raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('body must be a JSON object')
+    wire_format = data.get('format', 'string')
+    if wire_format not in ('string', 'packed'):
+        raise ValueError(f'unknown format {wire_format}')
+    missing = [name for name in ('state', 'action', 'reward', 'nextState', 'nextValidActions') if name not in data]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)}')
+    state = decode_state(data['state'], wire_format)
+    next_state = decode_state(data['nextState'], wire_format)
+    if not is_action(data['action']):
+        raise ValueError('action must be [subBoardI, subBoardJ, subI, subJ]')
+    action = tuple(data['action'])  # Convert list to tuple for dictionary key
+    reward = data['reward']
+    if isinstance(reward, bool) or not isinstance(reward, (int, float)) or not np.isfinite(reward):
+        raise ValueError('reward must be a finite number')
+    next_valid_actions = data['nextValidActions']
+    if not isinstance(next_valid_actions, list) or not all(map(is_action, next_valid_actions)):
+        raise ValueError('nextValidActions must be a list of actions')
+    # Checked against the published snapshot: an action the actor would skip is the client's error
+    if actor.reader.action_index(state, action)[1] < 0:
+        raise ValueError('action is not legal in state')
+    return state, action, float(reward), next_state, [tuple(action) for action in next_valid_actions]
+
 @app.route('/api/move', methods=['POST'])
 def make_move():
+    start = time.perf_counter()
     data = request.json
-    main_board = data['mainBoard']
-    meta_board = data['metaBoard']
-    last_move = data.get('lastMove')
-    current_player = data['currentPlayer']
+    wire_format = data.get('format', 'lists')
+    if wire_format not in WIRE_FORMATS:
+        return jsonify({'status': 'error', 'message': f'unknown format {wire_format}'}), 400
+    difficulty = data.get('difficulty', 'medium')
+    if difficulty not in DIFFICULTIES:
+        return unknown_difficulty(difficulty)
     
-    # Convert empty strings to spaces for consistency
-    main_board = [[cell if cell else ' ' for cell in row] for row in main_board]
-    meta_board = [[cell if cell else ' ' for cell in row] for row in meta_board]
+    # Decode the position straight into the engine; '' and None count as empty
+    try:
+        board = decode_position(data)
+    except ValueError as error:
+        return jsonify({'status': 'error', 'message': str(error)}), 400
+    if not board.legal_moves():
+        return jsonify({'status': 'error', 'message': 'the game is already over'}), 400
+    parsed = time.perf_counter()
     
     # Get AI move
-    action = agent.choose_action(main_board, meta_board, last_move, current_player)
-    
-    # Make the move
-    sub_board_i, sub_board_j, sub_i, sub_j = action
-    main_board[sub_board_i * 3 + sub_i][sub_board_j * 3 + sub_j] = current_player
+    move = choose_move(difficulty, board)
+    decided = time.perf_counter()
+    sub_board_i, sub_board_j, sub_i, sub_j = move_to_action(move)
     
-    # Update meta board if sub-board is won
-    from medium import get_sub_board, check_winner
-    sub_board = get_sub_board(main_board, sub_board_i, sub_board_j)
-    winner = check_winner(sub_board)
-    if winner != ' ':
-        meta_board[sub_board_i][sub_board_j] = winner
+    # Make the move; the engine updates the meta board if the sub-board is won
+    board.play(move)
     
-    # Convert spaces back to empty strings for frontend
-    main_board = [[cell if cell != ' ' else '' for cell in row] for row in main_board]
-    meta_board = [[cell if cell != ' ' else '' for cell in row] for row in meta_board]
-    
-    return jsonify({
-        'mainBoard': main_board,
-        'metaBoard': meta_board,
+    response = jsonify({
+        **encode_position(board, wire_format),
         'move': {
             'subBoardI': sub_board_i,
             'subBoardJ': sub_board_j,
@@ -59,29 +228,170 @@ def make_move():
             'subJ': sub_j
         }
     })
+    done = time.perf_counter()
+    request_seconds.observe(parsed - start, 'move', 'parse')
+    request_seconds.observe(decided - parsed, 'move', 'decide')
+    request_seconds.observe(done - decided, 'move', 'serialise')
+    choose_seconds.observe(decided - parsed, difficulty)
+    return response
+
+def choose_move(difficulty, board):
+    """A random move for easy; otherwise the opening book's move while the game is in book, then the difficulty's agent"""
+    if difficulty == 'easy':
+        return random.choice(board.legal_moves())
+    if book is not None:
+        move = book.lookup(board)
+        if move is not None:
+            return move
+    return agents[difficulty].choose_move(board)
+
+def unknown_difficulty(difficulty):
+    return jsonify({'status': 'error', 'message': f'unknown difficulty {difficulty}'}), 400
+
+def busy_response():
+    """Backpressure: the training queue stayed full, ask the client to retry later"""
+    response = jsonify({'status': 'busy', 'queueDepth': actor.queue.qsize()})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @app.route('/api/train', methods=['POST'])
 def train_model():
-    data = request.json
-    state = data['state']
-    action = tuple(data['action'])  # Convert list to tuple for dictionary key
-    reward = data['reward']
-    next_state = data['nextState']
-    next_valid_actions = [tuple(action) for action in data['nextValidActions']]  # Convert lists to tuples
+    start = time.perf_counter()
+    try:
+        state, action, reward, next_state, next_valid_actions = decode_transition(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify({'status': 'error', 'message': str(error)}), 400
+    parsed = time.perf_counter()
+    
+    # Queue the validated update for the training actor; the store persists it asynchronously
+    if not actor.submit(agent.update, state, action, reward, next_state, next_valid_actions):
+        return busy_response()
+    decided = time.perf_counter()
     
-    # Update the Q-learning model
-    agent.update(state, action, reward, next_state, next_valid_actions)
+    response = jsonify({'status': 'success'})
+    request_seconds.observe(parsed - start, 'train', 'parse')
+    request_seconds.observe(decided - parsed, 'train', 'decide')
+    request_seconds.observe(time.perf_counter() - decided, 'train', 'serialise')
+    return response
+
+@app.route('/api/train/batch', methods=['POST'])
+def train_batch():
+    """Train on whole games: {"trajectories": [{"states", "actions", "rewards"}, ...]} or a single trajectory"""
+    data = request.json
+    trajectories = data.get('trajectories', [data])
+    n_step = int(data.get('nStep', 1))
+    monte_carlo = bool(data.get('monteCarlo', False))
+    if data.get('format') == 'packed':
+        for trajectory in trajectories:
+            trajectory['states'] = [int(state) for state in trajectory['states']]
+    for trajectory in trajectories:
+        if trajectory.get('difficulty', 'medium') not in DIFFICULTIES:
+            return unknown_difficulty(trajectory['difficulty'])
     
-    # Save the updated model and metrics
-    agent.save_model()
+    # One job for the whole request, so a rejected request can be retried without duplicates
+    if not actor.submit(apply_trajectories, trajectories, n_step, monte_carlo):
+        return busy_response()
+    for trajectory in trajectories:
+        if 'moves' in trajectory:
+            # The browser's AI plays O unless the client says otherwise
+            record_game(trajectory['moves'], 0 if trajectory.get('aiPlayer') == 'X' else 1,
+                        trajectory.get('difficulty', 'medium'))
     
-    return jsonify({'status': 'success'})
+    return jsonify({'status': 'success', 'games': len(trajectories)})
+
+def apply_trajectories(trajectories, n_step, monte_carlo):
+    """Training actor job for /api/train/batch"""
+    for trajectory in trajectories:
+        actions = [tuple(action) for action in trajectory['actions']]
+        agent.update_trajectory(trajectory['states'], actions, trajectory['rewards'],
+                                n_step=n_step, monte_carlo=monte_carlo)
+
+def record_game(moves, ai_player, difficulty):
+    """Append a finished game to the game log; False if the moves are not a legal, finished game"""
+    try:
+        game_log.append(moves, ai_player, difficulty)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def ai_reply(session):
+    """Play the AI's move in a session and, once the game is over, train the medium agent on it"""
+    board = session.board
+    move = choose_move(session.difficulty, board)
+    if session.difficulty == 'medium':
+        session.entries.append(actor.reader.action_index(board, move_to_action(move)))
+    board.play(move)
+    return move
+
+def session_state(session, move=None):
+    """Response body for a session: the AI's move index, whose turn it is and the result"""
+    board = session.board
+    winner = board.winner_mark()
+    if session.is_over() and not session.logged:
+        record_game([entry[0] for entry in board.history], session.ai_player, session.difficulty)
+        session.logged = True
+    body = {
+        'gameId': session.id,
+        'move': move,
+        'forced': board.forced if board.forced >= 0 and board.empty[board.forced] else None,
+        'currentPlayer': 'XO'[board.player],
+        'winner': winner,
+        'draw': winner is None and board.is_full()
+    }
+    if session.is_over() and session.entries:
+        rewards = [0.0] * len(session.entries)
+        rewards[-1] = 0.0 if board.winner < 0 else (1.0 if board.winner == session.ai_player else -1.0)
+        if not actor.submit(agent.update_entries, session.entries, rewards):
+            # The queue stayed full: the game is still logged, but the medium agent does not learn from it
+            body['trainingDropped'] = True
+        session.entries = []
+    return jsonify(body)
+
+@app.route('/api/games', methods=['POST'])
+def create_game():
+    """Start a server-side game: {"difficulty", "aiFirst"}; moves are cell indices 0-80 (sub-board * 9 + cell)"""
+    data = request.get_json(silent=True) or {}
+    ai_first = bool(data.get('aiFirst', False))
+    difficulty = data.get('difficulty', 'medium')
+    if difficulty not in DIFFICULTIES:
+        return unknown_difficulty(difficulty)
+    session = sessions.create(difficulty, 0 if ai_first else 1)
+    with session.lock:
+        move = ai_reply(session) if ai_first else None
+        return session_state(session, move)
+
+@app.route('/api/games/<game_id>/move', methods=['POST'])
+def play_game_move(game_id):
+    """Play the human's move {"move": index} and return the AI's reply"""
+    session = sessions.get(game_id)
+    if session is None:
+        return jsonify({'status': 'error', 'message': 'unknown or expired game'}), 404
+    move = request.json.get('move')
+    with session.lock:
+        board = session.board
+        if session.is_over() or board.player == session.ai_player or not isinstance(move, int) or not 0 <= move < 81 or not board.is_legal(move):
+            return jsonify({'status': 'error', 'message': 'illegal move'}), 400
+        board.play(move)
+        reply = None if session.is_over() else ai_reply(session)
+        return session_state(session, reply)
+
+@app.route('/api/games/<game_id>', methods=['DELETE'])
+def end_game(game_id):
+    """Drop a session early"""
+    return jsonify({'status': 'success' if sessions.remove(game_id) else 'unknown'})
 
 @app.route('/api/metrics', methods=['GET'])
 def get_metrics():
     """Get the current learning metrics"""
-    metrics = agent.get_metrics()
+    metrics = dict(agent.get_metrics(), training_queue=actor.get_metrics(), game_log=game_log.get_metrics())
+    if agent.replay is not None:
+        metrics['replay'] = agent.replay.get_metrics()
     return jsonify(metrics)
 
+@app.route('/api/perf', methods=['GET'])
+def get_perf():
+    """Latency histograms and agent internals in the Prometheus text format"""
+    return Response(render(perf_metrics), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
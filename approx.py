@@ -0,0 +1,382 @@
+import argparse
+import os
+import pickle
+import random
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from engine import LINES, WIN_TABLE, Board, action_to_move, legal_actions, move_to_action
+from medium import discounted_returns
+from persistence import write_snapshot
+from selfplay import OPPONENTS, Policy, random_policy
+
+# OPEN_TWOS[own, other] counts lines holding two of own's cells and none of other's
+_line_own = np.array([[bin(mask & line).count('1') for line in LINES] for mask in range(512)])
+_line_free = np.array([[not mask & line for line in LINES] for mask in range(512)])
+OPEN_TWOS = ((_line_own[:, None, :] == 2) & _line_free[None, :, :]).sum(axis=2).astype(np.int8)
+WINS = np.array(WIN_TABLE)
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(512)])
+CELL_BITS = 1 << np.arange(9)
+
+FEATURES = (
+    'bias',
+    'claims_sub_board',       # the move completes a line in an unclaimed sub-board
+    'wins_game',
+    'own_twos_made',          # open two-in-a-lines created in the sub-board played
+    'opponent_twos_blocked',  # opponent open twos removed from it
+    'sub_boards_ahead',       # sub-boards won minus sub-boards lost
+    'meta_twos',              # own open twos on the meta-board
+    'opponent_meta_twos',
+    'own_twos',               # own open twos over all unclaimed sub-boards
+    'opponent_twos',
+    'opponent_free_move',     # the opponent's next sub-board is full, so they may play anywhere
+    'sends_to_claimed',       # the opponent's next sub-board is already claimed
+    'opponent_can_claim',     # the opponent has an open two in their next sub-board
+    'opponent_can_win',       # ... and claiming it would win them the game
+    'own_twos_in_next',       # own open twos the opponent has to answer in their next sub-board
+    'centre_cell',
+    'corner_cell',
+    'centre_sub_board',
+)
+NUM_FEATURES = len(FEATURES)
+
+
+def extract_features(board: Board, moves: List[int]) -> np.ndarray:
+    """(len(moves), NUM_FEATURES) features of each move, seen by the player making it"""
+    p = board.player
+    own = np.array(board.masks[p])
+    opp = np.array(board.masks[p ^ 1])
+    own_meta, opp_meta = board.meta[p], board.meta[p ^ 1]
+    claimed = own_meta | opp_meta
+    unclaimed = (claimed & CELL_BITS) == 0
+    empty = np.array(board.empty)
+    dead = int(((empty == 0) & unclaimed) @ CELL_BITS)  # full sub-boards nobody claimed
+
+    moves = np.asarray(moves)
+    b = moves // 9
+    c = moves % 9
+    bit = CELL_BITS[c]
+    own_b = own[b] | bit
+    was_open = unclaimed[b]
+    claims = WINS[own_b] & was_open
+    new_meta = own_meta | (claims * CELL_BITS[b])
+    new_dead = dead | ((empty[b] == 1) & was_open & ~claims) * CELL_BITS[b]
+
+    own_before = OPEN_TWOS[own[b], opp[b]].astype(np.int64)
+    own_after = OPEN_TWOS[own_b, opp[b]].astype(np.int64)
+    opp_before = OPEN_TWOS[opp[b], own[b]].astype(np.int64)
+    opp_after = OPEN_TWOS[opp[b], own_b].astype(np.int64)
+    own_total = int(OPEN_TWOS[own, opp] @ unclaimed)
+    opp_total = int(OPEN_TWOS[opp, own] @ unclaimed)
+    # The sub-board played changes its count, and stops counting once claimed
+    own_total = own_total + (own_after - own_before) * was_open - own_after * claims
+    opp_total = opp_total + (opp_after - opp_before) * was_open - opp_after * claims
+
+    same = b == c
+    own_c = own[c] | np.where(same, bit, 0)
+    free = empty[c] - same == 0
+    c_open = unclaimed[c] & ~(claims & same)
+    opp_threat = ~free & c_open & (OPEN_TWOS[opp[c], own_c] > 0)
+
+    features = np.empty((len(moves), NUM_FEATURES))
+    features[:, 0] = 1.0
+    features[:, 1] = claims
+    features[:, 2] = WINS[new_meta]
+    features[:, 3] = (own_after - own_before) / 2.0
+    features[:, 4] = (opp_before - opp_after) / 2.0
+    features[:, 5] = (POPCOUNT[new_meta] - POPCOUNT[opp_meta]) / 3.0
+    features[:, 6] = OPEN_TWOS[new_meta, opp_meta | new_dead] / 2.0
+    features[:, 7] = OPEN_TWOS[opp_meta, new_meta | new_dead] / 2.0
+    features[:, 8] = own_total / 8.0
+    features[:, 9] = opp_total / 8.0
+    features[:, 10] = free
+    features[:, 11] = ~c_open
+    features[:, 12] = opp_threat
+    features[:, 13] = opp_threat & WINS[opp_meta | CELL_BITS[c]]
+    features[:, 14] = OPEN_TWOS[own_c, opp[c]] * c_open / 2.0
+    features[:, 15] = c == 4
+    features[:, 16] = (c % 2 == 0) & (c != 4)
+    features[:, 17] = b == 4
+    return features
+
+
+class ApproxQAgent:
+    """Q-learning with a small function approximator in place of the Q-table.
+
+    Every legal move is described by NUM_FEATURES hand-made features of the
+    position after it, and Q-values come from a linear model (hidden=0) or
+    a one-hidden-layer tanh MLP, scored for all legal moves in one matrix
+    product. Training targets are collected and applied in minibatches of
+    batch_size with plain SGD. The model is a few hundred floats whatever
+    the amount of training, so lookups cost the same for every position
+    and the model file stays a few KB.
+    """
+
+    def __init__(self, learning_rate=0.01, discount_factor=0.95, epsilon=0.1, epsilon_decay=0.995, epsilon_min=0.01,
+                 hidden=0, batch_size=32, seed=None):
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.epsilon = epsilon
+        self.epsilon_decay = epsilon_decay
+        self.epsilon_min = epsilon_min
+        self.hidden = hidden
+        self.batch_size = batch_size
+        self.weights = self.init_weights(hidden, np.random.default_rng(seed))
+        self.pending_features = []
+        self.pending_targets = []
+        self.learning_metrics = {
+            'total_games': 0,
+            'wins': 0,
+            'losses': 0,
+            'draws': 0,
+            'win_rate': 0,
+            'average_reward': 0,
+            'total_updates': 0,
+            'exploration_rate': self.epsilon
+        }
+        self.reward_sum = 0.0
+        self.reward_count = 0
+
+    @staticmethod
+    def init_weights(hidden: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        if not hidden:
+            return {'w': np.zeros(NUM_FEATURES)}  # the bias is a feature
+        return {
+            'w1': rng.standard_normal((NUM_FEATURES, hidden)) / np.sqrt(NUM_FEATURES),
+            'b1': np.zeros(hidden),
+            'w2': rng.standard_normal(hidden) / np.sqrt(hidden),
+            'b2': np.zeros(1),
+        }
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Q-value of each row of features"""
+        w = self.weights
+        if not self.hidden:
+            return features @ w['w']
+        return np.tanh(features @ w['w1'] + w['b1']) @ w['w2'] + w['b2'][0]
+
+    def sgd_step(self, features: np.ndarray, targets: np.ndarray):
+        """One SGD step on the mean squared error of a minibatch"""
+        w = self.weights
+        lr = self.learning_rate / len(targets)
+        if not self.hidden:
+            w['w'] -= lr * (features.T @ (features @ w['w'] - targets))
+            return
+        hidden = np.tanh(features @ w['w1'] + w['b1'])
+        error = hidden @ w['w2'] + w['b2'][0] - targets
+        hidden_error = np.outer(error, w['w2']) * (1.0 - hidden ** 2)
+        w['w2'] -= lr * (hidden.T @ error)
+        w['b2'] -= lr * error.sum()
+        w['w1'] -= lr * (features.T @ hidden_error)
+        w['b1'] -= lr * hidden_error.sum(axis=0)
+
+    def state_board(self, state: Union[int, str, Board]) -> Board:
+        """Decode a state given as a packed integer key, a state string or a board"""
+        if isinstance(state, Board):
+            return state
+        if isinstance(state, str):
+            return Board.from_state_string(state)
+        return Board.from_key(state)
+
+    def q_values(self, board: Board, moves: Optional[List[int]] = None) -> Tuple[List[int], np.ndarray]:
+        """(moves, Q-value of each) for the legal moves of board, or the given ones"""
+        if moves is None:
+            moves = board.legal_moves()
+        if not moves:
+            return moves, np.zeros(0)
+        return moves, self.predict(extract_features(board, moves))
+
+    def get_valid_actions(self, main_board: List[List[str]], meta_board: List[List[str]],
+                          last_move: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """Get all valid actions for the current state"""
+        return legal_actions(main_board, meta_board, last_move)
+
+    def choose_action(self, main_board: List[List[str]], meta_board: List[List[str]],
+                      last_move: Tuple[int, int], current_player: str) -> Tuple[int, int, int, int]:
+        """Choose an action using epsilon-greedy policy"""
+        board = Board.from_lists(main_board, meta_board, last_move, current_player)
+        return move_to_action(self.choose_move(board))
+
+    def choose_move(self, board: Board) -> int:
+        """Choose a move index on an engine board using epsilon-greedy policy"""
+        moves = board.legal_moves()
+        if random.random() < self.epsilon:
+            return random.choice(moves)
+        moves, q_values = self.q_values(board, moves)
+        return moves[random.choice(np.flatnonzero(q_values == q_values.max()))]
+
+    def max_q_value(self, state: Union[int, str, Board], valid_actions: List[Tuple[int, int, int, int]]) -> float:
+        """Get the best Q-value among the given actions, 0 for terminal states"""
+        if not valid_actions:
+            return 0.0
+        board = self.state_board(state)
+        legal = set(board.legal_moves())
+        moves = [move for move in map(action_to_move, valid_actions) if move in legal]
+        return float(self.q_values(board, moves)[1].max()) if moves else 0.0
+
+    def learn(self, features: np.ndarray, targets: np.ndarray):
+        """Queue training rows and take an SGD step for every full minibatch"""
+        self.pending_features.append(features)
+        self.pending_targets.append(targets)
+        self.learning_metrics['total_updates'] += len(targets)
+        if sum(len(t) for t in self.pending_targets) < self.batch_size:
+            return
+        features = np.concatenate(self.pending_features)
+        targets = np.concatenate(self.pending_targets)
+        self.pending_features, self.pending_targets = [], []
+        for start in range(0, len(targets), self.batch_size):
+            self.sgd_step(features[start:start + self.batch_size], targets[start:start + self.batch_size])
+
+    def update(self, state: Union[int, str, Board], action: Tuple[int, int, int, int],
+               reward: float, next_state: Union[int, str, Board], next_valid_actions: List[Tuple[int, int, int, int]]):
+        """Queue one Q-learning target: reward plus the discounted best Q-value of next_state"""
+        board = self.state_board(state)
+        move = action_to_move(action)
+        if board.is_legal(move):
+            target = reward + self.discount_factor * self.max_q_value(next_state, next_valid_actions)
+            self.learn(extract_features(board, [move]), np.array([target]))
+        self.update_metrics(reward, not next_valid_actions)
+
+    def update_trajectory(self, states: List[Union[int, str, Board]], actions: List[Tuple[int, int, int, int]],
+                          rewards: List[float], n_step: int = 1, monte_carlo: bool = False) -> int:
+        """Learn from one finished game: the agent's states, its actions and the reward after each.
+
+        Targets are n-step returns bootstrapped from the best Q-value n moves
+        later, or full Monte Carlo returns. Returns the number of targets queued.
+        """
+        boards = [self.state_board(state) for state in states]
+        moves = [action_to_move(action) for action in actions]
+        rewards = np.asarray(rewards, dtype=np.float64)
+        horizon = len(rewards) if monte_carlo else max(1, n_step)
+        targets = discounted_returns(rewards, self.discount_factor, horizon)
+        bootstrap_discount = self.discount_factor ** horizon
+
+        rows = []
+        for t, (board, move) in enumerate(zip(boards, moves)):
+            if not board.is_legal(move):
+                continue
+            if t + horizon < len(boards):
+                next_q = self.q_values(boards[t + horizon])[1]
+                if len(next_q):
+                    targets[t] += bootstrap_discount * float(next_q.max())
+            rows.append(t)
+        if rows:
+            features = np.concatenate([extract_features(boards[t], [moves[t]]) for t in rows])
+            self.learn(features, targets[rows])
+        self.update_metrics(float(rewards[-1]) if len(rewards) else 0.0, True)
+        return len(rows)
+
+    def update_metrics(self, reward: float, is_game_over: bool):
+        """Count finished games and keep a running average of rewards"""
+        self.reward_sum += reward
+        self.reward_count += 1
+        self.learning_metrics['average_reward'] = self.reward_sum / self.reward_count
+        if not is_game_over:
+            return
+        metrics = self.learning_metrics
+        metrics['total_games'] += 1
+        if reward == 1.0:
+            metrics['wins'] += 1
+        elif reward == -1.0:
+            metrics['losses'] += 1
+        else:
+            metrics['draws'] += 1
+        metrics['win_rate'] = metrics['wins'] / metrics['total_games']
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+        metrics['exploration_rate'] = self.epsilon
+
+    def get_metrics(self):
+        """Get current learning metrics"""
+        return self.learning_metrics
+
+    def save_model(self, filename: str = 'approx_model.pkl'):
+        """Save the weights and metrics to a file"""
+        write_snapshot(filename, {
+            'features': FEATURES,
+            'hidden': self.hidden,
+            'weights': self.weights,
+            'metrics': self.learning_metrics,
+            'epsilon': self.epsilon,
+        })
+
+    def load_model(self, filename: str = 'approx_model.pkl'):
+        """Load the weights and metrics from a file, if it exists"""
+        if not (os.path.exists(filename) and os.path.getsize(filename)):
+            return
+        with open(filename, 'rb') as f:
+            save_data = pickle.load(f)
+        if tuple(save_data.get('features', ())) != FEATURES:
+            raise ValueError(f"{filename} was trained on a different feature set")
+        self.hidden = save_data['hidden']
+        self.weights = save_data['weights']
+        self.learning_metrics.update(save_data.get('metrics', {}))
+        self.epsilon = save_data.get('epsilon', self.epsilon)
+        self.learning_metrics['exploration_rate'] = self.epsilon
+
+
+def play_game(agent: ApproxQAgent, opponent: Optional[Policy], agent_player: int) -> int:
+    """Play one training game, learn from the agent's side(s) and return the winner index"""
+    board = Board()
+    history = ([], [])
+    while board.legal_moves():
+        player = board.player
+        if opponent is None or player == agent_player:
+            move = agent.choose_move(board)
+            history[player].append((board.copy(), move_to_action(move)))
+        else:
+            move = opponent(board)
+        board.play(move)
+    for player in (0, 1):
+        if history[player]:
+            rewards = [0.0] * len(history[player])
+            rewards[-1] = 0.0 if board.winner < 0 else (1.0 if board.winner == player else -1.0)
+            states, actions = zip(*history[player])
+            agent.update_trajectory(list(states), list(actions), rewards)
+    return board.winner
+
+
+def evaluate(agent: ApproxQAgent, games: int) -> float:
+    """Score (wins + draws / 2) of the greedy agent against the random policy, alternating sides"""
+    from arena import run_arena  # arena imports this module for its policy list
+    epsilon, agent.epsilon = agent.epsilon, 0.0
+    try:
+        return run_arena(agent.choose_move, random_policy, games)['score_a']
+    finally:
+        agent.epsilon = epsilon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the function-approximation Q-learning agent")
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--opponent', choices=sorted(OPPONENTS), default='random')
+    parser.add_argument('--hidden', type=int, default=0, help="hidden units of the MLP, 0 for a linear model")
+    parser.add_argument('--learning-rate', type=float, default=0.01)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epsilon', type=float, default=0.2)
+    parser.add_argument('--model', default='approx_model.pkl')
+    parser.add_argument('--eval-games', type=int, default=200, help="games against random play after training")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    agent = ApproxQAgent(learning_rate=args.learning_rate, epsilon=args.epsilon, hidden=args.hidden,
+                         batch_size=args.batch_size, seed=args.seed)
+    agent.load_model(args.model)
+    opponent = OPPONENTS[args.opponent]
+    start = time.perf_counter()
+    for game in range(args.games):
+        play_game(agent, opponent, game % 2)
+    elapsed = time.perf_counter() - start
+    agent.save_model(args.model)
+    print(f"Trained on {args.games} games in {elapsed:.1f}s ({args.games / elapsed:.1f} games/sec); "
+          f"model is {os.path.getsize(args.model)} bytes")
+    if args.eval_games:
+        print(f"Score against random play: {evaluate(agent, args.eval_games):.3f}")
+
+
+if __name__ == '__main__':
+    main()
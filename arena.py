@@ -0,0 +1,118 @@
+import argparse
+import random
+import time
+from typing import Callable, Dict, Optional
+
+from alphabeta import AlphaBetaAgent
+from approx import ApproxQAgent
+from engine import move_to_row_col
+from game_core import PLAYER_X, GameCore
+from mcts import MCTSAgent
+from medium import QLearningAgent
+from selfplay import Policy, random_policy
+
+
+def qlearning_policy(model: str = 'q_learning_model.pkl', epsilon: float = 0.0) -> Policy:
+    """Greedy (or epsilon-greedy) Q-learning agent loaded from a model file"""
+    agent = QLearningAgent()
+    agent.load_model(model)
+    agent.epsilon = epsilon
+    return agent.choose_move
+
+
+def approx_policy(model: str = 'approx_model.pkl', epsilon: float = 0.0) -> Policy:
+    """Function-approximation Q-learning agent loaded from a model file"""
+    agent = ApproxQAgent()
+    agent.load_model(model)
+    agent.epsilon = epsilon
+    return agent.choose_move
+
+
+def mcts_policy(time_limit: float = 0.05, max_iterations: Optional[int] = None) -> Policy:
+    """Monte Carlo Tree Search with a per-move time or iteration budget"""
+    return MCTSAgent(time_limit=time_limit, max_iterations=max_iterations).choose_move
+
+
+def alphabeta_policy(time_limit: float = 0.05) -> Policy:
+    """Iterative-deepening alpha-beta search with a per-move deadline"""
+    return AlphaBetaAgent(time_limit=time_limit).choose_move
+
+
+# Policy factories by name; each takes the parsed command line arguments
+POLICIES: Dict[str, Callable[[argparse.Namespace], Policy]] = {
+    'random': lambda args: random_policy,
+    'qlearning': lambda args: qlearning_policy(args.model, args.epsilon),
+    'approx': lambda args: approx_policy(args.approx_model, args.epsilon),
+    'mcts': lambda args: mcts_policy(args.time_limit, args.iterations),
+    'alphabeta': lambda args: alphabeta_policy(args.time_limit),
+}
+
+
+def play_game(core: GameCore, policy_x: Policy, policy_o: Policy) -> Optional[str]:
+    """Play one game on a headless core and return the winner's mark, or None for a draw"""
+    core.reset()
+    while not core.game_over:
+        if core.check_for_draw():
+            core.game_over = True
+            break
+        policy = policy_x if core.current_player == PLAYER_X else policy_o
+        row, col = move_to_row_col(policy(core.engine))
+        if not core.make_move(row, col):
+            raise ValueError(f"policy for {core.current_player} played an illegal move at {(row, col)}")
+    return core.winner
+
+
+def run_arena(policy_a: Policy, policy_b: Policy, games: int, swap_sides: bool = True) -> Dict:
+    """Play games between two policies, alternating who plays X, and return outcome stats"""
+    core = GameCore()
+    wins_a = wins_b = draws = 0
+    moves = 0
+    start = time.perf_counter()
+    for game in range(games):
+        a_is_x = not swap_sides or game % 2 == 0
+        winner = play_game(core, *((policy_a, policy_b) if a_is_x else (policy_b, policy_a)))
+        moves += len(core.engine.history)
+        if winner is None:
+            draws += 1
+        elif (winner == PLAYER_X) == a_is_x:
+            wins_a += 1
+        else:
+            wins_b += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'games': games,
+        'wins_a': wins_a,
+        'wins_b': wins_b,
+        'draws': draws,
+        'score_a': (wins_a + 0.5 * draws) / games if games else 0.0,
+        'moves_per_game': moves / games if games else 0.0,
+        'games_per_second': games / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play headless games between two policies")
+    parser.add_argument('policy_a', choices=sorted(POLICIES))
+    parser.add_argument('policy_b', choices=sorted(POLICIES))
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, help="seed Python's random module for reproducible games")
+    parser.add_argument('--no-swap', action='store_true', help="policy_a always plays X")
+    parser.add_argument('--model', default='q_learning_model.pkl', help="model file for the qlearning policy")
+    parser.add_argument('--approx-model', default='approx_model.pkl', help="model file for the approx policy")
+    parser.add_argument('--epsilon', type=float, default=0.0, help="exploration rate of the learned policies")
+    parser.add_argument('--time-limit', type=float, default=0.05, help="seconds per move for search policies")
+    parser.add_argument('--iterations', type=int, help="fixed MCTS iterations per move instead of a time limit")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    policy_a = POLICIES[args.policy_a](args)
+    policy_b = POLICIES[args.policy_b](args)
+    stats = run_arena(policy_a, policy_b, args.games, not args.no_swap)
+    print(f"{args.policy_a} vs {args.policy_b}: {stats['wins_a']} wins, {stats['wins_b']} losses, "
+          f"{stats['draws']} draws (score {stats['score_a']:.3f}) in {stats['games']} games")
+    print(f"{stats['games_per_second']:.1f} games/sec, {stats['moves_per_game']:.1f} moves/game")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from engine import LINES, MASK_CELLS, PLAYERS, ROW_COL_MOVE, Board
+
+# Cell values in the batch arrays; players are 1 (X) and 2 (O), matching engine index + 1
+EMPTY = 0
+X = 1
+O = 2
+
+# Cell indices (0-8) of the 8 winning lines, and the sub-board of each move index
+LINE_CELLS = np.array([MASK_CELLS[line] for line in LINES], dtype=np.intp)
+MOVE_SUB_BOARD = np.arange(81) // 9
+
+# A batch policy maps the simulator and its (N, 81) legal-move mask to N move indices
+BatchPolicy = Callable[['BatchSimulator', np.ndarray], np.ndarray]
+
+
+def random_policy(sim: 'BatchSimulator', legal: np.ndarray) -> np.ndarray:
+    """Pick a uniformly random legal move in every game"""
+    return np.argmax(np.where(legal, sim.rng.random(legal.shape), -1.0), axis=1)
+
+
+class BatchSimulator:
+    """N games of Ultimate Tic-Tac-Toe advanced together with vectorised NumPy operations.
+
+    `boards` is an (N, 81) int8 array indexed by engine move index
+    (sub_board * 9 + cell) and `meta` an (N, 9) int8 array of claimed
+    sub-boards, both holding EMPTY, X or O. The rules are the engine's: a
+    sub-board is claimed by the first line made in it but stays playable
+    until full, and a game ends on a meta-board line or a full board.
+    """
+
+    def __init__(self, games: int, seed: Optional[int] = None):
+        self.n = games
+        self.rows = np.arange(games)
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((games, 81), dtype=np.int8)
+        self.meta = np.zeros((games, 9), dtype=np.int8)
+        self.forced = np.full(games, -1, dtype=np.int8)
+        self.player = np.full(games, X, dtype=np.int8)
+        self.moves = np.zeros(games, dtype=np.int16)
+
+        self.finished = 0
+        self.x_wins = 0
+        self.o_wins = 0
+        self.draws = 0
+
+    def reset(self, mask: Optional[np.ndarray] = None):
+        """Start new games in the rows selected by a boolean mask (all rows by default)"""
+        if mask is None:
+            mask = slice(None)
+        self.boards[mask] = EMPTY
+        self.meta[mask] = EMPTY
+        self.forced[mask] = -1
+        self.player[mask] = X
+        self.moves[mask] = 0
+
+    def legal_mask(self) -> np.ndarray:
+        """(N, 81) bool array of the legal moves of the player to move in each game"""
+        empty = self.boards == EMPTY
+        forced = self.forced.astype(np.intp)
+        # A full forced sub-board frees the player to move anywhere
+        forced_open = (forced >= 0) & empty.reshape(self.n, 9, 9)[self.rows, np.maximum(forced, 0)].any(axis=1)
+        in_forced = MOVE_SUB_BOARD == forced[:, None]
+        return empty & (in_forced | ~forced_open[:, None])
+
+    def step(self, actions: np.ndarray, auto_reset: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Play one move index per game and return (winner, done).
+
+        winner holds X or O for games won by this move and EMPTY otherwise;
+        done marks games that ended (won or drawn). With auto_reset the
+        finished rows are reset so every row always holds a live game.
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        rows, player = self.rows, self.player
+        if (self.boards[rows, actions] != EMPTY).any():
+            raise ValueError("actions must be empty cells")
+        self.boards[rows, actions] = player
+
+        sub_board = actions // 9
+        cells = self.boards.reshape(self.n, 9, 9)[rows, sub_board]
+        made_line = (cells[:, LINE_CELLS] == player[:, None, None]).all(axis=2).any(axis=1)
+        claimed = made_line & (self.meta[rows, sub_board] == EMPTY)
+        self.meta[rows[claimed], sub_board[claimed]] = player[claimed]
+        won = claimed & (self.meta[:, LINE_CELLS] == player[:, None, None]).all(axis=2).any(axis=1)
+
+        self.moves += 1
+        self.forced = (actions % 9).astype(np.int8)
+        winner = np.where(won, player, EMPTY).astype(np.int8)
+        done = won | (self.moves == 81)
+        self.player = (3 - player).astype(np.int8)
+
+        finished = int(done.sum())
+        if finished:
+            x_wins = int((winner == X).sum())
+            o_wins = int((winner == O).sum())
+            self.finished += finished
+            self.x_wins += x_wins
+            self.o_wins += o_wins
+            self.draws += finished - x_wins - o_wins
+            if auto_reset:
+                self.reset(done)
+        return winner, done
+
+    def run(self, policy: BatchPolicy = random_policy, steps: int = 100) -> int:
+        """Advance every game `steps` moves with a batch policy, resetting finished games; return moves played"""
+        for _ in range(steps):
+            self.step(policy(self, self.legal_mask()))
+        return steps * self.n
+
+    def to_board(self, i: int) -> Board:
+        """Engine Board for game i"""
+        marks = (None,) + PLAYERS
+        main_board = [[marks[self.boards[i, ROW_COL_MOVE[r][c]]] for c in range(9)] for r in range(9)]
+        meta_board = [[marks[self.meta[i, r * 3 + c]] for c in range(3)] for r in range(3)]
+        forced = divmod(int(self.forced[i]), 3) if self.forced[i] >= 0 else None
+        return Board.from_lists(main_board, meta_board, forced, PLAYERS[self.player[i] - 1])
+
+    def set_board(self, i: int, board: Board):
+        """Load an engine Board into game i"""
+        self.boards[i] = EMPTY
+        self.meta[i] = EMPTY
+        for p in range(2):
+            for b in range(9):
+                for c in MASK_CELLS[board.masks[p][b]]:
+                    self.boards[i, b * 9 + c] = p + 1
+            for b in MASK_CELLS[board.meta[p]]:
+                self.meta[i, b] = p + 1
+        self.forced[i] = board.forced
+        self.player[i] = board.player + 1
+        self.moves[i] = 81 - board.empty_total
+
+    def get_stats(self) -> Dict:
+        """Outcome counts of the games finished so far"""
+        return {
+            'games': self.finished,
+            'x_wins': self.x_wins,
+            'o_wins': self.o_wins,
+            'draws': self.draws,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the throughput of the batched random-play simulator")
+    parser.add_argument('--games', type=int, default=10000, help="games advanced together")
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    sim = BatchSimulator(args.games, args.seed)
+    start = time.perf_counter()
+    moves = sim.run(random_policy, args.steps)
+    elapsed = time.perf_counter() - start
+    stats = sim.get_stats()
+    print(f"{stats['games']} games finished ({stats['x_wins']} X, {stats['o_wins']} O, {stats['draws']} draws)")
+    print(f"{moves / elapsed:.0f} moves/sec, {stats['games'] / elapsed:.0f} games/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from batch_sim import BatchSimulator, random_policy
+from engine import Board, move_to_action
+import medium
+from medium import QLearningAgent
+
+SEED = 1234
+CORPUS_SIZE = 500
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+GROUPS = ('engine', 'agent', 'persistence', 'api')
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# Units of each result; rates are better when higher, times and sizes when lower
+HIGHER_IS_BETTER = {'ops/s': True, 'req/s': True, 's': False, 'bytes': False}
+
+
+def build_corpus(seed: int = SEED, size: int = CORPUS_SIZE) -> List[Board]:
+    """Sample one non-terminal position from each of `size` random games"""
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < size:
+        board = Board()
+        stop = rng.randrange(1, 60)
+        for _ in range(stop):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.play(rng.choice(moves))
+        if board.legal_moves():
+            corpus.append(board)
+    return corpus
+
+
+def list_position(board: Board) -> Tuple[List[List[str]], List[List[str]], Tuple[int, int], str]:
+    """(main_board, meta_board, last_move, current_player) arguments for the list-based APIs"""
+    main_board, meta_board = board.to_lists(' ')
+    last_move = divmod(board.forced, 3) if board.forced >= 0 else None
+    return main_board, meta_board, last_move, 'XO'[board.player]
+
+
+def rate(fn: Callable, items: Sequence, repeat: int = 3) -> float:
+    """Best-of-repeat calls per second of fn over items"""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = max(best, len(items) / (time.perf_counter() - start))
+    return best
+
+
+def median_seconds(fn: Callable, repeat: int = 5) -> float:
+    """Median wall time of repeat calls of fn"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_engine(corpus: List[Board], results: Dict):
+    """Move generation and winner detection through the engine and the list-based wrappers"""
+    positions = [list_position(board) for board in corpus]
+    agent = QLearningAgent()
+
+    def play_undo(board):
+        for move in board.legal_moves():
+            board.play(move)
+            board.undo()
+
+    results['engine.legal_moves'] = (rate(lambda board: board.legal_moves(), corpus), 'ops/s')
+    results['engine.play_undo'] = (rate(play_undo, corpus), 'ops/s')
+    results['medium.get_valid_actions'] = (rate(lambda p: agent.get_valid_actions(p[0], p[1], p[2]), positions), 'ops/s')
+    results['medium.check_winner'] = (rate(lambda p: medium.check_winner(p[1]), positions), 'ops/s')
+
+    # Moves per second of 10,000 random games advanced together
+    sim = BatchSimulator(10000, SEED)
+    results['batch_sim.moves'] = (rate(lambda _: sim.run(random_policy, 1), range(20)) * sim.n, 'ops/s')
+
+    # The pygame client needs a display; use SDL's dummy driver
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    try:
+        client_module = importlib.import_module('main')
+    except ImportError:
+        return
+    game = client_module.UltimateTicTacToe()
+
+    def get_valid_moves(board):
+        game.engine = board
+        return game.get_valid_moves()
+
+    results['main.get_valid_moves'] = (rate(get_valid_moves, corpus), 'ops/s')
+
+
+def populate(agent: QLearningAgent, size: int, corpus: List[Board], seed: int = SEED):
+    """Fill the Q-table with `size` states: the corpus positions plus random keys"""
+    rng = np.random.default_rng(seed)
+    for board in corpus:
+        state, _, moves = agent.canonical_moves(board)
+        agent.q_table[state] = rng.standard_normal(len(moves)).astype(np.float32)
+    while len(agent.q_table) < size:
+        state = int(rng.integers(1 << 62)) << 80 | int(rng.integers(1 << 62))
+        agent.q_table[state] = rng.standard_normal(int(rng.integers(1, 10))).astype(np.float32)
+
+
+def bench_agent(corpus: List[Board], sizes: Sequence[int], results: Dict, persistence: bool):
+    """choose_action and update (and optionally save/load) at each Q-table size"""
+    positions = [list_position(board) for board in corpus]
+    transitions = []
+    for board in corpus:
+        move = board.legal_moves()[0]
+        next_board = board.copy()
+        next_board.play(move)
+        next_actions = [move_to_action(m) for m in next_board.legal_moves()]
+        transitions.append((board.to_state_string(), move_to_action(move), next_board.to_state_string(), next_actions))
+
+    for size in sizes:
+        agent = QLearningAgent(epsilon=0.0)
+        populate(agent, size, corpus)
+        results[f'agent.choose_action[{size}]'] = (rate(lambda p: agent.choose_action(*p), positions), 'ops/s')
+        results[f'agent.update[{size}]'] = (rate(lambda t: agent.update(t[0], t[1], 0.0, t[2], t[3]), transitions), 'ops/s')
+        if not persistence:
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'model.pkl')
+            results[f'agent.save_model[{size}]'] = (median_seconds(lambda: agent.save_model(filename)), 's')
+            results[f'agent.model_size[{size}]'] = (os.path.getsize(filename), 'bytes')
+            results[f'agent.load_model[{size}]'] = (median_seconds(lambda: QLearningAgent().load_model(filename)), 's')
+
+
+def bench_api(corpus: List[Board], results: Dict):
+    """/api/move and /api/train throughput through the Flask test client, in a scratch directory"""
+    cwd = os.getcwd()
+    tmp = tempfile.TemporaryDirectory(prefix='uttt-bench-')
+    os.chdir(tmp.name)  # app loads and logs its model relative to the working directory
+    app = None
+    try:
+        app = importlib.import_module('app')
+        client = app.app.test_client()
+        move_bodies = []
+        for board in corpus:
+            main_board, meta_board = board.to_lists('')
+            move_bodies.append({
+                'mainBoard': main_board, 'metaBoard': meta_board, 'currentPlayer': 'XO'[board.player],
+                'lastMove': divmod(board.forced, 3) if board.forced >= 0 else None, 'difficulty': 'medium'})
+        string_bodies = [{'format': 'string', 'position': board.to_state_string(), 'difficulty': 'medium'}
+                         for board in corpus]
+        train_bodies = []
+        for board in corpus:
+            move = board.legal_moves()[0]
+            next_board = board.copy()
+            next_board.play(move)
+            train_bodies.append({
+                'state': board.to_state_string(), 'action': list(move_to_action(move)), 'reward': 0.0,
+                'nextState': next_board.to_state_string(),
+                'nextValidActions': [list(move_to_action(m)) for m in next_board.legal_moves()]})
+
+        results['api.move'] = (rate(lambda body: client.post('/api/move', json=body), move_bodies), 'req/s')
+        results['api.move[string]'] = (rate(lambda body: client.post('/api/move', json=body), string_bodies), 'req/s')
+
+        def train_all(bodies):
+            for body in bodies:
+                client.post('/api/train', json=body)
+            app.actor.drain()
+
+        results['api.train'] = (rate(train_all, [train_bodies]) * len(train_bodies), 'req/s')
+    finally:
+        if app is not None:
+            # Same order as the app's atexit hooks; closing again at exit is a no-op
+            app.game_log.close()
+            app.actor.close()
+            app.store.close()
+            app.mcts_agent.close()
+        os.chdir(cwd)
+        tmp.cleanup()
+
+
+def run(groups: Sequence[str], sizes: Sequence[int], seed: int = SEED) -> Dict:
+    """Run the selected benchmark groups and return the results document"""
+    random.seed(seed)
+    np.random.seed(seed)
+    corpus = build_corpus(seed)
+    results = {}
+    if 'engine' in groups:
+        bench_engine(corpus, results)
+    if 'agent' in groups or 'persistence' in groups:
+        bench_agent(corpus, sizes, results, 'persistence' in groups)
+    if 'api' in groups:
+        bench_api(corpus, results)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': seed,
+            'corpus': len(corpus),
+        },
+        'results': {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()},
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print each result against the baseline and return the names that regressed by more than threshold"""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            print(f"{name:40s} {result['value']:14.4g} {result['unit']:6s}  (no baseline)")
+            continue
+        change = result['value'] / base['value'] - 1.0
+        worse = -change if HIGHER_IS_BETTER[result['unit']] else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:40s} {result['value']:14.4g} {result['unit']:6s} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine, the Q-learning agent and the API hot paths")
+    parser.add_argument('--groups', default=','.join(GROUPS), help=f"comma-separated subset of {','.join(GROUPS)}")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated Q-table sizes (up to 10000000 needs several GB of memory)")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="overwrite the baseline with these results")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    groups = [group for group in args.groups.split(',') if group]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    # Baselines are machine-specific and not committed; without one there is nothing to flag a regression against
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}: run 'python benchmark.py --save-baseline' on this machine first")
+    current = run(groups, sizes, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    differences = [f"{name} {value} (baseline {baseline.get('meta', {}).get(name)})"
+                   for name, value in current['meta'].items() if baseline.get('meta', {}).get(name) != value]
+    if differences:
+        print(f"Warning: measured with different settings than the baseline: {', '.join(differences)}")
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
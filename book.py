@@ -0,0 +1,164 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from alphabeta import AlphaBetaAgent
+from engine import MOVE_SYM, SYM_INVERSE, Board
+
+BOOK_FILE = 'opening_book.bin'
+MAGIC = b'UTTTBOOK'
+HEADER = struct.Struct('<8sHHI')  # magic, version, plies, record count
+VERSION = 1
+# Canonical keys are under 2**152: 19 big-endian bytes sort in key order; one more byte holds the move
+KEY_BYTES = 19
+RECORD_BYTES = KEY_BYTES + 1
+
+# Per-process searcher of pool workers, set up by init_worker
+worker_agent = None
+
+
+def book_positions(plies: int) -> List[int]:
+    """Canonical keys of every position reachable in fewer than `plies` moves, sorted"""
+    layer = {Board().canonical()[0]}
+    keys = set(layer)
+    for _ in range(plies - 1):
+        next_layer = set()
+        for key in layer:
+            board = Board.from_key(key)
+            if board.winner >= 0:
+                continue
+            for move in board.legal_moves():
+                board.play(move)
+                next_layer.add(board.canonical()[0])
+                board.undo()
+        layer = next_layer - keys
+        keys |= layer
+    return sorted(keys)
+
+
+def init_worker(time_limit: float):
+    """Give each worker process its own searcher"""
+    global worker_agent
+    worker_agent = AlphaBetaAgent(time_limit=time_limit, table_bits=20)
+
+
+def search_position(key: int) -> Tuple[int, int, Dict]:
+    """Worker task: (key, best move in the canonical orientation, search stats)"""
+    move = worker_agent.choose_move(Board.from_key(key))
+    return key, move, worker_agent.last_stats
+
+
+def build_book(plies: int, time_limit: float, workers: int, verbose: bool = True) -> List[Tuple[int, int]]:
+    """Search every opening position and return sorted (canonical key, move) records"""
+    keys = book_positions(plies)
+    records = []
+    depths = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(time_limit,)) as pool:
+        for i, (key, move, stats) in enumerate(pool.imap_unordered(search_position, keys, chunksize=4), 1):
+            records.append((key, move))
+            depths += stats['depth']
+            if verbose and i % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{i}/{len(keys)} positions, mean depth {depths / i:.1f}, "
+                      f"{(len(keys) - i) * elapsed / i:.0f}s left")
+    records.sort()
+    return records
+
+
+def write_book(filename: str, records: List[Tuple[int, int]], plies: int):
+    """Write sorted (key, move) records to a book file atomically"""
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, plies, len(records)))
+        for key, move in records:
+            f.write(key.to_bytes(KEY_BYTES, 'big'))
+            f.write(bytes((move,)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class OpeningBook:
+    """Read-only opening book: fixed-size (canonical key, move) records sorted by key.
+
+    The file is memory-mapped and searched by bisection, so a lookup reads
+    about log2(n) records and the book costs no heap memory. Positions are
+    matched in their canonical orientation, so one entry serves all eight
+    symmetric variants, and the stored move is mapped back onto the board.
+    """
+
+    def __init__(self, filename: str = BOOK_FILE):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.plies, self.count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not an opening book (version {VERSION})")
+        if len(self.data) != HEADER.size + self.count * RECORD_BYTES:
+            raise ValueError(f"{filename} is truncated")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def find(self, key: int) -> Optional[int]:
+        """Move stored for a canonical key, or None"""
+        target = key.to_bytes(KEY_BYTES, 'big')
+        data = self.data
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD_BYTES
+            record_key = data[offset:offset + KEY_BYTES]
+            if record_key < target:
+                lo = mid + 1
+            elif record_key > target:
+                hi = mid
+            else:
+                return data[offset + KEY_BYTES]
+        return None
+
+    def lookup(self, board: Board) -> Optional[int]:
+        """Book move for a position in its own orientation, or None when it is out of book"""
+        if 81 - board.empty_total >= self.plies or board.winner >= 0:
+            return None
+        key, sym = board.canonical()
+        move = self.find(key)
+        if move is None:
+            self.misses += 1
+            return None
+        move = MOVE_SYM[SYM_INVERSE[sym]][move]
+        if not board.is_legal(move):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return move
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book with offline alpha-beta search")
+    parser.add_argument('--plies', type=int, default=4, help="book every position before this many moves")
+    parser.add_argument('--time-limit', type=float, default=1.0, help="search seconds per position")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=BOOK_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records = build_book(args.plies, args.time_limit, args.workers)
+    write_book(args.output, records, args.plies)
+    print(f"Wrote {len(records)} positions to {args.output} ({os.path.getsize(args.output)} bytes) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
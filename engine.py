@@ -0,0 +1,557 @@
+from typing import List, Optional, Sequence, Tuple
+
+# Players are indexed 0 (X) and 1 (O) inside the engine
+PLAYER_X = 'X'
+PLAYER_O = 'O'
+PLAYERS = (PLAYER_X, PLAYER_O)
+PLAYER_INDEX = {PLAYER_X: 0, PLAYER_O: 1}
+
+# A sub-board is a 9-bit mask, bit (row * 3 + col) set when the cell is taken
+FULL_MASK = 0x1FF
+LINES = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100,               # diagonals
+)
+
+# WIN_TABLE[mask] is True when the mask contains a complete line
+WIN_TABLE = tuple(any(mask & line == line for line in LINES) for mask in range(512))
+
+# MASK_CELLS[mask] lists the indices of the set bits in ascending order
+MASK_CELLS = tuple(tuple(c for c in range(9) if mask >> c & 1) for mask in range(512))
+# EMPTY_CELLS[mask] counts the cells not in the mask
+EMPTY_CELLS = tuple(9 - len(MASK_CELLS[mask]) for mask in range(512))
+
+# TERNARY[mask] is the mask read as base-3 digits, so x + 2 * o packs a sub-board
+TERNARY = tuple(sum(3 ** c for c in MASK_CELLS[mask]) for mask in range(512))
+SUB_BOARD_STATES = 3 ** 9
+KEY_LIMIT = SUB_BOARD_STATES ** 10 * 20  # every key() is below this: 90 base-3 cells, forced board, player
+
+# A move is an integer 0..80: sub_board * 9 + cell, both in row-major order
+MOVE_BOARD = tuple(m // 9 for m in range(81))
+MOVE_CELL = tuple(m % 9 for m in range(81))
+MOVE_ROW = tuple((m // 9) // 3 * 3 + (m % 9) // 3 for m in range(81))
+MOVE_COL = tuple((m // 9) % 3 * 3 + (m % 9) % 3 for m in range(81))
+ROW_COL_MOVE = tuple(tuple((r // 3 * 3 + c // 3) * 9 + (r % 3) * 3 + c % 3 for c in range(9))
+                     for r in range(9))
+ROW_MAJOR_MOVE = tuple(ROW_COL_MOVE[i // 9][i % 9] for i in range(81))
+
+# Row patterns of from_lists: a 9-cell row -> (x, o) 27-bit masks of its cells in the first cell row of
+# the three sub-boards it crosses, sub-board j at bits 9j..9j+8
+ROW_PATTERNS = {}
+ROW_PATTERN_LIMIT = 3 ** 9 + 3 ** 3  # every main-board and meta-board row of 'X', 'O' and one kind of empty cell
+
+# BOARD_MOVES[b][free] is the tuple of move indices of the free cells (a 9-bit mask) of sub-board b
+BOARD_MOVES = tuple(tuple(tuple(b * 9 + c for c in MASK_CELLS[mask]) for mask in range(512)) for b in range(9))
+
+# The 8 symmetries of the square acting on (row, col) within a 3x3 grid
+SYMMETRIES = (
+    lambda r, c: (r, c),          # identity
+    lambda r, c: (c, 2 - r),      # rotate 90
+    lambda r, c: (2 - r, 2 - c),  # rotate 180
+    lambda r, c: (2 - c, r),      # rotate 270
+    lambda r, c: (r, 2 - c),      # mirror left-right
+    lambda r, c: (2 - r, c),      # mirror top-bottom
+    lambda r, c: (c, r),          # main diagonal
+    lambda r, c: (2 - c, 2 - r),  # anti-diagonal
+)
+
+# CELL_SYM[g][i] is where symmetry g sends cell (or sub-board) i
+CELL_SYM = tuple(tuple(f(i // 3, i % 3)[0] * 3 + f(i // 3, i % 3)[1] for i in range(9)) for f in SYMMETRIES)
+SYM_INVERSE = tuple(next(h for h in range(8) if all(CELL_SYM[h][CELL_SYM[g][i]] == i for i in range(9)))
+                    for g in range(8))
+
+# Symmetry g applied to a 9-bit mask and to a move index (both sub-board and cell move)
+MASK_SYM = tuple(tuple(sum(1 << CELL_SYM[g][c] for c in MASK_CELLS[mask]) for mask in range(512))
+                 for g in range(8))
+MOVE_SYM = tuple(tuple(CELL_SYM[g][m // 9] * 9 + CELL_SYM[g][m % 9] for m in range(81)) for g in range(8))
+SYM_TERNARY = tuple(tuple(TERNARY[MASK_SYM[g][mask]] for mask in range(512)) for g in range(8))
+SYM_TERNARY_O = tuple(tuple(2 * digit for digit in ternary) for ternary in SYM_TERNARY)  # O's cells count 2
+# SYM_SOURCE[g][b] is the sub-board that symmetry g moves to position b
+SYM_SOURCE = tuple(CELL_SYM[SYM_INVERSE[g]] for g in range(8))
+
+
+def move_to_action(move: int) -> Tuple[int, int, int, int]:
+    """Convert a move index to a (sub_board_i, sub_board_j, sub_i, sub_j) action"""
+    b, c = MOVE_BOARD[move], MOVE_CELL[move]
+    return (b // 3, b % 3, c // 3, c % 3)
+
+
+def action_to_move(action: Sequence[int]) -> int:
+    """Convert a (sub_board_i, sub_board_j, sub_i, sub_j) action to a move index"""
+    return (action[0] * 3 + action[1]) * 9 + action[2] * 3 + action[3]
+
+
+def move_to_row_col(move: int) -> Tuple[int, int]:
+    """Convert a move index to (row, col) on the 9x9 board"""
+    return MOVE_ROW[move], MOVE_COL[move]
+
+
+def row_col_to_move(row: int, col: int) -> int:
+    """Convert (row, col) on the 9x9 board to a move index"""
+    return ROW_COL_MOVE[row][col]
+
+
+def cells_to_masks(cells: Sequence[Optional[str]]) -> Tuple[int, int]:
+    """Build (x_mask, o_mask) from nine cells in row-major order"""
+    x_mask = o_mask = 0
+    for i, cell in enumerate(cells):
+        if cell == PLAYER_X:
+            x_mask |= 1 << i
+        elif cell == PLAYER_O:
+            o_mask |= 1 << i
+    return x_mask, o_mask
+
+
+def line_winner(cells: Sequence[Optional[str]]) -> Optional[str]:
+    """Return the player with a complete line in nine row-major cells, or None"""
+    a, b, c, d, e, f, g, h, i = cells
+    # Every line but the top row and left column passes through the centre or a corner checked here
+    if e in PLAYERS and (d == e == f or b == e == h or a == e == i or c == e == g):
+        return e
+    if a in PLAYERS and (a == b == c or a == d == g):
+        return a
+    if i in PLAYERS and (g == h == i or c == f == i):
+        return i
+    return None
+
+
+def grid_winner(grid: Sequence[Sequence[Optional[str]]]) -> Optional[str]:
+    """Same as line_winner for a 3x3 grid of rows"""
+    (a, b, c), (d, e, f), (g, h, i) = grid
+    if e in PLAYERS and (d == e == f or b == e == h or a == e == i or c == e == g):
+        return e
+    if a in PLAYERS and (a == b == c or a == d == g):
+        return a
+    if i in PLAYERS and (g == h == i or c == f == i):
+        return i
+    return None
+
+
+# Top-left (row, col) of each sub-board on the 9x9 board
+SUB_BOARD_ORIGIN = tuple((b // 3 * 3, b % 3 * 3) for b in range(9))
+# BOARD_ACTIONS[b][free] is the tuple of actions on the free cells (a 9-bit mask) of sub-board b
+BOARD_ACTIONS = tuple(tuple(tuple(move_to_action(move) for move in BOARD_MOVES[b][mask]) for mask in range(512))
+                      for b in range(9))
+
+
+def free_mask(main_board: List[List[Optional[str]]], b: int) -> int:
+    """9-bit mask of the cells of sub-board b on a 9x9 list board holding neither 'X' nor 'O'"""
+    r, c = SUB_BOARD_ORIGIN[b]
+    a, b1, c1 = main_board[r][c:c + 3]
+    d, e, f = main_board[r + 1][c:c + 3]
+    g, h, i = main_board[r + 2][c:c + 3]
+    return ((a not in PLAYERS) | (b1 not in PLAYERS) << 1 | (c1 not in PLAYERS) << 2
+            | (d not in PLAYERS) << 3 | (e not in PLAYERS) << 4 | (f not in PLAYERS) << 5
+            | (g not in PLAYERS) << 6 | (h not in PLAYERS) << 7 | (i not in PLAYERS) << 8)
+
+
+def row_pattern(row: Sequence[Optional[str]]) -> Tuple[int, int]:
+    """ROW_PATTERNS entry of a 9-cell row of the 9x9 board, cached while the table has room"""
+    key = tuple(row)
+    pattern = ROW_PATTERNS.get(key)
+    if pattern is None:
+        x_mask, o_mask = cells_to_masks(key)
+        pattern = (sum((x_mask >> 3 * j & 7) << 9 * j for j in range(3)),
+                   sum((o_mask >> 3 * j & 7) << 9 * j for j in range(3)))
+        if len(ROW_PATTERNS) < ROW_PATTERN_LIMIT:
+            ROW_PATTERNS[key] = pattern
+    return pattern
+
+
+def legal_actions(main_board: List[List[Optional[str]]], meta_board: Optional[List[List[Optional[str]]]],
+                  last_move: Optional[Sequence[int]]) -> List[Tuple[int, int, int, int]]:
+    """Legal actions of a position given as lists, under the engine's rules, without building a Board.
+
+    Only the forced sub-board is read unless it is full, and its free cells
+    index a table of actions. The meta-board decides whether the game is
+    already won; anything but 'X'/'O' counts as empty.
+    """
+    if meta_board is not None and grid_winner(meta_board):
+        return []
+    if last_move is not None:
+        b = last_move[0] * 3 + last_move[1]
+        free = free_mask(main_board, b)
+        if free:
+            return list(BOARD_ACTIONS[b][free])
+    actions = []
+    for b in range(9):
+        actions.extend(BOARD_ACTIONS[b][free_mask(main_board, b)])
+    return actions
+
+
+class Board:
+    """Ultimate tic-tac-toe position stored as per-player bitmasks.
+
+    The next player must play in the sub-board matching the cell of the last
+    move unless that sub-board is full, in which case any empty cell is legal.
+    A sub-board is claimed by the first player to complete a line in it.
+    """
+
+    __slots__ = ('masks', 'meta', 'forced', 'player', 'winner', 'empty', 'empty_total', 'history', 'canonical_cache')
+
+    def __init__(self):
+        self.masks = [[0] * 9, [0] * 9]  # per player, one 9-bit mask per sub-board
+        self.meta = [0, 0]               # per player, 9-bit mask of won sub-boards
+        self.forced = -1                 # sub-board to play in, -1 for anywhere
+        self.player = 0                  # index of the player to move
+        self.winner = -1                 # index of the global winner, -1 for none
+        self.empty = [9] * 9             # empty cells left in each sub-board
+        self.empty_total = 81            # empty cells left on the whole board
+        self.history = []                # (move, previous forced, claimed) per move played
+        self.canonical_cache = None      # (key, symmetry) from canonical(), cleared by play and undo
+
+    def copy(self) -> 'Board':
+        """Return an independent copy of the position"""
+        board = Board.__new__(Board)
+        board.masks = [self.masks[0][:], self.masks[1][:]]
+        board.meta = self.meta[:]
+        board.forced = self.forced
+        board.player = self.player
+        board.winner = self.winner
+        board.empty = self.empty[:]
+        board.empty_total = self.empty_total
+        board.history = self.history[:]
+        board.canonical_cache = self.canonical_cache
+        return board
+
+    @classmethod
+    def from_lists(cls, main_board: List[List[Optional[str]]], meta_board: Optional[List[List[Optional[str]]]] = None,
+                   forced: Optional[Sequence[int]] = None, current_player: str = PLAYER_X) -> 'Board':
+        """Build a position from 9x9 and 3x3 lists; anything but 'X'/'O' counts as empty"""
+        board = cls.__new__(cls)
+        # OR each band of three rows into one 27-bit mask per player (small ints stay fast), then split it
+        patterns = ROW_PATTERNS
+        xs = []
+        os_ = []
+        for top in (0, 3, 6):
+            x_band = o_band = 0
+            for row, offset in zip(main_board[top:top + 3], (0, 3, 6)):
+                key = tuple(row)
+                x_row, o_row = patterns.get(key) or row_pattern(key)
+                x_band |= x_row << offset
+                o_band |= o_row << offset
+            xs += (x_band & FULL_MASK, x_band >> 9 & FULL_MASK, x_band >> 18)
+            os_ += (o_band & FULL_MASK, o_band >> 9 & FULL_MASK, o_band >> 18)
+        board.masks = [xs, os_]
+        if meta_board is not None:
+            # A 3-cell row's pattern holds its cells in bits 0-2
+            x_meta = o_meta = 0
+            for row, offset in zip(meta_board, (0, 3, 6)):
+                key = tuple(row)
+                x_row, o_row = patterns.get(key) or row_pattern(key)
+                x_meta |= x_row << offset
+                o_meta |= o_row << offset
+        else:
+            x_meta = sum(1 << b for b in range(9) if WIN_TABLE[xs[b]])
+            o_meta = sum(1 << b for b in range(9) if WIN_TABLE[os_[b]] and not x_meta >> b & 1)
+        board.meta = [x_meta, o_meta]
+        board.empty = empty = [EMPTY_CELLS[x | o] for x, o in zip(xs, os_)]
+        board.empty_total = sum(empty)
+        board.forced = forced[0] * 3 + forced[1] if forced is not None else -1
+        board.player = PLAYER_INDEX[current_player]
+        board.winner = 0 if WIN_TABLE[x_meta] else 1 if WIN_TABLE[o_meta] else -1
+        board.history = []
+        board.canonical_cache = None
+        return board
+
+    @classmethod
+    def from_state_string(cls, state: str, empty: str = ' ') -> 'Board':
+        """Build a position from a state string: 81 cells row by row, 9 meta-board cells, then a tail.
+
+        Accepts both the server tail (e.g. '12O' or 'nnX') and the browser
+        tail (e.g. '1,2,O' or 'n,n,X'). Cells are 'X', 'O' or `empty`.
+        Raises ValueError for any other length or character.
+        """
+        tail = state[90:]
+        if len(tail) == 5 and tail[1] == tail[3] == ',':
+            tail = tail[::2]
+        if len(tail) != 3 or tail[2] not in PLAYER_INDEX:
+            raise ValueError("state string must be 90 cells then a tail like '12O' or '1,2,O'")
+        if tail[0] in '012' and tail[1] in '012':
+            forced = int(tail[0]) * 3 + int(tail[1])
+        elif tail[0] in 'nN' and tail[1] in 'nN':
+            forced = -1
+        else:
+            raise ValueError(f"state string has an invalid last move {tail[:2]!r}")
+        cells = state[:90]
+        if cells.count(PLAYER_X) + cells.count(PLAYER_O) + cells.count(empty) != 90:
+            raise ValueError(f"state string cells must be 'X', 'O' or {empty!r}")
+        board = cls()
+        xs, os_ = board.masks
+        cells = state[:81]
+        # Only visit occupied cells
+        i = cells.find(PLAYER_X)
+        while i >= 0:
+            move = ROW_MAJOR_MOVE[i]
+            xs[move // 9] |= 1 << (move % 9)
+            i = cells.find(PLAYER_X, i + 1)
+        i = cells.find(PLAYER_O)
+        while i >= 0:
+            move = ROW_MAJOR_MOVE[i]
+            os_[move // 9] |= 1 << (move % 9)
+            i = cells.find(PLAYER_O, i + 1)
+        x_meta = o_meta = 0
+        for b, cell in enumerate(state[81:90]):
+            if cell == PLAYER_X:
+                x_meta |= 1 << b
+            elif cell == PLAYER_O:
+                o_meta |= 1 << b
+        board.meta = [x_meta, o_meta]
+        board.empty = [9 - len(MASK_CELLS[xs[b] | os_[b]]) for b in range(9)]
+        board.empty_total = sum(board.empty)
+        board.forced = forced
+        board.player = PLAYER_INDEX[tail[2]]
+        if WIN_TABLE[x_meta]:
+            board.winner = 0
+        elif WIN_TABLE[o_meta]:
+            board.winner = 1
+        return board
+
+    def to_state_string(self, empty: str = ' ') -> str:
+        """Encode the position in the server format read by from_state_string (93 characters)"""
+        xs, os_ = self.masks
+        cells = [empty] * 90
+        for b in range(9):
+            for c in MASK_CELLS[xs[b]]:
+                cells[MOVE_ROW[b * 9 + c] * 9 + MOVE_COL[b * 9 + c]] = PLAYER_X
+            for c in MASK_CELLS[os_[b]]:
+                cells[MOVE_ROW[b * 9 + c] * 9 + MOVE_COL[b * 9 + c]] = PLAYER_O
+        for b in MASK_CELLS[self.meta[0]]:
+            cells[81 + b] = PLAYER_X
+        for b in MASK_CELLS[self.meta[1]]:
+            cells[81 + b] = PLAYER_O
+        forced = f'{self.forced // 3}{self.forced % 3}' if self.forced >= 0 else 'nn'
+        return ''.join(cells) + forced + PLAYERS[self.player]
+
+    @classmethod
+    def from_key(cls, key: int) -> 'Board':
+        """Rebuild a position (without undo history) from a key returned by key().
+
+        Raises ValueError for a key out of range or one whose meta-board,
+        winner, side to move or forced board contradict its cells.
+        """
+        if not 0 <= key < KEY_LIMIT:
+            raise ValueError(f"packed position must be in [0, 3**90 * 20), got {key}")
+        board = cls()
+        key, board.player = divmod(key, 2)
+        key, forced = divmod(key, 10)
+        board.forced = forced - 1
+        packed = []
+        for _ in range(10):
+            key, sub = divmod(key, SUB_BOARD_STATES)
+            packed.append(sub)
+        packed.reverse()
+        masks = []
+        for sub in packed:
+            x_mask = o_mask = 0
+            for c in range(9):
+                sub, digit = divmod(sub, 3)
+                if digit == 1:
+                    x_mask |= 1 << c
+                elif digit == 2:
+                    o_mask |= 1 << c
+            masks.append((x_mask, o_mask))
+        board.masks = [[masks[b][0] for b in range(9)], [masks[b][1] for b in range(9)]]
+        board.meta = list(masks[9])
+        board.empty = [9 - len(MASK_CELLS[x_mask | o_mask]) for x_mask, o_mask in masks[:9]]
+        board.empty_total = sum(board.empty)
+        if WIN_TABLE[board.meta[0]]:
+            board.winner = 0
+        elif WIN_TABLE[board.meta[1]]:
+            board.winner = 1
+        board.check_consistent()
+        return board
+
+    def check_consistent(self):
+        """Raise ValueError unless the meta-board, winner, side to move and forced board fit the cells"""
+        xs, os_ = self.masks
+        x_meta, o_meta = self.meta
+        for b in range(9):
+            x_line, o_line = WIN_TABLE[xs[b]], WIN_TABLE[os_[b]]
+            # A sub-board is claimed by a player with a line in it, and any line claims it
+            if (x_meta >> b & 1 and not x_line) or (o_meta >> b & 1 and not o_line) \
+                    or ((x_line or o_line) and not (x_meta | o_meta) >> b & 1):
+                raise ValueError(f"meta-board does not match the cells of sub-board {b}")
+        if WIN_TABLE[x_meta] and WIN_TABLE[o_meta]:
+            raise ValueError("both players have won the meta-board")
+        if self.winner >= 0 and self.winner != self.player ^ 1:
+            raise ValueError("the winner is not the player who moved last")
+        marks = sum(len(MASK_CELLS[mask]) for mask in xs) - sum(len(MASK_CELLS[mask]) for mask in os_)
+        if marks != self.player:
+            raise ValueError("side to move does not match the number of marks")
+        last = self.masks[self.player ^ 1]
+        if self.forced >= 0 and not any(last[b] >> self.forced & 1 for b in range(9)):
+            raise ValueError(f"no mark of the last mover on cell {self.forced} to force sub-board {self.forced}")
+
+    def key(self) -> int:
+        """Pack the position into an integer: base-3 cells, base-3 meta-board, forced board, player"""
+        xs, os_ = self.masks
+        key = 0
+        for b in range(9):
+            key = key * SUB_BOARD_STATES + TERNARY[xs[b]] + 2 * TERNARY[os_[b]]
+        key = key * SUB_BOARD_STATES + TERNARY[self.meta[0]] + 2 * TERNARY[self.meta[1]]
+        return (key * 10 + self.forced + 1) * 2 + self.player
+
+    def canonical(self) -> Tuple[int, int]:
+        """Return (key, g): the smallest key() over the 8 symmetries and the symmetry g producing it.
+
+        A move m in this position is MOVE_SYM[g][m] in the canonical orientation.
+        Keys compare like their leading sub-board digits, so symmetries are
+        dropped as soon as one of their sub-boards is larger than another's,
+        and only the survivors get a full key. The result is cached until the
+        next play or undo.
+        """
+        if self.canonical_cache is not None:
+            return self.canonical_cache
+        xs, os_ = self.masks
+        kept = range(8)
+        for b in range(9):
+            best = SUB_BOARD_STATES
+            candidates, kept = kept, []
+            for g in candidates:
+                s = SYM_SOURCE[g][b]
+                value = SYM_TERNARY[g][xs[s]] + SYM_TERNARY_O[g][os_[s]]
+                if value < best:
+                    best = value
+                    kept = [g]
+                elif value == best:
+                    kept.append(g)
+            if len(kept) == 1:
+                break
+        x_meta, o_meta = self.meta
+        forced, player = self.forced, self.player
+        best_key, best_sym = -1, 0
+        for g in kept:
+            ternary, ternary_o = SYM_TERNARY[g], SYM_TERNARY_O[g]
+            key = 0
+            for s in SYM_SOURCE[g]:
+                key = key * SUB_BOARD_STATES + ternary[xs[s]] + ternary_o[os_[s]]
+            key = key * SUB_BOARD_STATES + ternary[x_meta] + ternary_o[o_meta]
+            key = (key * 10 + (CELL_SYM[g][forced] + 1 if forced >= 0 else 0)) * 2 + player
+            if best_key < 0 or key < best_key:
+                best_key, best_sym = key, g
+        self.canonical_cache = best_key, best_sym
+        return self.canonical_cache
+
+    def transform(self, g: int) -> 'Board':
+        """Return a copy of the position (without undo history) under symmetry g"""
+        board = Board()
+        mask_sym, cell_sym = MASK_SYM[g], CELL_SYM[g]
+        for p in range(2):
+            for b in range(9):
+                board.masks[p][cell_sym[b]] = mask_sym[self.masks[p][b]]
+            board.meta[p] = mask_sym[self.meta[p]]
+        for b in range(9):
+            board.empty[cell_sym[b]] = self.empty[b]
+        board.empty_total = self.empty_total
+        board.forced = cell_sym[self.forced] if self.forced >= 0 else -1
+        board.player = self.player
+        board.winner = self.winner
+        return board
+
+    def to_lists(self, empty: Optional[str] = ' ') -> Tuple[List[List[Optional[str]]], List[List[Optional[str]]]]:
+        """Return (main_board, meta_board) as nested lists using `empty` for free cells"""
+        xs, os_ = self.masks
+        main_board = [[empty] * 9 for _ in range(9)]
+        for b in range(9):
+            for c in MASK_CELLS[xs[b]]:
+                main_board[MOVE_ROW[b * 9 + c]][MOVE_COL[b * 9 + c]] = PLAYER_X
+            for c in MASK_CELLS[os_[b]]:
+                main_board[MOVE_ROW[b * 9 + c]][MOVE_COL[b * 9 + c]] = PLAYER_O
+        meta_board = [[empty] * 3 for _ in range(3)]
+        for b in MASK_CELLS[self.meta[0]]:
+            meta_board[b // 3][b % 3] = PLAYER_X
+        for b in MASK_CELLS[self.meta[1]]:
+            meta_board[b // 3][b % 3] = PLAYER_O
+        return main_board, meta_board
+
+    def cell(self, move: int) -> Optional[str]:
+        """Return the mark at a move index, or None if the cell is empty"""
+        bit = 1 << MOVE_CELL[move]
+        if self.masks[0][MOVE_BOARD[move]] & bit:
+            return PLAYER_X
+        if self.masks[1][MOVE_BOARD[move]] & bit:
+            return PLAYER_O
+        return None
+
+    def sub_board_winner(self, b: int) -> Optional[str]:
+        """Return the player who claimed sub-board b, or None"""
+        if self.meta[0] >> b & 1:
+            return PLAYER_X
+        if self.meta[1] >> b & 1:
+            return PLAYER_O
+        return None
+
+    def winner_mark(self) -> Optional[str]:
+        """Return the global winner as 'X'/'O', or None"""
+        return PLAYERS[self.winner] if self.winner >= 0 else None
+
+    def legal_moves(self) -> List[int]:
+        """Return the legal move indices for the player to move"""
+        if self.winner >= 0:
+            return []
+        xs, os_ = self.masks
+        b = self.forced
+        if b >= 0 and self.empty[b]:
+            return list(BOARD_MOVES[b][FULL_MASK & ~(xs[b] | os_[b])])
+        moves = []
+        for b in range(9):
+            if self.empty[b]:
+                moves.extend(BOARD_MOVES[b][FULL_MASK & ~(xs[b] | os_[b])])
+        return moves
+
+    def is_legal(self, move: int) -> bool:
+        """Check whether a move index is legal for the player to move"""
+        if self.winner >= 0:
+            return False
+        xs, os_ = self.masks
+        b, bit = MOVE_BOARD[move], 1 << MOVE_CELL[move]
+        if (xs[b] | os_[b]) & bit:
+            return False
+        forced = self.forced
+        return forced < 0 or forced == b or not self.empty[forced]
+
+    def play(self, move: int):
+        """Place the current player's mark at a move index and pass the turn"""
+        b, c = MOVE_BOARD[move], MOVE_CELL[move]
+        p = self.player
+        mask = self.masks[p][b] | (1 << c)
+        self.masks[p][b] = mask
+        claimed = WIN_TABLE[mask] and not (self.meta[0] | self.meta[1]) >> b & 1
+        if claimed:
+            meta = self.meta[p] | (1 << b)
+            self.meta[p] = meta
+            if WIN_TABLE[meta]:
+                self.winner = p
+        self.empty[b] -= 1
+        self.empty_total -= 1
+        self.history.append((move, self.forced, claimed))
+        self.canonical_cache = None
+        self.forced = c
+        self.player = p ^ 1
+
+    def undo(self) -> int:
+        """Take back the last move played and return its move index"""
+        move, forced, claimed = self.history.pop()
+        self.canonical_cache = None
+        b, c = MOVE_BOARD[move], MOVE_CELL[move]
+        p = self.player ^ 1
+        self.masks[p][b] &= ~(1 << c)
+        if claimed:
+            # Only a claiming move can have ended the game
+            self.meta[p] &= ~(1 << b)
+            self.winner = -1
+        self.empty[b] += 1
+        self.empty_total += 1
+        self.forced = forced
+        self.player = p
+        return move
+
+    def is_full(self) -> bool:
+        """Check whether every cell on the board is taken"""
+        return not self.empty_total
+
+    def is_draw(self) -> bool:
+        """Check whether the board is full with no global winner"""
+        return not self.empty_total and self.winner < 0
@@ -0,0 +1,124 @@
+import random
+from engine import Board, line_winner, move_to_row_col, row_col_to_move
+
+# Game markers
+EMPTY = None
+PLAYER_X = "X"
+PLAYER_O = "O"
+
+class GameCore:
+    """Ultimate Tic-Tac-Toe game state and rules without any display.
+
+    The pygame client draws on top of this class; the arena runner plays it
+    headless.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Start a new game."""
+        # Game state; the engine holds the authoritative bitboard position
+        self.engine = Board()
+        self.board = self.create_board()
+        self.meta_board = [[None for _ in range(3)] for _ in range(3)]
+        self.current_player = PLAYER_X
+        self.active_sub_row = None
+        self.active_sub_col = None
+        self.winner = None
+        self.game_over = False
+
+        # For highlighting the last move
+        self.last_move = None
+
+    def create_board(self):
+        """Initialize a 9x9 Ultimate Tic-Tac-Toe board filled with empty cells."""
+        return [[EMPTY for _ in range(9)] for _ in range(9)]
+
+    def get_sub_board_indices(self, sub_row, sub_col):
+        """Get the range of rows and cols in the main board for a sub-board."""
+        row_start = sub_row * 3
+        col_start = sub_col * 3
+        return range(row_start, row_start + 3), range(col_start, col_start + 3)
+
+    def check_sub_board_winner(self, board, sub_row, sub_col):
+        """Check if there's a winner in the specified 3x3 sub-board."""
+        rows, cols = self.get_sub_board_indices(sub_row, sub_col)
+
+        cells = [board[r][c] for r in rows for c in cols]
+        return line_winner(cells)
+
+    def check_global_winner(self):
+        """Check if there's a winner on the meta-board."""
+        return self.engine.winner_mark()
+
+    def update_meta_board(self):
+        """Update the meta-board with sub-board winners."""
+        for sr in range(3):
+            for sc in range(3):
+                self.meta_board[sr][sc] = self.engine.sub_board_winner(sr * 3 + sc)
+
+    def get_valid_moves(self):
+        """Return valid moves based on the active sub-board."""
+        # The engine falls back to the whole board when the active sub-board is full
+        return [move_to_row_col(move) for move in self.engine.legal_moves()]
+
+    def make_move(self, row, col):
+        """Make a move at the given position if valid."""
+        move = row_col_to_move(row, col)
+
+        if self.engine.is_legal(move):
+            self.engine.play(move)
+            self.board[row][col] = self.current_player
+            self.last_move = (row, col)
+
+            # Update active sub-board for next turn
+            self.active_sub_row = row % 3
+            self.active_sub_col = col % 3
+
+            # Only the sub-board just played in can change on the meta-board
+            self.meta_board[row // 3][col // 3] = self.engine.sub_board_winner(move // 9)
+
+            # The engine tracks the global winner as moves are played
+            self.winner = self.engine.winner_mark()
+            if self.winner:
+                self.game_over = True
+
+            # Switch player
+            self.current_player = PLAYER_O if self.current_player == PLAYER_X else PLAYER_X
+            return True
+        return False
+
+    def undo_move(self):
+        """Take back the last move, restoring the previous game state."""
+        if not self.engine.history:
+            return False
+
+        move = self.engine.undo()
+        row, col = move_to_row_col(move)
+        self.board[row][col] = EMPTY
+        self.meta_board[row // 3][col // 3] = self.engine.sub_board_winner(move // 9)
+
+        # Restore the previous last move and active sub-board
+        if self.engine.history:
+            self.last_move = move_to_row_col(self.engine.history[-1][0])
+            self.active_sub_row = self.last_move[0] % 3
+            self.active_sub_col = self.last_move[1] % 3
+        else:
+            self.last_move = None
+            self.active_sub_row = None
+            self.active_sub_col = None
+
+        self.winner = self.engine.winner_mark()
+        self.game_over = False
+        self.current_player = PLAYER_O if self.current_player == PLAYER_X else PLAYER_X
+        return True
+
+    def random_move(self):
+        """Pick a random valid move as (row, col), or None if there is none."""
+        valid_moves = self.get_valid_moves()
+        return random.choice(valid_moves) if valid_moves else None
+
+    def check_for_draw(self):
+        """Check if the game is a draw (board full with no winner)."""
+        return self.engine.is_full()
@@ -0,0 +1,319 @@
+import argparse
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from engine import Board, move_to_action
+from medium import QLearningAgent
+
+LOG_DIR = 'game_log'
+DATA_FILE = 'games.dat'
+INDEX_FILE = 'games.idx'
+DIFFICULTIES = ('easy', 'medium', 'hard', 'expert')
+UNKNOWN_DIFFICULTY = 'unknown'  # difficulty of games logged without a known one, stored as code 255
+NO_PLAYER = 2  # ai_player of a game without an AI side
+DRAW = 2  # winner code of a drawn game; 0 and 1 are the engine's X and O
+# Game record: unix time, winner, ai player, difficulty index, move count; then one byte per move
+RECORD_HEADER = struct.Struct('<IBBBB')
+# Index entry per chunk: data offset, compressed length, game count, CRC-32 of the compressed bytes
+INDEX_ENTRY = struct.Struct('<QIII')
+
+
+def encode_moves(moves: List[int]) -> Tuple[bytes, Board]:
+    """Encode a game as the position of each move among the legal moves, sorted, at that ply.
+
+    Most moves are forced into one sub-board, so the codes are mostly below
+    9 and compress far better than raw move indices. Returns the codes and
+    the final position; raises ValueError on an illegal move.
+    """
+    board = Board()
+    codes = bytearray()
+    for move in moves:
+        legal = board.legal_moves()
+        if move not in legal:
+            raise ValueError(f"illegal move {move} at ply {len(codes)}")
+        codes.append(legal.index(move))
+        board.play(move)
+    return bytes(codes), board
+
+
+def decode_moves(codes: bytes) -> List[int]:
+    """Move indices of a game encoded by encode_moves"""
+    board = Board()
+    moves = []
+    for code in codes:
+        move = board.legal_moves()[code]
+        board.play(move)
+        moves.append(move)
+    return moves
+
+
+class GameRecord:
+    """One logged game: its moves and the result from the AI's side"""
+
+    __slots__ = ('timestamp', 'winner', 'ai_player', 'difficulty', 'moves')
+
+    def __init__(self, timestamp: int, winner: int, ai_player: int, difficulty: str, moves: List[int]):
+        self.timestamp = timestamp
+        self.winner = winner  # 0 (X), 1 (O) or DRAW
+        self.ai_player = ai_player  # 0, 1 or NO_PLAYER
+        self.difficulty = difficulty
+        self.moves = moves
+
+    def outcome(self, player: Optional[int] = None) -> str:
+        """'win', 'loss' or 'draw' for a player, the AI by default"""
+        player = self.ai_player if player is None else player
+        if self.winner == DRAW:
+            return 'draw'
+        return 'win' if self.winner == player else 'loss'
+
+
+class RollingStats:
+    """Win, draw and loss counts over the last `window` games, updated in O(1) per game"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.outcomes = deque()
+        self.counts = {'win': 0, 'draw': 0, 'loss': 0}
+
+    def add(self, outcome: str):
+        self.outcomes.append(outcome)
+        self.counts[outcome] += 1
+        if len(self.outcomes) > self.window:
+            self.counts[self.outcomes.popleft()] -= 1
+
+    def get_stats(self) -> Dict:
+        games = len(self.outcomes)
+        return {
+            'window': self.window,
+            'games': games,
+            'wins': self.counts['win'],
+            'draws': self.counts['draw'],
+            'losses': self.counts['loss'],
+            'win_rate': self.counts['win'] / games if games else 0.0,
+            'draw_rate': self.counts['draw'] / games if games else 0.0,
+            'loss_rate': self.counts['loss'] / games if games else 0.0,
+        }
+
+
+def read_index(directory: str = LOG_DIR) -> List[Tuple[int, int, int, int]]:
+    """(offset, length, games, crc) of every complete chunk in a log directory"""
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    return list(INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]))
+
+
+def parse_chunk(block: bytes) -> Iterator[GameRecord]:
+    """Games of one decompressed chunk"""
+    offset = 0
+    while offset < len(block):
+        timestamp, winner, ai_player, difficulty, count = RECORD_HEADER.unpack_from(block, offset)
+        offset += RECORD_HEADER.size
+        moves = decode_moves(block[offset:offset + count])
+        offset += count
+        name = DIFFICULTIES[difficulty] if difficulty < len(DIFFICULTIES) else UNKNOWN_DIFFICULTY
+        yield GameRecord(timestamp, winner, ai_player, name, moves)
+
+
+def iter_games(directory: str = LOG_DIR, start_chunk: int = 0) -> Iterator[GameRecord]:
+    """Stream every logged game, oldest first, holding one chunk in memory at a time"""
+    with open(os.path.join(directory, DATA_FILE), 'rb') as f:
+        for offset, length, games, crc in read_index(directory)[start_chunk:]:
+            f.seek(offset)
+            compressed = f.read(length)
+            if zlib.crc32(compressed) != crc:
+                raise ValueError(f"{directory}: chunk at offset {offset} is corrupt")
+            yield from parse_chunk(zlib.decompress(compressed))
+
+
+class GameLog:
+    """Append-only store of finished games in compressed chunks.
+
+    Records are buffered until chunk_games have accumulated or
+    flush_interval seconds have passed since the last chunk, then written
+    as one zlib block to games.dat followed by its entry in games.idx.
+    Readers only trust indexed chunks, and opening the log truncates any
+    unindexed bytes left by a crash, so a torn write loses at most the
+    buffered games. Rolling win/draw/loss stats per difficulty are seeded
+    from the newest chunks on open.
+    """
+
+    def __init__(self, directory: str = LOG_DIR, chunk_games: int = 4096, flush_interval: float = 60.0,
+                 window: int = 1000):
+        self.directory = directory
+        self.chunk_games = chunk_games
+        self.flush_interval = flush_interval
+        self.window = window
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        index = read_index(directory)
+        data_end = index[-1][0] + index[-1][1] if index else 0
+        self.data = open(os.path.join(directory, DATA_FILE), 'ab')
+        self.data.truncate(data_end)
+        self.index = open(os.path.join(directory, INDEX_FILE), 'ab')
+        self.index.truncate(len(index) * INDEX_ENTRY.size)
+        self.chunks = len(index)
+        self.games = sum(entry[2] for entry in index)
+        self.data_bytes = data_end
+
+        self.pending = bytearray()
+        self.pending_games = 0
+        self.last_write = time.monotonic()
+        self.recent: Dict[str, RollingStats] = {}
+        self.seed_recent(index)
+
+    def seed_recent(self, index: List[Tuple[int, int, int, int]]):
+        """Fill the rolling windows from the newest chunks holding at least `window` games"""
+        start, games = len(index), 0
+        while start > 0 and games < self.window:
+            start -= 1
+            games += index[start][2]
+        if start < len(index):
+            for record in iter_games(self.directory, start):
+                self.count(record)
+
+    def count(self, record: GameRecord):
+        if record.ai_player != NO_PLAYER:
+            stats = self.recent.setdefault(record.difficulty, RollingStats(self.window))
+            stats.add(record.outcome())
+
+    def append(self, moves: List[int], ai_player: int = NO_PLAYER, difficulty: Optional[str] = None,
+               timestamp: Optional[int] = None) -> GameRecord:
+        """Log a finished game given by its move indices; raises ValueError for an illegal or unfinished game"""
+        codes, board = encode_moves(moves)
+        if board.winner < 0 and not board.is_full():
+            raise ValueError("game is not over")
+        if difficulty not in DIFFICULTIES:
+            difficulty = UNKNOWN_DIFFICULTY
+        record = GameRecord(int(time.time()) if timestamp is None else timestamp,
+                            board.winner if board.winner >= 0 else DRAW, ai_player, difficulty, list(moves))
+        difficulty_code = DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES else 255
+        with self.lock:
+            self.pending += RECORD_HEADER.pack(record.timestamp, record.winner, ai_player, difficulty_code, len(codes))
+            self.pending += codes
+            self.pending_games += 1
+            self.games += 1
+            self.count(record)
+            if (self.pending_games >= self.chunk_games
+                    or time.monotonic() - self.last_write >= self.flush_interval):
+                self.write_chunk()
+        return record
+
+    def write_chunk(self):
+        """Compress the buffered games into a chunk and index it; caller holds the lock"""
+        self.last_write = time.monotonic()
+        if not self.pending_games:
+            return
+        compressed = zlib.compress(bytes(self.pending), 6)
+        self.data.write(compressed)
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        # The index entry goes last: a chunk is visible to readers only once fully written
+        self.index.write(INDEX_ENTRY.pack(self.data_bytes, len(compressed), self.pending_games,
+                                          zlib.crc32(compressed)))
+        self.index.flush()
+        os.fsync(self.index.fileno())
+        self.data_bytes += len(compressed)
+        self.chunks += 1
+        self.pending = bytearray()
+        self.pending_games = 0
+
+    def flush(self):
+        """Write buffered games now"""
+        with self.lock:
+            self.write_chunk()
+
+    def close(self):
+        with self.lock:
+            self.write_chunk()
+            self.data.close()
+            self.index.close()
+
+    def get_metrics(self) -> Dict:
+        """Games stored, file size and rolling results per difficulty"""
+        with self.lock:
+            return {
+                'games': self.games,
+                'chunks': self.chunks,
+                'pending': self.pending_games,
+                'bytes': self.data_bytes,
+                'recent': {name: stats.get_stats() for name, stats in self.recent.items()},
+            }
+
+
+def game_entries(agent: QLearningAgent, record: GameRecord, player: int) -> Tuple[List[Tuple[int, int, int]], List[float]]:
+    """One side's (state, action index, actions) entries and rewards for update_entries"""
+    board = Board()
+    entries = []
+    for move in record.moves:
+        if board.player == player:
+            entries.append(agent.action_index(board, move_to_action(move)))
+        board.play(move)
+    rewards = [0.0] * len(entries)
+    if rewards:
+        rewards[-1] = {'win': 1.0, 'loss': -1.0, 'draw': 0.0}[record.outcome(player)]
+    return entries, rewards
+
+
+def train_from_log(agent: QLearningAgent, directory: str = LOG_DIR, both_sides: bool = False,
+                   limit: Optional[int] = None, verbose: bool = True) -> int:
+    """Replay logged games into the Q-learning agent, the AI's side (or both) of each; return games used"""
+    games = 0
+    start = time.perf_counter()
+    for record in iter_games(directory):
+        if limit is not None and games >= limit:
+            break
+        if record.ai_player == NO_PLAYER and not both_sides:
+            continue
+        for player in (0, 1) if both_sides else (record.ai_player,):
+            entries, rewards = game_entries(agent, record, player)
+            if entries:
+                agent.update_entries(entries, rewards)
+        games += 1
+        if verbose and games % 100000 == 0:
+            print(f"{games} games replayed, {games / (time.perf_counter() - start):.0f} games/sec")
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the game log or retrain the Q-learning agent from it")
+    parser.add_argument('--dir', default=LOG_DIR)
+    parser.add_argument('--train', action='store_true', help="replay the logged games into --model")
+    parser.add_argument('--model', default='q_learning_model.pkl')
+    parser.add_argument('--both-sides', action='store_true', help="also learn from the human's moves")
+    parser.add_argument('--limit', type=int, help="replay at most this many games")
+    args = parser.parse_args()
+
+    if args.train:
+        agent = QLearningAgent()
+        agent.load_model(args.model)
+        start = time.perf_counter()
+        games = train_from_log(agent, args.dir, args.both_sides, args.limit)
+        agent.save_model(args.model)
+        print(f"Replayed {games} games in {time.perf_counter() - start:.1f}s, {agent.count_states()} states")
+        return
+
+    index = read_index(args.dir)
+    games = sum(entry[2] for entry in index)
+    size = index[-1][0] + index[-1][1] if index else 0
+    totals: Dict[str, RollingStats] = {}
+    for record in iter_games(args.dir) if index else ():
+        if record.ai_player != NO_PLAYER:
+            totals.setdefault(record.difficulty, RollingStats(games)).add(record.outcome())
+    print(f"{games} games in {len(index)} chunks, {size} bytes ({size / max(games, 1):.1f} bytes/game)")
+    for name, stats in sorted(totals.items()):
+        s = stats.get_stats()
+        print(f"{name}: {s['games']} games, AI won {s['win_rate']:.1%}, drew {s['draw_rate']:.1%}, "
+              f"lost {s['loss_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
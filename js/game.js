@@ -18,6 +18,7 @@ class UltimateTicTacToe {
         this.isDarkTheme = true;
         this.lastMove = null;
         this.difficulty = 'easy'; // Default difficulty
+        this.trajectory = this.createTrajectory(); // AI states, actions and rewards for training, plus every move
         
         // Timing constants
         this.AI_THINKING_TIME = 1000;  // Time before AI makes a move
@@ -30,7 +31,6 @@ class UltimateTicTacToe {
         this.restartButton = document.getElementById('restartBtn');
         this.toggleThemeButton = document.getElementById('toggleAIBtn');
         this.difficultySelect = document.getElementById('difficultySelect');
-        this.difficultyModal = document.getElementById('difficultyModal');
         
         // Add overlay element
         this.overlayElement = document.getElementById('gameOverlay');
@@ -53,6 +53,10 @@ class UltimateTicTacToe {
         return Array(3).fill(null).map(() => Array(3).fill(null));
     }
 
+    createTrajectory() {
+        return { states: [], actions: [], rewards: [], moves: [] };
+    }
+
     initializeBoard() {
         // Clear main board
         this.mainBoardElement.innerHTML = '';
@@ -125,13 +129,6 @@ class UltimateTicTacToe {
             const metricsElement = document.getElementById('aiMetrics');
             metricsElement.style.display = difficulty === 'medium' ? 'block' : 'none';
             
-            if (difficulty === 'hard') {
-                this.difficultyModal.style.display = 'flex';
-                e.target.value = 'easy';
-                this.difficulty = 'easy';
-                metricsElement.style.display = 'none';
-            }
-            
             // Update metrics if medium difficulty is selected
             if (difficulty === 'medium') {
                 this.updateMetrics();
@@ -155,6 +152,8 @@ class UltimateTicTacToe {
         
         // Make the move
         this.board[row][col] = this.currentPlayer;
+        // Engine move index (sub-board * 9 + cell) for the server's game log
+        this.trajectory.moves.push((Math.floor(row / 3) * 3 + Math.floor(col / 3)) * 9 + (row % 3) * 3 + col % 3);
         
         // Update active sub-board (restored original logic)
         this.activeSubRow = row % 3;
@@ -510,18 +509,19 @@ class UltimateTicTacToe {
     async aiMove() {
         if (this.gameOver || this.isAnimating) return;
 
-        if (this.difficulty === 'medium') {
+        if (this.difficulty !== 'easy') {
             try {
+                const state = this.getStateKey();
                 const response = await fetch('/api/move', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
                     },
+                    // Send the compact string encoding instead of the nested board arrays
                     body: JSON.stringify({
-                        mainBoard: this.board,
-                        metaBoard: this.metaBoard,
-                        lastMove: this.lastMove,
-                        currentPlayer: this.currentPlayer
+                        format: 'string',
+                        position: state,
+                        difficulty: this.difficulty
                     })
                 });
 
@@ -532,10 +532,19 @@ class UltimateTicTacToe {
                     const row = subBoardI * 3 + subI;
                     const col = subBoardJ * 3 + subJ;
                     
+                    // Record the learning agent's decision; the reward is filled in when the game ends
+                    if (this.difficulty === 'medium') {
+                        this.trajectory.states.push(state);
+                        this.trajectory.actions.push([subBoardI, subBoardJ, subI, subJ]);
+                        this.trajectory.rewards.push(0.0);
+                    }
+                    
                     await this.makeMove(row, col);
                     
                     // Update metrics after AI move
-                    this.updateMetrics();
+                    if (this.difficulty === 'medium') {
+                        this.updateMetrics();
+                    }
                 }
             } catch (error) {
                 console.error('Error making AI move:', error);
@@ -576,6 +585,8 @@ class UltimateTicTacToe {
         this.activeSubCol = null;
         this.winner = null;
         this.gameOver = false;
+        this.lastMove = null;
+        this.trajectory = this.createTrajectory();
         this.initializeBoard();
     }
 
@@ -617,19 +628,20 @@ class UltimateTicTacToe {
     }
 
     async sendTrainingData() {
+        // Send the whole game in one request; only the final move is rewarded
+        const trajectory = this.trajectory;
+        this.trajectory = this.createTrajectory();
+        if (trajectory.states.length === 0) return;
+        trajectory.rewards[trajectory.rewards.length - 1] =
+            this.winner === this.PLAYER_O ? 1.0 : (this.winner === this.PLAYER_X ? -1.0 : 0.0);
+
         try {
-            const response = await fetch('/api/train', {
+            const response = await fetch('/api/train/batch', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    state: this.getStateKey(),
-                    action: this.lastMove,
-                    reward: this.winner === this.PLAYER_O ? 1.0 : (this.winner === this.PLAYER_X ? -1.0 : 0.0),
-                    nextState: this.getStateKey(),
-                    nextValidActions: this.getValidActions()
-                })
+                body: JSON.stringify(trajectory)
             });
             
             if (response.ok) {
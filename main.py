@@ -1,6 +1,11 @@
+import argparse
 import pygame
 import sys
-import random
+from ai_driver import AIDriver
+from arena import POLICIES
+from engine import move_to_row_col
+from game_core import PLAYER_O, PLAYER_X, GameCore
+from selfplay import random_policy
 
 # --- Constants and settings ---
 WINDOW_WIDTH = 800
@@ -26,13 +31,49 @@ HIGHLIGHT_COLOR = (255, 255, 200)
 GRID_COLOR = (150, 150, 150)
 THICK_LINE_COLOR = (50, 50, 50)
 
-# Game markers
-EMPTY = None
-PLAYER_X = "X"
-PLAYER_O = "O"
+# Screen regions redrawn independently; the board rect covers the thick outer grid lines
+# and the status rect runs to the bottom edge, where the sub-board line overflows its panel
+BOARD_RECT = pygame.Rect(MARGIN, MARGIN, BOARD_SIZE, BOARD_SIZE).inflate(6, 6)
+META_RECT = pygame.Rect(WINDOW_WIDTH - META_BOARD_SIZE - MARGIN, MARGIN,
+                        META_BOARD_SIZE, META_BOARD_SIZE).inflate(4, 4)
+STATUS_RECT = pygame.Rect(MARGIN, MARGIN + BOARD_SIZE + 10,
+                          WINDOW_WIDTH - 2 * MARGIN, WINDOW_HEIGHT - BOARD_SIZE - MARGIN - 10)
+INSTRUCTIONS_RECT = pygame.Rect(WINDOW_WIDTH - META_BOARD_SIZE - MARGIN, META_BOARD_SIZE + MARGIN + 10,
+                                META_BOARD_SIZE + MARGIN, 8 * 20)
 
-class UltimateTicTacToe:
-    def __init__(self):
+# The AI's move arrives from its worker thread as this event
+AI_MOVE_EVENT = pygame.USEREVENT + 1
+# Status bar area of the "AI thinking" indicator, animated every INDICATOR_INTERVAL ms
+THINKING_RECT = pygame.Rect(STATUS_RECT.right - 180, STATUS_RECT.top, 180, 40)
+INDICATOR_INTERVAL = 100
+
+INSTRUCTIONS = [
+    "How to play:",
+    "- Click to make a move",
+    "- You must play in the sub-board",
+    "  corresponding to the last move",
+    "- Win 3 sub-boards in a row to win",
+    "",
+    "Press 'R' to restart",
+    "Press 'A' to toggle AI"
+]
+
+class UltimateTicTacToe(GameCore):
+    """Pygame client.
+
+    By default the loop sleeps in pygame.event.wait() until there is input
+    or an AI move is due, and repaints only the screen rectangles marked
+    dirty by a state change. Marks and text are pre-rendered once and
+    blitted. full_redraw=True keeps the original loop that repaints the
+    whole window at 60 FPS.
+
+    The AI (policy, a random mover by default) searches on a worker thread
+    through an AIDriver, so the window keeps responding during long
+    searches. With ponder_limit > 0 it also searches during the human's
+    turn.
+    """
+
+    def __init__(self, full_redraw=False, policy=None, ponder_limit=0.0):
         # Initialize pygame
         pygame.init()
         
@@ -45,153 +86,75 @@ class UltimateTicTacToe:
         self.font = pygame.font.SysFont("Arial", 30)
         self.small_font = pygame.font.SysFont("Arial", 18)
         
-        # Game state
-        self.board = self.create_board()
-        self.meta_board = [[None for _ in range(3)] for _ in range(3)]
-        self.current_player = PLAYER_X
-        self.active_sub_row = None
-        self.active_sub_col = None
-        self.winner = None
-        self.game_over = False
+        # Rendering: pre-rendered surfaces and the rectangles to repaint
+        self.full_redraw = full_redraw
+        self.surface_cache = {}
+        self.dirty = []
         
-        # For highlighting the last move
-        self.last_move = None
+        # The driver must exist before the core's reset() cancels it
+        policy = policy or random_policy
+        agent = getattr(policy, '__self__', None)
+        self.ai_driver = AIDriver(policy, self.post_ai_move, getattr(agent, 'stop', None), ponder_limit,
+                                  getattr(agent, 'resume', None))
+        
+        # Game state lives in the headless core
+        super().__init__()
         
         # AI settings
         self.ai_enabled = True
         self.ai_delay = 0
         self.ai_timer = 0
 
-    def create_board(self):
-        """Initialize a 9x9 Ultimate Tic-Tac-Toe board filled with empty cells."""
-        return [[EMPTY for _ in range(9)] for _ in range(9)]
-
-    def get_sub_board_indices(self, sub_row, sub_col):
-        """Get the range of rows and cols in the main board for a sub-board."""
-        row_start = sub_row * 3
-        col_start = sub_col * 3
-        return range(row_start, row_start + 3), range(col_start, col_start + 3)
+    def reset(self):
+        """Start a new game and repaint the whole window."""
+        self.ai_driver.cancel()
+        super().reset()
+        self.mark_dirty(self.window.get_rect())
 
-    def check_sub_board_winner(self, board, sub_row, sub_col):
-        """Check if there's a winner in the specified 3x3 sub-board."""
-        rows, cols = self.get_sub_board_indices(sub_row, sub_col)
-        
-        # Extract the sub-board
-        sub = []
-        for r in rows:
-            sub_row_vals = []
-            for c in cols:
-                sub_row_vals.append(board[r][c])
-            sub.append(sub_row_vals)
-
-        # Check rows
-        for r in range(3):
-            if sub[r][0] == sub[r][1] == sub[r][2] and sub[r][0] is not EMPTY:
-                return sub[r][0]
-
-        # Check columns
-        for c in range(3):
-            if sub[0][c] == sub[1][c] == sub[2][c] and sub[0][c] is not EMPTY:
-                return sub[0][c]
-
-        # Check diagonals
-        if sub[0][0] == sub[1][1] == sub[2][2] and sub[0][0] is not EMPTY:
-            return sub[0][0]
-        if sub[0][2] == sub[1][1] == sub[2][0] and sub[0][2] is not EMPTY:
-            return sub[0][2]
-
-        return None  # No winner
-
-    def check_global_winner(self):
-        """Check if there's a winner on the meta-board."""
-        # Update the meta-board first
-        self.update_meta_board()
-        
-        # Check rows
-        for r in range(3):
-            if self.meta_board[r][0] == self.meta_board[r][1] == self.meta_board[r][2] and self.meta_board[r][0] is not None:
-                return self.meta_board[r][0]
-
-        # Check columns
-        for c in range(3):
-            if self.meta_board[0][c] == self.meta_board[1][c] == self.meta_board[2][c] and self.meta_board[0][c] is not None:
-                return self.meta_board[0][c]
-
-        # Check diagonals
-        if self.meta_board[0][0] == self.meta_board[1][1] == self.meta_board[2][2] and self.meta_board[0][0] is not None:
-            return self.meta_board[0][0]
-        if self.meta_board[0][2] == self.meta_board[1][1] == self.meta_board[2][0] and self.meta_board[0][2] is not None:
-            return self.meta_board[0][2]
+    def make_move(self, row, col):
+        """Make a move and mark the regions it changes as dirty."""
+        before = self.highlighted_rects()
+        if not super().make_move(row, col):
+            return False
+        self.mark_dirty(*before, *self.highlighted_rects(), META_RECT, STATUS_RECT)
+        return True
 
-        return None  # No global winner yet
+    def undo_move(self):
+        """Take back the last move and mark the regions it changes as dirty."""
+        before = self.highlighted_rects()
+        if not super().undo_move():
+            return False
+        self.mark_dirty(*before, *self.highlighted_rects(), META_RECT, STATUS_RECT)
+        return True
 
-    def update_meta_board(self):
-        """Update the meta-board with sub-board winners."""
-        for sr in range(3):
-            for sc in range(3):
-                self.meta_board[sr][sc] = self.check_sub_board_winner(self.board, sr, sc)
+    def ai_to_move(self):
+        """Whether the AI should play now."""
+        return self.current_player == PLAYER_O and self.ai_enabled and not self.game_over
 
-    def get_valid_moves(self):
-        """Return valid moves based on the active sub-board."""
-        valid_moves = []
-        
-        if self.active_sub_row is None or self.active_sub_col is None:
-            # First move or no valid sub-board - can play anywhere
-            for r in range(9):
-                for c in range(9):
-                    if self.board[r][c] is EMPTY:
-                        valid_moves.append((r, c))
-        else:
-            # Normal play - must play in the active sub-board if it has empty cells
-            rows, cols = self.get_sub_board_indices(self.active_sub_row, self.active_sub_col)
-            for r in rows:
-                for c in cols:
-                    if self.board[r][c] is EMPTY:
-                        valid_moves.append((r, c))
-            
-            # If the active sub-board is full, can play anywhere on the board
-            if not valid_moves:
-                for r in range(9):
-                    for c in range(9):
-                        if self.board[r][c] is EMPTY:
-                            valid_moves.append((r, c))
-        
-        return valid_moves
+    def ai_move(self):
+        """Start the AI's search; the move arrives later as an AI_MOVE_EVENT."""
+        if not self.ai_to_move() or self.ai_driver.thinking or self.ai_driver.error is not None:
+            return
+        self.ai_driver.request(self.engine)
+        self.mark_dirty(THINKING_RECT)
 
-    def make_move(self, row, col):
-        """Make a move at the given position if valid."""
-        valid_moves = self.get_valid_moves()
-        
-        if (row, col) in valid_moves:
-            self.board[row][col] = self.current_player
-            self.last_move = (row, col)
-            
-            # Update active sub-board for next turn
-            self.active_sub_row = row % 3
-            self.active_sub_col = col % 3
-            
-            # Update meta-board
-            self.update_meta_board()
-            
-            # Check for winner
-            self.winner = self.check_global_winner()
-            if self.winner:
-                self.game_over = True
-            
-            # Switch player
-            self.current_player = PLAYER_O if self.current_player == PLAYER_X else PLAYER_X
-            return True
-        return False
+    def post_ai_move(self, move, generation):
+        """Called on the AI's worker thread with the move it found, or None if its search failed."""
+        pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, move=move, generation=generation))
 
-    def ai_move(self):
-        """Make a random AI move."""
-        if self.game_over or self.current_player != PLAYER_O or not self.ai_enabled:
+    def play_ai_move(self, move, generation):
+        """Play a move delivered by the AI unless its search was cancelled."""
+        if move is None:
+            if self.ai_driver.current(generation):
+                # The search failed: pause the AI until the player turns it back on with A
+                self.ai_enabled = False
+                self.mark_dirty(THINKING_RECT)
             return
-        
-        valid_moves = self.get_valid_moves()
-        if valid_moves:
-            move = random.choice(valid_moves)
-            self.make_move(move[0], move[1])
+        if not self.ai_driver.accept(generation) or not self.ai_to_move():
+            return
+        self.make_move(*move_to_row_col(move))
+        if not self.game_over:
+            self.ai_driver.ponder(self.engine)
 
     def draw_x(self, surface, x, y, size, thickness=2, color=BLUE):
         """Draw an X marker."""
@@ -207,6 +170,46 @@ class UltimateTicTacToe:
         pygame.draw.circle(surface, color, (x + size // 2, y + size // 2), 
                           size // 2 - margin, thickness)
 
+    def mark_surface(self, player, size, thickness):
+        """Transparent surface holding one X or O mark, rendered once per size."""
+        key = ('mark', player, size, thickness)
+        surface = self.surface_cache.get(key)
+        if surface is None:
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            if player == PLAYER_X:
+                self.draw_x(surface, 0, 0, size, thickness)
+            else:
+                self.draw_o(surface, 0, 0, size, thickness)
+            self.surface_cache[key] = surface
+        return surface
+
+    def text_surface(self, font, text, color):
+        """Rendered text, cached by font, string and color."""
+        key = ('text', font, text, color)
+        surface = self.surface_cache.get(key)
+        if surface is None:
+            surface = self.surface_cache[key] = font.render(text, True, color)
+        return surface
+
+    def sub_board_rect(self, sub_row, sub_col):
+        """Screen rectangle of a sub-board including its border lines."""
+        sub_board_size = (BOARD_SIZE // 9) * 3
+        return pygame.Rect(MARGIN + sub_col * sub_board_size, MARGIN + sub_row * sub_board_size,
+                           sub_board_size, sub_board_size).inflate(6, 6)
+
+    def highlighted_rects(self):
+        """Sub-boards drawn with a highlight: the active one and the one holding the last move."""
+        rects = []
+        if self.active_sub_row is not None:
+            rects.append(self.sub_board_rect(self.active_sub_row, self.active_sub_col))
+        if self.last_move:
+            rects.append(self.sub_board_rect(self.last_move[0] // 3, self.last_move[1] // 3))
+        return rects
+
+    def mark_dirty(self, *rects):
+        """Queue screen rectangles for the next repaint."""
+        self.dirty.extend(rects)
+
     def draw_grid(self, surface, x, y, size, cell_size):
         """Draw a 3x3 grid."""
         for i in range(4):  # Draw 4 lines for 3x3 grid
@@ -281,10 +284,8 @@ class UltimateTicTacToe:
                         cell_x = sub_x + c_idx * cell_size
                         cell_y = sub_y + r_idx * cell_size
                         
-                        if self.board[r][c] == PLAYER_X:
-                            self.draw_x(self.window, cell_x, cell_y, cell_size, 3)
-                        elif self.board[r][c] == PLAYER_O:
-                            self.draw_o(self.window, cell_x, cell_y, cell_size, 3)
+                        if self.board[r][c] is not None:
+                            self.window.blit(self.mark_surface(self.board[r][c], cell_size, 3), (cell_x, cell_y))
 
     def draw_meta_board(self):
         """Draw the smaller meta-board showing sub-board winners."""
@@ -305,10 +306,8 @@ class UltimateTicTacToe:
                 cell_x = meta_x + c * cell_size
                 cell_y = meta_y + r * cell_size
                 
-                if self.meta_board[r][c] == PLAYER_X:
-                    self.draw_x(self.window, cell_x, cell_y, cell_size, 2)
-                elif self.meta_board[r][c] == PLAYER_O:
-                    self.draw_o(self.window, cell_x, cell_y, cell_size, 2)
+                if self.meta_board[r][c] is not None:
+                    self.window.blit(self.mark_surface(self.meta_board[r][c], cell_size, 2), (cell_x, cell_y))
 
     def draw_status_bar(self):
         """Draw the status bar with game info."""
@@ -335,57 +334,83 @@ class UltimateTicTacToe:
             
             if self.active_sub_row is not None:
                 sub_board_text = f"Active sub-board: ({self.active_sub_row}, {self.active_sub_col})"
-                sub_board_render = self.small_font.render(sub_board_text, True, DARK_GRAY)
+                sub_board_render = self.text_surface(self.small_font, sub_board_text, DARK_GRAY)
                 self.window.blit(sub_board_render, (status_x + 10, status_y + 40))
+            
+            if self.ai_driver.thinking:
+                dots = '.' * (pygame.time.get_ticks() // 300 % 4)
+                thinking_render = self.text_surface(self.small_font, "AI thinking" + dots, DARK_GRAY)
+                self.window.blit(thinking_render, (THINKING_RECT.x + 10, THINKING_RECT.y + 15))
+            elif self.ai_driver.error is not None:
+                error_render = self.text_surface(self.small_font, "AI failed (A: retry)", RED)
+                self.window.blit(error_render, (THINKING_RECT.x + 10, THINKING_RECT.y + 15))
         
         # Render the status text
-        status_render = self.font.render(status_text, True, text_color)
+        status_render = self.text_surface(self.font, status_text, text_color)
         self.window.blit(status_render, (status_x + 10, status_y + 10))
 
     def draw_instructions(self):
         """Draw game instructions."""
-        instr_x = WINDOW_WIDTH - META_BOARD_SIZE - MARGIN
-        instr_y = META_BOARD_SIZE + MARGIN + 10
-        
-        instructions = [
-            "How to play:",
-            "- Click to make a move",
-            "- You must play in the sub-board",
-            "  corresponding to the last move",
-            "- Win 3 sub-boards in a row to win",
-            "",
-            "Press 'R' to restart",
-            "Press 'A' to toggle AI"
-        ]
-        
-        for i, line in enumerate(instructions):
-            instr_render = self.small_font.render(line, True, DARK_GRAY)
-            self.window.blit(instr_render, (instr_x, instr_y + i * 20))
-
-    def check_for_draw(self):
-        """Check if the game is a draw (board full with no winner)."""
-        for r in range(9):
-            for c in range(9):
-                if self.board[r][c] is EMPTY:
-                    return False
-        return True
+        panel = self.surface_cache.get('instructions')
+        if panel is None:
+            # The instructions never change, so render them into one surface
+            panel = pygame.Surface(INSTRUCTIONS_RECT.size, pygame.SRCALPHA)
+            for i, line in enumerate(INSTRUCTIONS):
+                panel.blit(self.small_font.render(line, True, DARK_GRAY), (0, i * 20))
+            self.surface_cache['instructions'] = panel
+        self.window.blit(panel, INSTRUCTIONS_RECT.topleft)
+
+    def draw_frame(self, area=None):
+        """Draw every screen element that overlaps area (the whole window by default)."""
+        area = area or self.window.get_rect()
+        self.window.fill(GRAY, area)
+        if area.colliderect(BOARD_RECT):
+            self.draw_main_board()
+        if area.colliderect(META_RECT):
+            self.draw_meta_board()
+        if area.colliderect(STATUS_RECT):
+            self.draw_status_bar()
+        if area.colliderect(INSTRUCTIONS_RECT):
+            self.draw_instructions()
 
-    def handle_events(self):
-        """Handle pygame events."""
-        for event in pygame.event.get():
+    def repaint(self):
+        """Redraw the dirty rectangles and push only those to the display."""
+        if not self.dirty:
+            return
+        window_rect = self.window.get_rect()
+        rects = [rect.clip(window_rect) for rect in self.dirty]
+        self.dirty = []
+        for rect in rects:
+            self.window.set_clip(rect)
+            self.draw_frame(rect)
+        self.window.set_clip(None)
+        pygame.display.update(rects)
+
+    def handle_events(self, events=None):
+        """Handle pygame events (by default, everything queued)."""
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r:  # Reset game
-                    self.__init__()
+                    self.reset()
                 elif event.key == pygame.K_a:  # Toggle AI
                     self.ai_enabled = not self.ai_enabled
+                    # Stops the search when turning the AI off and clears a failed search's error either way
+                    self.ai_driver.cancel()
+                    self.mark_dirty(THINKING_RECT)
+            
+            elif event.type == AI_MOVE_EVENT:
+                self.play_ai_move(event.move, event.generation)
+            
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.mark_dirty(self.window.get_rect())
             
             elif event.type == pygame.MOUSEBUTTONDOWN and not self.game_over:
                 if self.current_player == PLAYER_X:  # Only handle clicks for human player
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
+                    mouse_x, mouse_y = event.pos
                     board_x = MARGIN
                     board_y = MARGIN
                     
@@ -400,40 +425,87 @@ class UltimateTicTacToe:
                         # Try to make a move
                         self.make_move(row, col)
 
+    def check_game_end(self):
+        """End the game when the board is full with no winner."""
+        if not self.game_over and self.check_for_draw():
+            self.game_over = True
+            self.mark_dirty(STATUS_RECT, *self.highlighted_rects())
+
     def run(self):
         """Main game loop."""
+        if self.full_redraw:
+            return self.run_full_redraw()
+        # Pointer motion would only wake the loop for nothing
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        self.mark_dirty(self.window.get_rect())
+        ai_due = None
+        
+        while True:
+            self.repaint()
+            
+            # Sleep until input arrives or the AI's move is due
+            if self.ai_driver.thinking:
+                # Wake for the AI's move or the next frame of the thinking indicator
+                ai_due = None
+                events = [pygame.event.wait(INDICATOR_INTERVAL)]
+                self.mark_dirty(THINKING_RECT)
+            elif self.ai_to_move():
+                if ai_due is None:
+                    ai_due = pygame.time.get_ticks() + self.ai_delay
+                wait = ai_due - pygame.time.get_ticks()
+                events = [pygame.event.wait(wait)] if wait > 0 else []
+            else:
+                ai_due = None
+                events = [pygame.event.wait()]
+            self.handle_events(events + pygame.event.get())
+            
+            if ai_due is not None and self.ai_to_move() and pygame.time.get_ticks() >= ai_due:
+                self.ai_move()
+                ai_due = None
+            
+            self.check_game_end()
+
+    def run_full_redraw(self):
+        """Original game loop: repaint the whole window every frame at 60 FPS."""
         clock = pygame.time.Clock()
         
         while True:
             # Handle events
             self.handle_events()
             
-            # Clear the screen
-            self.window.fill(GRAY)
-            
-            # Draw game elements
-            self.draw_main_board()
-            self.draw_meta_board()
-            self.draw_status_bar()
-            self.draw_instructions()
+            # Draw game elements (the AI searches on its own thread meanwhile)
+            self.draw_frame()
+            self.dirty = []
             
             # Update display
             pygame.display.flip()
             
             # AI move if it's the AI's turn
-            if self.current_player == PLAYER_O and self.ai_enabled and not self.game_over:
+            if self.ai_to_move():
                 self.ai_timer += clock.get_time()
                 if self.ai_timer >= self.ai_delay:
                     self.ai_move()
                     self.ai_timer = 0
             
             # Check for draw
-            if not self.game_over and self.check_for_draw():
-                self.game_over = True
+            self.check_game_end()
             
             # Cap at 60 FPS
             clock.tick(60)
 
 if __name__ == "__main__":
-    game = UltimateTicTacToe()
+    parser = argparse.ArgumentParser(description="Play Ultimate Tic-Tac-Toe against an AI")
+    parser.add_argument('--full-redraw', action='store_true',
+                        help="repaint the whole window at 60 FPS instead of waiting for events")
+    parser.add_argument('--ai', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--time-limit', type=float, default=1.0, help="seconds per move for search AIs")
+    parser.add_argument('--iterations', type=int, help="fixed MCTS iterations per move instead of a time limit")
+    parser.add_argument('--model', default='q_learning_model.pkl', help="model file for the qlearning AI")
+    parser.add_argument('--approx-model', default='approx_model.pkl', help="model file for the approx AI")
+    parser.add_argument('--epsilon', type=float, default=0.0, help="exploration rate of the learned AIs")
+    parser.add_argument('--ponder', type=float, default=0.0, metavar='SECONDS',
+                        help="let search AIs keep thinking for up to SECONDS during your turn")
+    args = parser.parse_args()
+    game = UltimateTicTacToe(full_redraw=args.full_redraw, policy=POLICIES[args.ai](args),
+                             ponder_limit=args.ponder)
     game.run()
\ No newline at end of file
@@ -0,0 +1,164 @@
+import argparse
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from persistence import log_filename, read_log_generation, write_snapshot
+
+# File layout: header, then `capacity` fixed-size slots, then all Q-values as float32
+TABLE_MAGIC = b'UTTQ'
+TABLE_VERSION = 1
+HEADER = struct.Struct('<4sHHIQQQ')  # magic, version, slot size, capacity bits, count, value count, crc32
+SLOT = struct.Struct('<19sB4xQ')      # state key, number of actions (0 = empty slot), value offset
+KEY_BYTES = 19
+MAX_LOAD_FACTOR = 0.5
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def slot_hash(state: int) -> int:
+    """Mix a packed state key down to a 64-bit hash (Fibonacci hashing)"""
+    h = (state ^ (state >> 61) ^ (state >> 122)) & MASK_64
+    return (h * 0x9E3779B97F4A7C15) & MASK_64
+
+
+def write_table(filename: str, q_table: Dict[int, np.ndarray]):
+    """Write a Q-table as an open-addressing hash table file, replacing filename atomically"""
+    capacity_bits = 3
+    while len(q_table) > (1 << capacity_bits) * MAX_LOAD_FACTOR:
+        capacity_bits += 1
+    capacity = 1 << capacity_bits
+    shift = 64 - capacity_bits
+
+    slots = bytearray(capacity * SLOT.size)
+    values = []
+    value_count = 0
+    for state, q_values in q_table.items():
+        slot = slot_hash(state) >> shift
+        while slots[slot * SLOT.size + KEY_BYTES]:
+            slot = (slot + 1) & (capacity - 1)
+        SLOT.pack_into(slots, slot * SLOT.size, state.to_bytes(KEY_BYTES, 'big'), len(q_values), value_count)
+        values.append(np.asarray(q_values, dtype=np.float32))
+        value_count += len(q_values)
+    body = bytes(slots) + (np.concatenate(values).tobytes() if values else b'')
+
+    header = HEADER.pack(TABLE_MAGIC, TABLE_VERSION, SLOT.size, capacity_bits, len(q_table), value_count,
+                         zlib.crc32(body))
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class MappedQTable:
+    """Read-only Q-table file opened with mmap.
+
+    Lookups probe the slot array in place and return NumPy views straight
+    into the mapping, so processes opening the same file share one copy in
+    the page cache and opening costs the same regardless of table size.
+    """
+
+    def __init__(self, filename: str, verify: bool = False):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slot_size, capacity_bits, count, value_count, checksum = HEADER.unpack_from(self.mm)
+        if magic != TABLE_MAGIC:
+            raise ValueError(f"{filename} is not a Q-table file")
+        if version != TABLE_VERSION or slot_size != SLOT.size:
+            raise ValueError(f"{filename} has unsupported Q-table version {version}")
+        self.capacity = 1 << capacity_bits
+        self.shift = 64 - capacity_bits
+        self.count = count
+        self.checksum = checksum
+        self.values_offset = HEADER.size + self.capacity * SLOT.size
+        if len(self.mm) != self.values_offset + value_count * 4:
+            raise ValueError(f"{filename} is truncated")
+        if verify and not self.verify():
+            raise ValueError(f"{filename} failed its checksum")
+
+    def verify(self) -> bool:
+        """Check the stored CRC32 against the file body (reads the whole file)"""
+        return zlib.crc32(memoryview(self.mm)[HEADER.size:]) == self.checksum
+
+    def get(self, state: int) -> Optional[np.ndarray]:
+        """Get the read-only Q-value vector for a state, or None if absent"""
+        key = state.to_bytes(KEY_BYTES, 'big')
+        mm = self.mm
+        mask = self.capacity - 1
+        slot = slot_hash(state) >> self.shift
+        while True:
+            offset = HEADER.size + slot * SLOT.size
+            num_actions = mm[offset + KEY_BYTES]
+            if not num_actions:
+                return None
+            if mm[offset:offset + KEY_BYTES] == key:
+                value_offset = SLOT.unpack_from(mm, offset)[2]
+                return np.frombuffer(mm, dtype=np.float32, count=num_actions,
+                                     offset=self.values_offset + value_offset * 4)
+            slot = (slot + 1) & mask
+
+    def __contains__(self, state: int) -> bool:
+        return self.get(state) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Iterate over (state, read-only Q-values) pairs"""
+        for slot in range(self.capacity):
+            key, num_actions, value_offset = SLOT.unpack_from(self.mm, HEADER.size + slot * SLOT.size)
+            if num_actions:
+                yield int.from_bytes(key, 'big'), np.frombuffer(
+                    self.mm, dtype=np.float32, count=num_actions, offset=self.values_offset + value_offset * 4)
+
+    def close(self):
+        """Unmap the file; views returned by get() must not be used afterwards"""
+        self.mm.close()
+
+
+def convert(model_filename: str, table_filename: str, reset_model: bool = True) -> int:
+    """Convert a pickled model (plus its update log) to a Q-table file and return the entry count.
+
+    An existing table file is merged under the model's Q-table, so converting
+    again after a reset keeps the previous base. With reset_model the pickled
+    model is rewritten with an empty Q-table so it only holds changes made on
+    top of the new base table.
+    """
+    from medium import QLearningAgent
+
+    agent = QLearningAgent()
+    agent.load_model(model_filename)
+    q_table = agent.q_table
+    if os.path.exists(table_filename):
+        base = MappedQTable(table_filename, verify=True)
+        q_table = {state: q_values.copy() for state, q_values in base.items()}
+        base.close()
+        q_table.update(agent.q_table)
+    write_table(table_filename, q_table)
+    if reset_model:
+        # Tag the snapshot with a log position no existing log matches, then drop the log
+        write_snapshot(model_filename, {
+            'q_table': {},
+            'metrics': agent.learning_metrics,
+            'epsilon': agent.epsilon,
+            'log_position': (read_log_generation(model_filename) + 1, 0)
+        })
+        if os.path.exists(log_filename(model_filename)):
+            os.remove(log_filename(model_filename))
+    return len(q_table)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a pickled Q-learning model to a memory-mapped Q-table file")
+    parser.add_argument('model', nargs='?', default='q_learning_model.pkl')
+    parser.add_argument('table', nargs='?', default='q_learning_model.qtb')
+    parser.add_argument('--keep-model', action='store_true', help="leave the pickled Q-table in place")
+    args = parser.parse_args()
+    print(f"Wrote {convert(args.model, args.table, not args.keep_model)} states to {args.table}")
@@ -0,0 +1,164 @@
+import math
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from engine import MOVE_BOARD, MOVE_CELL, WIN_TABLE, Board, move_to_action
+
+
+class Node:
+    """A search tree node for the position reached by playing `move`"""
+
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move: int, parent: Optional['Node'], untried: List[int]):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried  # legal moves not expanded yet
+        self.visits = 0
+        self.wins = 0.0         # from the view of the player who played `move`
+
+
+def rollout_move(board: Board, moves: List[int]) -> int:
+    """Pick a rollout move: take a sub-board-winning move if there is one, else a random move"""
+    masks = board.masks[board.player]
+    claimed = board.meta[0] | board.meta[1]
+    for move in moves:
+        b = MOVE_BOARD[move]
+        if not claimed >> b & 1 and WIN_TABLE[masks[b] | (1 << MOVE_CELL[move])]:
+            return move
+    return random.choice(moves)
+
+
+class MCTSAgent:
+    """Monte Carlo Tree Search player using UCT with a per-move time or iteration budget.
+
+    The tree of the previous move is kept and reused when the next position
+    is a child or grandchild of its root.
+    """
+
+    def __init__(self, time_limit: float = 0.2, max_iterations: Optional[int] = None,
+                 exploration: float = math.sqrt(2), heuristic_rollouts: bool = True):
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.exploration = exploration
+        self.heuristic_rollouts = heuristic_rollouts
+        self.root = None
+        self.root_board = None
+        self.deadline = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()  # set by stop(), cleared only by resume()
+        self.last_stats = {}
+
+    def choose_action(self, main_board: List[List[str]], meta_board: List[List[str]],
+                      last_move: Tuple[int, int], current_player: str) -> Tuple[int, int, int, int]:
+        """Choose an action for the player to move within the search budget"""
+        board = Board.from_lists(main_board, meta_board, last_move, current_player)
+        return move_to_action(self.choose_move(board))
+
+    def choose_move(self, board: Board) -> int:
+        """Search from an engine board and return the most visited move"""
+        with self.lock:
+            start = time.perf_counter()
+            root = self.find_root(board)
+            reused = root.visits
+            iterations = self.search(root, board)
+            elapsed = time.perf_counter() - start
+
+            best = max(root.children, key=lambda child: child.visits)
+            self.root, self.root_board = root, board.copy()
+            self.last_stats = {
+                'iterations': iterations,
+                'iterations_per_second': iterations / elapsed if elapsed > 0 else 0.0,
+                'reused_visits': reused,
+                'root_visits': root.visits,
+                'best_value': best.wins / best.visits,
+            }
+            return best.move
+
+    def stop(self):
+        """Make a running search return its best move so far; later searches stay cut short until resume()"""
+        self.stop_event.set()
+
+    def resume(self):
+        """Let searches run to their budget again; called by whoever starts the next search after a stop()"""
+        self.stop_event.clear()
+
+    def find_root(self, board: Board) -> Node:
+        """Reuse the subtree for board if it is a child or grandchild of the last root"""
+        key = board.key()
+        if self.root is not None:
+            if self.root_board.key() == key:
+                return self.root
+            for child in self.root.children:
+                child_board = self.root_board.copy()
+                child_board.play(child.move)
+                if child_board.key() == key:
+                    child.parent = None
+                    return child
+                for grandchild in child.children:
+                    child_board.play(grandchild.move)
+                    if child_board.key() == key:
+                        grandchild.parent = None
+                        return grandchild
+                    child_board.undo()
+        return Node(-1, None, board.legal_moves())
+
+    def search(self, root: Node, board: Board) -> int:
+        """Run UCT iterations on board until the budget runs out and return how many ran"""
+        self.deadline = time.perf_counter() + self.time_limit if self.max_iterations is None else float('inf')
+        iterations = 0
+        exploration = self.exploration
+        while True:
+            if self.max_iterations is not None and iterations >= self.max_iterations:
+                break
+            # At least one iteration, so the root has a child to return after stop()
+            if iterations and (time.perf_counter() >= self.deadline or self.stop_event.is_set()):
+                break
+            iterations += 1
+            node = root
+            depth = 0
+
+            # Selection
+            while not node.untried and node.children:
+                log_visits = math.log(node.visits)
+                node = max(node.children, key=lambda child: child.wins / child.visits +
+                           exploration * math.sqrt(log_visits / child.visits))
+                board.play(node.move)
+                depth += 1
+
+            # Expansion
+            if node.untried:
+                move = node.untried.pop(random.randrange(len(node.untried)))
+                board.play(move)
+                depth += 1
+                child = Node(move, node, board.legal_moves())
+                node.children.append(child)
+                node = child
+
+            # Rollout
+            rollout_depth = 0
+            moves = board.legal_moves()
+            while moves:
+                board.play(rollout_move(board, moves) if self.heuristic_rollouts else random.choice(moves))
+                rollout_depth += 1
+                moves = board.legal_moves()
+            winner = board.winner
+            for _ in range(rollout_depth):
+                board.undo()
+
+            # Backpropagation; the player who moved into a node is the one not to move after it
+            player_moved = board.player ^ 1
+            while node is not None:
+                node.visits += 1
+                if winner < 0:
+                    node.wins += 0.5
+                elif winner == player_moved:
+                    node.wins += 1.0
+                player_moved ^= 1
+                node = node.parent
+            for _ in range(depth):
+                board.undo()
+        return iterations
@@ -1,20 +1,40 @@
 import numpy as np
 import pickle
 import os
-from typing import Tuple, List, Dict
+import sys
+from collections import OrderedDict
+from itertools import islice
+from typing import Tuple, List, Dict, Union
 import random
+from engine import (Board, MOVE_SYM, PLAYER_X, PLAYERS, SYM_INVERSE, WIN_TABLE, cells_to_masks,
+                    grid_winner, legal_actions, action_to_move, move_to_action)
+from persistence import read_log_generation, replay_log, write_snapshot
+
+# Bounded Q-tables evict from this many least recently updated states at a time
+EVICTION_SAMPLE = 32
+USAGE_ENTRY_BYTES = 104  # approximate cost of one usage-tracking entry
 
 class QLearningAgent:
-    def __init__(self, learning_rate=0.1, discount_factor=0.95, epsilon=0.1, epsilon_decay=0.995, epsilon_min=0.01):
+    def __init__(self, learning_rate=0.1, discount_factor=0.95, epsilon=0.1, epsilon_decay=0.995, epsilon_min=0.01,
+                 max_states=None, max_bytes=None):
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.epsilon = epsilon
         self.epsilon_decay = epsilon_decay
         self.epsilon_min = epsilon_min
         self.q_table = {}
+        self.base_table = None  # optional read-only mapped_table.MappedQTable under q_table
+        self.shadowed_states = 0  # states present in both q_table and base_table
+        self.store = None  # optional persistence.ModelStore that logs every Q-value write
+        self.changed_states = None  # set by trainer.TrainingActor: states written since the last publish
+        self.replay = None  # optional replay.PrioritizedReplayBuffer of the transitions learned from
+        self.max_states = max_states  # optional cap on q_table entries
+        self.max_bytes = max_bytes  # optional memory budget for q_table, converted to a state cap
+        self.state_limit = None
+        # state -> visits (updates, halved each time it survives eviction), least recently updated first
+        self.usage = OrderedDict() if max_states or max_bytes else None
         self.state_history = []
         self.action_history = []
-        self.reward_history = []
         self.learning_metrics = {
             'total_games': 0,
             'wins': 0,
@@ -23,181 +43,419 @@ class QLearningAgent:
             'win_rate': 0,
             'average_reward': 0,
             'total_states': 0,
-            'exploration_rate': self.epsilon
+            'exploration_rate': self.epsilon,
+            'evicted_states': 0
         }
         
     def get_state_key(self, main_board: List[List[str]], meta_board: List[List[str]], 
-                      last_move: Tuple[int, int], current_player: str) -> str:
-        """Convert game state to a string key for Q-table"""
-        state = []
-        # Add main board state
-        for row in main_board:
-            for cell in row:
-                state.append(cell if cell else ' ')
-        # Add meta board state
-        for row in meta_board:
-            for cell in row:
-                state.append(cell if cell else ' ')
-        # Add last move and current player
-        state.extend([str(last_move[0]), str(last_move[1]), current_player])
-        return ''.join(state)
+                      last_move: Tuple[int, int], current_player: str) -> int:
+        """Convert game state to a packed integer key for Q-table, canonical under symmetry"""
+        return Board.from_lists(main_board, meta_board, last_move, current_player).canonical()[0]
+    
+    def state_board(self, state: Union[int, str, Board]) -> Board:
+        """Decode a state given as an integer key, a legacy state string or a board.
+
+        Integer keys decode to the canonical orientation, so actions paired with
+        them must be given in that orientation too.
+        """
+        if isinstance(state, Board):
+            return state
+        if isinstance(state, str):
+            return Board.from_state_string(state)
+        return Board.from_key(state)
     
     def get_valid_actions(self, main_board: List[List[str]], meta_board: List[List[str]], 
                          last_move: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
         """Get all valid actions for the current state"""
-        valid_actions = []
-        if last_move is None:
-            # First move can be anywhere
-            for i in range(3):
-                for j in range(3):
-                    for sub_i in range(3):
-                        for sub_j in range(3):
-                            valid_actions.append((i, j, sub_i, sub_j))
-        else:
-            # Must play in the sub-board corresponding to last move
-            sub_board_i, sub_board_j = last_move
-            if meta_board[sub_board_i][sub_board_j] == ' ':
-                for sub_i in range(3):
-                    for sub_j in range(3):
-                        if main_board[sub_board_i * 3 + sub_i][sub_board_j * 3 + sub_j] == ' ':
-                            valid_actions.append((sub_board_i, sub_board_j, sub_i, sub_j))
-        return valid_actions
+        return legal_actions(main_board, meta_board, last_move)
     
     def choose_action(self, main_board: List[List[str]], meta_board: List[List[str]], 
                      last_move: Tuple[int, int], current_player: str) -> Tuple[int, int, int, int]:
         """Choose an action using epsilon-greedy policy"""
-        state = self.get_state_key(main_board, meta_board, last_move, current_player)
-        valid_actions = self.get_valid_actions(main_board, meta_board, last_move)
+        board = Board.from_lists(main_board, meta_board, last_move, current_player)
+        return move_to_action(self.choose_move(board))
+    
+    def canonical_moves(self, board: Board) -> Tuple[int, int, List[int]]:
+        """Get (key, symmetry, legal moves in canonical orientation) for a position"""
+        state, sym = board.canonical()
+        move_sym = MOVE_SYM[sym]
+        return state, sym, sorted(move_sym[move] for move in board.legal_moves())
+    
+    def choose_move(self, board: Board) -> int:
+        """Choose a move index on an engine board using epsilon-greedy policy"""
+        valid_moves = board.legal_moves()
         
         if random.random() < self.epsilon:
             # Explore: choose random action
-            return random.choice(valid_actions)
+            return random.choice(valid_moves)
         
-        # Exploit: choose best action
-        best_value = float('-inf')
-        best_actions = []
+        # Exploit: choose best action; unseen states have all values at 0
+        state, sym = board.canonical()
+        q_values = self.lookup_q_values(state)
+        if q_values is None:
+            return random.choice(valid_moves)
+        # Vectors are at most 81 long; plain Python beats NumPy's per-call overhead here
+        values = q_values.tolist()
+        best = max(values)
+        best_indices = [i for i, value in enumerate(values) if value == best]
         
-        for action in valid_actions:
-            action_key = f"{state}:{action}"
-            value = self.q_table.get(action_key, 0)
-            if value > best_value:
-                best_value = value
-                best_actions = [action]
-            elif value == best_value:
-                best_actions.append(action)
-        
-        return random.choice(best_actions)
+        # Q-values follow the canonical move order; map the pick back to this orientation
+        move_sym = MOVE_SYM[sym]
+        canonical_moves = sorted([move_sym[move] for move in valid_moves])
+        return MOVE_SYM[SYM_INVERSE[sym]][canonical_moves[random.choice(best_indices)]]
     
-    def update_metrics(self, reward, is_game_over):
-        """Update learning metrics after each game"""
-        self.learning_metrics['total_games'] += 1
+    def update_metrics(self, reward, is_game_over, decay_epsilon=True):
+        """Update learning metrics after each game; decay_epsilon=False keeps the exploration rate"""
         if is_game_over:
+            metrics = self.learning_metrics
+            metrics['total_games'] += 1
             if reward == 1.0:
-                self.learning_metrics['wins'] += 1
+                metrics['wins'] += 1
             elif reward == -1.0:
-                self.learning_metrics['losses'] += 1
+                metrics['losses'] += 1
             else:
-                self.learning_metrics['draws'] += 1
+                metrics['draws'] += 1
             
             # Update win rate
-            self.learning_metrics['win_rate'] = self.learning_metrics['wins'] / self.learning_metrics['total_games']
+            metrics['win_rate'] = metrics['wins'] / metrics['total_games']
             
-            # Update average reward
-            self.learning_metrics['average_reward'] = sum(self.reward_history) / len(self.reward_history) if self.reward_history else 0
+            # Running mean of the final reward of each game
+            metrics['average_reward'] += (reward - metrics['average_reward']) / metrics['total_games']
             
             # Update total states
-            self.learning_metrics['total_states'] = len(self.q_table)
+            metrics['total_states'] = self.count_states()
             
             # Decay epsilon and update exploration rate
-            if self.epsilon > self.epsilon_min:
+            if decay_epsilon and self.epsilon > self.epsilon_min:
                 self.epsilon *= self.epsilon_decay
-            self.learning_metrics['exploration_rate'] = self.epsilon
+            metrics['exploration_rate'] = self.epsilon
             
             # Clear history for next game
             self.state_history = []
             self.action_history = []
-            self.reward_history = []
     
     def get_metrics(self):
         """Get current learning metrics"""
         return self.learning_metrics
     
-    def update(self, state: str, action: Tuple[int, int, int, int], 
-               reward: float, next_state: str, next_valid_actions: List[Tuple[int, int, int, int]]):
+    def attach_table(self, base_table):
+        """Serve Q-values missing from q_table from a read-only (memory-mapped) table"""
+        self.base_table = base_table
+        self.shadowed_states = sum(1 for state in self.q_table if state in base_table)
+        self.learning_metrics['total_states'] = self.count_states()
+    
+    def count_states(self) -> int:
+        """Count distinct states across q_table and the base table"""
+        if self.base_table is None:
+            return len(self.q_table)
+        return len(self.q_table) + len(self.base_table) - self.shadowed_states
+    
+    def approximate_bytes(self, sample: int = 256) -> int:
+        """Estimate the memory held by q_table from a sample of its entries (the base table is not counted)"""
+        entries = list(islice(self.q_table.items(), sample))
+        if not entries:
+            return sys.getsizeof(self.q_table)
+        per_entry = sum(sys.getsizeof(state) + sys.getsizeof(q_values) for state, q_values in entries) / len(entries)
+        return sys.getsizeof(self.q_table) + int(per_entry * len(self.q_table))
+    
+    def capacity(self):
+        """Current cap on q_table entries from max_states and max_bytes, or None if unbounded"""
+        limits = []
+        if self.max_states:
+            limits.append(self.max_states)
+        if self.max_bytes:
+            per_entry = self.approximate_bytes() / max(1, len(self.q_table)) + USAGE_ENTRY_BYTES
+            limits.append(max(1, int(self.max_bytes / per_entry)))
+        return min(limits) if limits else None
+    
+    def enforce_capacity(self, keep=None) -> int:
+        """Evict states until q_table fits its cap and return how many were evicted.
+
+        Candidates are the EVICTION_SAMPLE least recently updated states; the
+        less visited half (ties broken by smaller Q-values) is evicted and the
+        rest have their visit counts halved and count as recently used, so
+        old but popular states age out slowly instead of blocking eviction.
+        """
+        if self.usage is None:
+            return 0
+        self.state_limit = self.capacity()
+        # Evict a little below the cap so the next eviction round is not due on the next insert
+        target = self.state_limit - self.state_limit // 64
+        evicted = 0
+        while len(self.q_table) > target:
+            candidates = [item for item in islice(self.usage.items(), EVICTION_SAMPLE) if item[0] != keep]
+            if not candidates:
+                break
+            candidates.sort(key=lambda item: (item[1], float(np.abs(self.q_table[item[0]]).max(initial=0.0))))
+            excess = len(self.q_table) - target
+            cut = min(excess, max(1, len(candidates) // 2))
+            for state, _ in candidates[:cut]:
+                self.remove_state(state)
+            for state, visits in candidates[cut:]:
+                self.usage[state] = visits // 2
+                self.usage.move_to_end(state)
+            evicted += cut
+        self.learning_metrics['evicted_states'] = self.learning_metrics.get('evicted_states', 0) + evicted
+        return evicted
+    
+    def remove_state(self, state: int):
+        """Drop a state from q_table; it falls back to the base table or to zeros"""
+        del self.q_table[state]
+        if self.usage is not None:
+            self.usage.pop(state, None)
+        if self.base_table is not None and state in self.base_table:
+            self.shadowed_states -= 1
+        if self.changed_states is not None:
+            self.changed_states.add(state)
+    
+    def lookup_q_values(self, state: int):
+        """Get the Q-value vector for a state without creating it, or None"""
+        q_values = self.q_table.get(state)
+        if q_values is None and self.base_table is not None:
+            q_values = self.base_table.get(state)
+        return q_values
+    
+    def get_q_values(self, state: int, num_actions: int) -> np.ndarray:
+        """Get a writable Q-value vector for a state, creating it if needed"""
+        q_values = self.q_table.get(state)
+        if q_values is None:
+            base_values = self.base_table.get(state) if self.base_table is not None else None
+            if base_values is not None:
+                # Copy on write: the base table is shared and read-only
+                q_values = base_values.copy()
+                self.shadowed_states += 1
+            else:
+                q_values = np.zeros(num_actions, dtype=np.float32)
+            self.q_table[state] = q_values
+            if self.usage is not None:
+                self.usage[state] = 0
+                if self.state_limit is None or len(self.q_table) > self.state_limit:
+                    self.enforce_capacity(keep=state)
+        return q_values
+    
+    def max_q_value(self, state: Union[int, str, Board], valid_actions: List[Tuple[int, int, int, int]]) -> float:
+        """Get the best Q-value among the given actions, 0 for terminal or unseen states"""
+        if not valid_actions:
+            return 0.0
+        board = self.state_board(state)
+        state_key, sym, canonical_moves = self.canonical_moves(board)
+        q_values = self.lookup_q_values(state_key)
+        if q_values is None:
+            return 0.0
+        index = {move: i for i, move in enumerate(canonical_moves)}
+        move_sym = MOVE_SYM[sym]
+        indices = [index[move_sym[move]] for move in map(action_to_move, valid_actions) if move_sym[move] in index]
+        return float(q_values[indices].max()) if indices else 0.0
+    
+    def action_index(self, state: Union[int, str, Board], action: Tuple[int, int, int, int]) -> Tuple[int, int, int]:
+        """Get (canonical key, index of the action in its Q-values or -1 if illegal, number of actions)"""
+        board = self.state_board(state)
+        state_key, sym, canonical_moves = self.canonical_moves(board)
+        move = MOVE_SYM[sym][action_to_move(action)] if len(action) == 4 else None
+        i = canonical_moves.index(move) if move in canonical_moves else -1
+        return state_key, i, len(canonical_moves)
+    
+    def learn(self, state: int, index: int, num_actions: int, target: float):
+        """Move one Q-value towards a target by the learning rate"""
+        q_values = self.get_q_values(state, num_actions)
+        if self.changed_states is not None:
+            # Published snapshots share vectors with q_table; replace instead of writing in place
+            q_values = q_values.copy()
+            self.q_table[state] = q_values
+            self.changed_states.add(state)
+        q_values[index] += self.learning_rate * (target - q_values[index])
+        if self.usage is not None:
+            self.usage[state] = self.usage.get(state, 0) + 1
+            self.usage.move_to_end(state)
+        if self.store is not None:
+            self.store.record(state, index, float(q_values[index]), num_actions)
+    
+    def update(self, state: Union[int, str], action: Tuple[int, int, int, int], 
+               reward: float, next_state: Union[int, str], next_valid_actions: List[Tuple[int, int, int, int]]):
         """Update Q-values using Q-learning update rule"""
-        action_key = f"{state}:{action}"
-        current_value = self.q_table.get(action_key, 0)
-        
-        # Get max Q-value for next state
-        next_max_value = float('-inf')
-        for next_action in next_valid_actions:
-            next_action_key = f"{next_state}:{next_action}"
-            next_value = self.q_table.get(next_action_key, 0)
-            next_max_value = max(next_max_value, next_value)
+        state_key, i, num_actions = self.action_index(state, action)
         
-        # Q-learning update
-        new_value = current_value + self.learning_rate * (
-            reward + self.discount_factor * next_max_value - current_value
-        )
-        self.q_table[action_key] = new_value
+        # Actions that are not legal in the state (e.g. from a finished game) carry no Q-value
+        if i >= 0:
+            # Q-learning update
+            next_max_value = self.max_q_value(next_state, next_valid_actions)
+            self.learn(state_key, i, num_actions, reward + self.discount_factor * next_max_value)
+            if self.replay is not None:
+                next_key = self.state_board(next_state).canonical()[0] if next_valid_actions else None
+                self.replay.add(state_key, i, num_actions, reward, next_key)
         
         # Track history
-        self.state_history.append(state)
+        self.state_history.append(state_key)
         self.action_history.append(action)
-        self.reward_history.append(reward)
         
         # Update metrics
         self.update_metrics(reward, not next_valid_actions)
+        if self.store is not None:
+            self.store.touch_metrics()
+    
+    def update_trajectory(self, states: List[Union[int, str]], actions: List[Tuple[int, int, int, int]],
+                          rewards: List[float], n_step: int = 1, monte_carlo: bool = False) -> int:
+        """Learn from one finished game: the agent's states, its actions and the reward after each.
+
+        Updates run from the last move backwards so the final reward reaches
+        early moves in a single pass. Targets are n-step returns bootstrapped
+        from the best Q-value n moves later, or full Monte Carlo returns.
+        Returns the number of Q-values updated.
+        """
+        entries = [self.action_index(state, action) for state, action in zip(states, actions)]
+        self.action_history.extend(actions)
+        return self.update_entries(entries, rewards, n_step, monte_carlo)
+    
+    def update_entries(self, entries: List[Tuple[int, int, int]], rewards: List[float],
+                       n_step: int = 1, monte_carlo: bool = False, track: bool = True) -> int:
+        """Same as update_trajectory for states and actions already resolved by action_index.
+
+        With track=False only the Q-values learn: the game is not counted in
+        the metrics and epsilon does not decay, for callers that merge the
+        same games more than once or count them themselves.
+        """
+        rewards = np.asarray(rewards, dtype=np.float64)
+        horizon = len(rewards) if monte_carlo else max(1, n_step)
+        returns = discounted_returns(rewards, self.discount_factor, horizon)
+        bootstrap_discount = self.discount_factor ** horizon
+        
+        updates = 0
+        for t in range(len(entries) - 1, -1, -1):
+            state_key, i, num_actions = entries[t]
+            if i < 0:
+                continue
+            target = returns[t]
+            if t + horizon < len(entries):
+                next_values = self.lookup_q_values(entries[t + horizon][0])
+                if next_values is not None:
+                    target += bootstrap_discount * float(next_values.max())
+            self.learn(state_key, i, num_actions, target)
+            updates += 1
+            if self.replay is not None:
+                # Replay bootstraps one move ahead, whatever the horizon used here
+                next_key = entries[t + 1][0] if t + 1 < len(entries) else None
+                self.replay.add(state_key, i, num_actions, float(rewards[t]), next_key)
+        
+        if not track:
+            return updates
+        
+        # Track history
+        self.state_history.extend(entry[0] for entry in entries)
+        
+        # Update metrics once for the whole game
+        self.update_metrics(float(rewards[-1]) if len(rewards) else 0.0, True)
+        if self.store is not None:
+            self.store.touch_metrics()
+        return updates
+    
+    def replay_minibatch(self, batch_size: int = 32) -> int:
+        """Relearn a prioritised sample of stored transitions and return how many were replayed.
+
+        Each step is scaled by the transition's importance-sampling weight,
+        and its new TD error becomes its priority.
+        """
+        replay = self.replay
+        if replay is None or not len(replay):
+            return 0
+        slots, weights = replay.sample(batch_size)
+        td_errors = np.empty(len(slots))
+        for k, slot in enumerate(slots):
+            state, i, num_actions, reward, next_state = replay.transition(slot)
+            target = reward
+            if next_state is not None:
+                next_values = self.lookup_q_values(next_state)
+                if next_values is not None:
+                    target += self.discount_factor * float(next_values.max())
+            q_value = float(self.get_q_values(state, num_actions)[i])
+            td_errors[k] = target - q_value
+            self.learn(state, i, num_actions, q_value + weights[k] * td_errors[k])
+        replay.update_priorities(slots, td_errors)
+        return len(slots)
     
     def save_model(self, filename: str = 'q_learning_model.pkl'):
         """Save the Q-table and metrics to a file"""
+        if self.store is not None and self.store.filename == filename:
+            # Let the store snapshot so the file stays consistent with its update log
+            self.store.compact()
+            return
         save_data = {
             'q_table': self.q_table,
             'metrics': self.learning_metrics,
-            'epsilon': self.epsilon
+            'epsilon': self.epsilon,
+            # Match no existing update log, which predates this snapshot
+            'log_position': (read_log_generation(filename) + 1, 0)
         }
-        with open(filename, 'wb') as f:
-            pickle.dump(save_data, f)
+        write_snapshot(filename, save_data)
     
     def load_model(self, filename: str = 'q_learning_model.pkl'):
-        """Load the Q-table and metrics from a file"""
-        if os.path.exists(filename):
+        """Load the Q-table and metrics from a file, then replay its update log"""
+        log_position = None
+        if os.path.exists(filename) and os.path.getsize(filename):
             with open(filename, 'rb') as f:
                 save_data = pickle.load(f)
                 self.q_table = save_data.get('q_table', {})
+                if self.q_table and isinstance(next(iter(self.q_table)), str):
+                    self.q_table = migrate_q_table(self.q_table)
                 self.learning_metrics = save_data.get('metrics', self.learning_metrics)
                 self.epsilon = save_data.get('epsilon', self.epsilon)
-                self.learning_metrics['exploration_rate'] = self.epsilon
+                log_position = save_data.get('log_position')
+        if self.usage is not None:
+            # Visit counts are not saved; loaded states start unvisited, in file order
+            self.usage = OrderedDict.fromkeys(self.q_table, 0)
+        replay_log(self, filename, log_position)
+        self.learning_metrics.setdefault('evicted_states', 0)
+        # Older models counted every update as a game; only finished games are counted now
+        metrics = self.learning_metrics
+        metrics['total_games'] = metrics['wins'] + metrics['losses'] + metrics['draws']
+        metrics['win_rate'] = metrics['wins'] / metrics['total_games'] if metrics['total_games'] else 0
+        self.enforce_capacity()
+        self.learning_metrics['total_states'] = self.count_states()
+        self.learning_metrics['exploration_rate'] = self.epsilon
+
+def discounted_returns(rewards: np.ndarray, discount: float, horizon: int) -> np.ndarray:
+    """Sum of discounted rewards over the next `horizon` steps from every step.
+
+    Runs G_t = r_t + discount * G_{t+1} backwards and drops the reward that
+    leaves the window, discount ** horizon * r_{t+horizon}, so no power of
+    the discount is ever divided by (discount 0 and underflow stay finite).
+    """
+    steps = len(rewards)
+    returns = np.zeros(steps)
+    tail = discount ** horizon
+    g = 0.0
+    for t in range(steps - 1, -1, -1):
+        g = float(rewards[t]) + discount * g
+        if t + horizon < steps:
+            g -= tail * float(rewards[t + horizon])
+        returns[t] = g
+    return returns
+
+def migrate_q_table(legacy_table: Dict[str, float]) -> Dict[int, np.ndarray]:
+    """Convert a legacy {"state:action": value} Q-table to canonical packed keys and value vectors"""
+    q_table = {}
+    for action_key, value in legacy_table.items():
+        state, _, action = action_key.rpartition(':')
+        try:
+            action = tuple(int(v) for v in action.strip('()').split(','))
+            board = Board.from_state_string(state)
+        except (ValueError, IndexError, KeyError):
+            continue
+        if len(action) != 4 or not board.is_legal(action_to_move(action)) or not np.isfinite(value):
+            continue
+        state, sym = board.canonical()
+        canonical_moves = sorted(MOVE_SYM[sym][move] for move in board.legal_moves())
+        q_values = q_table.setdefault(state, np.zeros(len(canonical_moves), dtype=np.float32))
+        q_values[canonical_moves.index(MOVE_SYM[sym][action_to_move(action)])] = value
+    return q_table
 
 def check_winner(board: List[List[str]]) -> str:
     """Check if there's a winner in a 3x3 board"""
-    # Check rows
-    for row in board:
-        if row.count(row[0]) == 3 and row[0] != ' ':
-            return row[0]
-    
-    # Check columns
-    for col in range(3):
-        if board[0][col] == board[1][col] == board[2][col] != ' ':
-            return board[0][col]
-    
-    # Check diagonals
-    if board[0][0] == board[1][1] == board[2][2] != ' ':
-        return board[0][0]
-    if board[0][2] == board[1][1] == board[2][0] != ' ':
-        return board[0][2]
-    
-    return ' '
+    return grid_winner(board) or ' '
 
 def get_sub_board(main_board: List[List[str]], sub_board_i: int, sub_board_j: int) -> List[List[str]]:
     """Extract a sub-board from the main board"""
-    sub_board = []
-    for i in range(3):
-        row = []
-        for j in range(3):
-            row.append(main_board[sub_board_i * 3 + i][sub_board_j * 3 + j])
-        sub_board.append(row)
-    return sub_board
+    rows = main_board[sub_board_i * 3:sub_board_i * 3 + 3]
+    return [row[sub_board_j * 3:sub_board_j * 3 + 3] for row in rows]
 
 def make_move(main_board: List[List[str]], meta_board: List[List[str]], 
               action: Tuple[int, int, int, int], player: str) -> Tuple[List[List[str]], List[List[str]]]:
@@ -206,10 +464,12 @@ def make_move(main_board: List[List[str]], meta_board: List[List[str]],
     main_board[sub_board_i * 3 + sub_i][sub_board_j * 3 + sub_j] = player
     
     # Update meta board if sub-board is won
-    sub_board = get_sub_board(main_board, sub_board_i, sub_board_j)
-    winner = check_winner(sub_board)
-    if winner != ' ':
-        meta_board[sub_board_i][sub_board_j] = winner
+    if meta_board[sub_board_i][sub_board_j] not in PLAYERS:
+        rows = main_board[sub_board_i * 3:sub_board_i * 3 + 3]
+        cells = [cell for row in rows for cell in row[sub_board_j * 3:sub_board_j * 3 + 3]]
+        x_mask, o_mask = cells_to_masks(cells)
+        if WIN_TABLE[x_mask if player == PLAYER_X else o_mask]:
+            meta_board[sub_board_i][sub_board_j] = player
     
     return main_board, meta_board
 
@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from engine import Board, move_to_action
+from mcts import MCTSAgent
+
+# Time kept back from the deadline for sending results back and merging them
+RESULT_MARGIN = 0.01
+
+# Per-process search agent of pool workers, set up by init_worker
+worker_agent = None
+
+
+def init_worker(exploration: float, heuristic_rollouts: bool):
+    """Create the worker's search agent once per process"""
+    global worker_agent
+    random.seed(os.getpid() ^ time.time_ns())
+    worker_agent = MCTSAgent(exploration=exploration, heuristic_rollouts=heuristic_rollouts)
+
+
+def search_position(task: Tuple[int, float]) -> Tuple[int, List[Tuple[int, int, float]]]:
+    """Worker task: search a packed position until the shared deadline.
+
+    Returns (iterations, [(move, visits, wins)] for each root child). The
+    worker keeps its tree, so a position following the last one it searched
+    starts from the reused subtree.
+    """
+    key, deadline = task
+    board = Board.from_key(key)
+    root = worker_agent.find_root(board)
+    worker_agent.time_limit = max(0.0, deadline - time.monotonic())
+    iterations = worker_agent.search(root, board)
+    worker_agent.root, worker_agent.root_board = root, board
+    return iterations, [(child.move, child.visits, child.wins) for child in root.children]
+
+
+class ParallelMCTSAgent:
+    """Root-parallel MCTS over a process pool kept alive between moves.
+
+    Every worker searches the same position with its own tree until a
+    shared deadline, then the root statistics are summed and the most visited
+    move is played. Positions travel as the engine's packed integer key. If
+    another request is already using the pool, the move is searched in this
+    process instead of queueing behind it.
+    """
+
+    def __init__(self, time_limit: float = 0.2, workers: Optional[int] = None, **mcts_options):
+        self.time_limit = time_limit
+        self.workers = workers or os.cpu_count() or 1
+        self.local_agent = MCTSAgent(time_limit=time_limit, **mcts_options)
+        self.pool = None
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(
+                self.workers, initializer=init_worker,
+                initargs=(self.local_agent.exploration, self.local_agent.heuristic_rollouts))
+        self.pool_lock = threading.Lock()
+        self.last_stats = {}
+
+    def choose_action(self, main_board: List[List[str]], meta_board: List[List[str]],
+                      last_move: Tuple[int, int], current_player: str) -> Tuple[int, int, int, int]:
+        """Choose an action for the player to move within the search deadline"""
+        board = Board.from_lists(main_board, meta_board, last_move, current_player)
+        return move_to_action(self.choose_move(board))
+
+    def choose_move(self, board: Board) -> int:
+        """Search from an engine board on all workers, or locally if the pool is busy"""
+        if self.pool is None or not self.pool_lock.acquire(blocking=False):
+            return self.search_locally(board)
+        start = time.monotonic()
+        try:
+            deadline = start + self.time_limit - RESULT_MARGIN
+            tasks = [(board.key(), deadline)] * self.workers
+            try:
+                results = self.pool.map_async(search_position, tasks, chunksize=1).get(self.time_limit + 1.0)
+            except multiprocessing.TimeoutError:
+                return self.search_locally(board)
+        finally:
+            self.pool_lock.release()
+
+        stats: Dict[int, List[float]] = {}
+        iterations = 0
+        for worker_iterations, children in results:
+            iterations += worker_iterations
+            for move, visits, wins in children:
+                merged = stats.setdefault(move, [0, 0.0])
+                merged[0] += visits
+                merged[1] += wins
+        if not stats:
+            return self.search_locally(board)
+        best = max(stats, key=lambda move: stats[move][0])
+        visits, wins = stats[best]
+        self.last_stats = {
+            'workers': self.workers,
+            'iterations': iterations,
+            'iterations_per_second': iterations / (time.monotonic() - start),
+            'root_visits': sum(merged[0] for merged in stats.values()),
+            'best_value': wins / visits,
+            'parallel': True,
+        }
+        return best
+
+    def search_locally(self, board: Board) -> int:
+        """Single-process fallback search"""
+        move = self.local_agent.choose_move(board)
+        self.last_stats = dict(self.local_agent.last_stats, workers=1, parallel=False)
+        return move
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
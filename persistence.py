@@ -0,0 +1,228 @@
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from perf import Histogram
+
+# Log file layout: a header, then (type, length) framed records
+LOG_MAGIC = b'QLOG'
+LOG_HEADER = struct.Struct('<4sI')    # magic, generation
+RECORD_HEADER = struct.Struct('<BI')  # record type, payload length
+Q_RECORD = struct.Struct('<19sBBf')   # state key, number of actions, action index, value
+KEY_BYTES = 19                        # packed state keys fit in 152 bits
+
+RECORD_Q_VALUE = 1
+RECORD_METRICS = 2
+
+
+def log_filename(filename: str) -> str:
+    """Get the update log path that belongs to a snapshot file"""
+    return filename + '.log'
+
+
+def write_snapshot(filename: str, save_data: Dict):
+    """Pickle save_data to filename atomically (write to a temp file, fsync, rename)"""
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump(save_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def read_log_generation(filename: str) -> int:
+    """Get the generation of a snapshot file's log on disk, 0 if there is none"""
+    path = log_filename(filename)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        header = f.read(LOG_HEADER.size)
+    if len(header) < LOG_HEADER.size:
+        return 0
+    magic, generation = LOG_HEADER.unpack(header)
+    return generation if magic == LOG_MAGIC else 0
+
+
+def replay_log(agent, filename: str, log_position: Optional[Tuple[int, int]] = None) -> int:
+    """Apply the update log of a snapshot file to an agent and return the number of records applied.
+
+    log_position is the (generation, offset) stored in the snapshot. A log one
+    generation newer was compacted after the snapshot and is replayed from its
+    start; a log from any other generation does not belong to the snapshot.
+    Q-value records are absolute writes, so replaying from a slightly earlier
+    offset than needed is harmless. A torn record at the end is ignored.
+    """
+    path = log_filename(filename)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < LOG_HEADER.size:
+        return 0
+    magic, generation = LOG_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC:
+        return 0
+    offset = LOG_HEADER.size
+    if log_position is not None:
+        snapshot_generation, snapshot_offset = log_position
+        if generation == snapshot_generation:
+            offset = max(offset, snapshot_offset)
+        elif generation != snapshot_generation + 1:
+            return 0
+
+    applied = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        record_type, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if offset + length > len(data):
+            break
+        payload = data[offset:offset + length]
+        offset += length
+        if record_type == RECORD_Q_VALUE:
+            key, num_actions, index, value = Q_RECORD.unpack(payload)
+            agent.get_q_values(int.from_bytes(key, 'big'), num_actions)[index] = value
+        elif record_type == RECORD_METRICS:
+            state = json.loads(payload)
+            agent.learning_metrics = state['metrics']
+            agent.epsilon = state['epsilon']
+        applied += 1
+    return applied
+
+
+class ModelStore:
+    """Persists a QLearningAgent as a snapshot plus an append-only update log.
+
+    Updates are buffered in memory by record() and written to the log by a
+    background thread every flush_interval seconds, followed by one fsync.
+    Every snapshot_interval seconds (if anything changed) the thread writes a
+    fresh snapshot and rewrites the log to hold only the records after it.
+    """
+
+    def __init__(self, agent, filename: str = 'q_learning_model.pkl',
+                 flush_interval: float = 1.0, snapshot_interval: float = 300.0):
+        self.agent = agent
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.generation = 0
+        self.log_file = None
+        self.dirty = False
+        self.metrics_changed = False
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.flush_seconds = Histogram('uttt_log_flush_seconds', 'Update log write plus fsync time')
+        self.snapshot_seconds = Histogram('uttt_snapshot_seconds', 'Snapshot write time')
+        agent.store = self
+
+    def start(self):
+        """Write a starting snapshot, open a new log generation and start the flush thread"""
+        # Snapshot before replacing the old log, so a crash in between loses nothing
+        self.generation = read_log_generation(self.filename) + 1
+        self.write_snapshot((self.generation, LOG_HEADER.size))
+        with self.lock:
+            self.open_log(b'')
+        self.thread = threading.Thread(target=self.run, name='model-store', daemon=True)
+        self.thread.start()
+
+    def open_log(self, records: bytes):
+        """Atomically replace the log with a new generation holding records; caller holds the lock"""
+        path = log_filename(self.filename)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, self.generation))
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = open(path, 'ab')
+
+    def record(self, state: int, index: int, value: float, num_actions: int):
+        """Queue a Q-value write for the next flush"""
+        payload = Q_RECORD.pack(state.to_bytes(KEY_BYTES, 'big'), num_actions, index, value)
+        with self.lock:
+            self.buffer += RECORD_HEADER.pack(RECORD_Q_VALUE, Q_RECORD.size)
+            self.buffer += payload
+            self.dirty = True
+
+    def touch_metrics(self):
+        """Note that the agent's metrics changed so the next flush logs them"""
+        self.metrics_changed = True
+
+    def flush(self):
+        """Write buffered records plus the current metrics to the log and fsync it"""
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        """Flush while already holding the lock"""
+        if not (self.buffer or self.metrics_changed) or self.log_file is None:
+            return
+        self.metrics_changed = False
+        start = time.perf_counter()
+        metrics = json.dumps({'metrics': self.agent.learning_metrics, 'epsilon': self.agent.epsilon}).encode()
+        self.buffer += RECORD_HEADER.pack(RECORD_METRICS, len(metrics))
+        self.buffer += metrics
+        self.log_file.write(self.buffer)
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+        self.buffer = bytearray()
+        self.flush_seconds.observe(time.perf_counter() - start)
+
+    def write_snapshot(self, log_position: Tuple[int, int]):
+        """Write a snapshot of the agent tagged with the log position it is current up to"""
+        start = time.perf_counter()
+        with self.lock:
+            # A shallow copy is enough: later in-place value writes are all in the log
+            q_table = dict(self.agent.q_table)
+            metrics = dict(self.agent.learning_metrics)
+            epsilon = self.agent.epsilon
+        write_snapshot(self.filename, {
+            'q_table': q_table,
+            'metrics': metrics,
+            'epsilon': epsilon,
+            'log_position': log_position
+        })
+        self.snapshot_seconds.observe(time.perf_counter() - start)
+
+    def compact(self):
+        """Snapshot the agent and drop the log records the snapshot already covers"""
+        with self.lock:
+            self.flush_locked()
+            self.dirty = False
+            log_position = (self.generation, self.log_file.tell())
+        self.write_snapshot(log_position)
+        with self.lock:
+            self.flush_locked()
+            with open(log_filename(self.filename), 'rb') as f:
+                f.seek(log_position[1])
+                tail = f.read()
+            self.generation += 1
+            self.open_log(tail)
+
+    def run(self):
+        """Background loop: flush every flush_interval, compact every snapshot_interval"""
+        last_snapshot = time.monotonic()
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+            if self.dirty and time.monotonic() - last_snapshot >= self.snapshot_interval:
+                self.compact()
+                last_snapshot = time.monotonic()
+
+    def close(self):
+        """Stop the background thread and flush any buffered records"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
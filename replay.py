@@ -0,0 +1,119 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# State keys are up to 148 bits; each is stored as three little-endian 64-bit words
+KEY_WORDS = 3
+
+
+def key_to_words(key: int) -> np.ndarray:
+    """Split a packed state key into KEY_WORDS uint64 words"""
+    return np.frombuffer(key.to_bytes(8 * KEY_WORDS, 'little'), dtype=np.uint64)
+
+
+def words_to_key(words: np.ndarray) -> int:
+    """Join KEY_WORDS uint64 words back into a packed state key"""
+    return int.from_bytes(words.tobytes(), 'little')
+
+
+class PrioritizedReplayBuffer:
+    """Fixed-capacity store of Q-learning transitions sampled in proportion to their TD error.
+
+    Transitions (state key, action index, number of actions, reward, next
+    state key or terminal) live in preallocated NumPy arrays used as a ring
+    buffer, so memory is fixed at construction and the oldest transition is
+    overwritten once full. Priorities are kept in a sum-tree whose leaves
+    hold (|TD error| + epsilon) ** alpha. sample() draws one transition from
+    each of batch_size equal slices of the total priority and returns
+    importance-sampling weights (N * P(i)) ** -beta, normalised by their
+    maximum, to correct for the non-uniform sampling.
+    """
+
+    def __init__(self, capacity: int = 65536, alpha: float = 0.6, beta: float = 0.4, epsilon: float = 0.01,
+                 seed: Optional[int] = None):
+        self.capacity = 1 << max(0, capacity - 1).bit_length()  # the sum-tree wants a power of two
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros((self.capacity, KEY_WORDS), dtype=np.uint64)
+        self.next_states = np.zeros((self.capacity, KEY_WORDS), dtype=np.uint64)
+        self.indices = np.zeros(self.capacity, dtype=np.int8)
+        self.num_actions = np.zeros(self.capacity, dtype=np.int8)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.terminal = np.zeros(self.capacity, dtype=bool)
+        # tree[1] is the total; the leaves for slots 0..capacity-1 are tree[capacity:]
+        self.tree = np.zeros(2 * self.capacity)
+        self.max_priority = 1.0
+
+        self.position = 0
+        self.size = 0
+        self.added = 0
+        self.sampled = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, state: int, index: int, num_actions: int, reward: float, next_state: Optional[int]):
+        """Store a transition (next_state None when it ended the game) at the highest priority seen"""
+        slot = self.position
+        self.states[slot] = key_to_words(state)
+        self.indices[slot] = index
+        self.num_actions[slot] = num_actions
+        self.rewards[slot] = reward
+        self.terminal[slot] = next_state is None
+        if next_state is not None:
+            self.next_states[slot] = key_to_words(next_state)
+        self.set_priorities(np.array([slot]), np.array([self.max_priority]))
+        self.position = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.added += 1
+
+    def set_priorities(self, slots: np.ndarray, priorities: np.ndarray):
+        """Write leaf priorities and update their ancestors one tree level at a time"""
+        nodes = slots + self.capacity
+        self.tree[nodes] = priorities
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def sample(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw (slots, importance-sampling weights) for a minibatch; stratified by priority mass"""
+        total = self.tree[1]
+        bounds = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        nodes = np.ones(batch_size, dtype=np.intp)
+        while nodes[0] < self.capacity:
+            left = self.tree[2 * nodes]
+            right = bounds >= left
+            bounds -= left * right
+            nodes = 2 * nodes + right
+        slots = np.minimum(nodes - self.capacity, self.size - 1)  # rounding can step past the last slot
+        probabilities = self.tree[slots + self.capacity] / total
+        weights = (self.size * probabilities) ** -self.beta
+        self.sampled += batch_size
+        return slots, weights / weights.max()
+
+    def update_priorities(self, slots: np.ndarray, td_errors: np.ndarray):
+        """Reprioritise sampled transitions by their new absolute TD errors"""
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.set_priorities(slots, priorities)
+
+    def transition(self, slot: int) -> Tuple[int, int, int, float, Optional[int]]:
+        """(state, index, num_actions, reward, next_state or None) stored in a slot"""
+        next_state = None if self.terminal[slot] else words_to_key(self.next_states[slot])
+        return (words_to_key(self.states[slot]), int(self.indices[slot]), int(self.num_actions[slot]),
+                float(self.rewards[slot]), next_state)
+
+    def get_metrics(self) -> Dict:
+        """Fill level and traffic counters"""
+        return {
+            'size': self.size,
+            'capacity': self.capacity,
+            'added': self.added,
+            'sampled': self.sampled,
+            'total_priority': float(self.tree[1]),
+            'bytes': sum(array.nbytes for array in (self.states, self.next_states, self.indices,
+                                                     self.num_actions, self.rewards, self.terminal, self.tree)),
+        }
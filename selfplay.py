@@ -0,0 +1,189 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from engine import Board, move_to_action
+from medium import QLearningAgent
+from replay import PrioritizedReplayBuffer
+
+# An opponent policy picks a move index for a board; None means the agent plays both sides
+Policy = Callable[[Board], int]
+
+
+def random_policy(board: Board) -> int:
+    """Pick a uniformly random legal move"""
+    return random.choice(board.legal_moves())
+
+
+OPPONENTS: Dict[str, Optional[Policy]] = {
+    'self': None,
+    'random': random_policy,
+}
+
+# Per-process state of pool workers, set up by init_worker
+worker_agent = None
+worker_model = None
+worker_model_mtime = 0.0
+
+
+def play_game(agent: QLearningAgent, opponent: Optional[Policy],
+              agent_player: int) -> Tuple[List[Tuple[List[Tuple[int, int, int]], List[float]]], int]:
+    """Play one game and return ([(entries, rewards)] for each side the agent played, winner index)"""
+    board = Board()
+    entries = ([], [])
+    while True:
+        moves = board.legal_moves()
+        if not moves:
+            break
+        player = board.player
+        if opponent is None or player == agent_player:
+            move = agent.choose_move(board)
+            entries[player].append(agent.action_index(board, move_to_action(move)))
+        else:
+            move = opponent(board)
+        board.play(move)
+
+    trajectories = []
+    for player in (0, 1):
+        if entries[player]:
+            rewards = [0.0] * len(entries[player])
+            rewards[-1] = 0.0 if board.winner < 0 else (1.0 if board.winner == player else -1.0)
+            trajectories.append((entries[player], rewards))
+    return trajectories, board.winner
+
+
+def model_mtime(model: str) -> float:
+    """Get the modification time of a model file, 0 if it does not exist"""
+    return os.path.getmtime(model) if os.path.exists(model) else 0.0
+
+
+def init_worker(model: str, epsilon: float):
+    """Load the model once per worker process"""
+    global worker_agent, worker_model, worker_model_mtime
+    random.seed(os.getpid() ^ time.time_ns())
+    worker_model = model
+    worker_model_mtime = model_mtime(model)
+    worker_agent = QLearningAgent(epsilon=epsilon)
+    worker_agent.load_model(model)
+    worker_agent.epsilon = epsilon
+
+
+def play_games(task: Tuple[int, str]) -> Tuple[int, List[Tuple[List[Tuple[int, int, int]], List[float]]], List[float]]:
+    """Worker task: play a batch of games, learning locally, and return (games, trajectories, results).
+
+    results holds each game's final reward for the side given by game % 2,
+    so the coordinator counts every game once, even when the agent played
+    both sides.
+    """
+    global worker_model_mtime
+    num_games, opponent_name = task
+    if model_mtime(worker_model) > worker_model_mtime:
+        # The coordinator wrote a newer checkpoint; pick up its merged table
+        epsilon = worker_agent.epsilon
+        worker_model_mtime = model_mtime(worker_model)
+        worker_agent.load_model(worker_model)
+        worker_agent.epsilon = epsilon
+
+    opponent = OPPONENTS[opponent_name]
+    trajectories = []
+    results = []
+    for game in range(num_games):
+        agent_player = game % 2
+        game_trajectories, winner = play_game(worker_agent, opponent, agent_player)
+        # Local learning only; the coordinator keeps the metrics and epsilon
+        for entries, rewards in game_trajectories:
+            worker_agent.update_entries(entries, rewards, track=False)
+        trajectories.extend(game_trajectories)
+        results.append(0.0 if winner < 0 else (1.0 if winner == agent_player else -1.0))
+    return num_games, trajectories, results
+
+
+def train(agent: QLearningAgent, model: str, games: int, workers: int, opponent: str = 'self',
+          batch_size: int = 50, checkpoint_every: int = 20, save: bool = True, verbose: bool = True,
+          replay_batches: int = 0) -> float:
+    """Run self-play across a worker pool, merge trajectories into agent and return games per second.
+
+    Each game is counted once in agent's metrics and agent.epsilon is left
+    as given, so the saved model keeps the exploration rate it was run with.
+
+    If agent has a replay buffer, replay_batches prioritised minibatches
+    are replayed after each merged worker task.
+    """
+    num_batches = (games + batch_size - 1) // batch_size
+    start = time.perf_counter()
+    played = 0
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(model, agent.epsilon)) as pool:
+        tasks = [(min(batch_size, games - i * batch_size), opponent) for i in range(num_batches)]
+        for i, (num_games, trajectories, results) in enumerate(pool.imap_unordered(play_games, tasks), 1):
+            for entries, rewards in trajectories:
+                agent.update_entries(entries, rewards, track=False)
+            # One metrics update per game; self-play runs at a fixed exploration rate
+            for reward in results:
+                agent.update_metrics(reward, True, decay_epsilon=False)
+            for _ in range(replay_batches):
+                agent.replay_minibatch()
+            played += num_games
+
+            if save and i % checkpoint_every == 0:
+                # Workers reload the model when they see the file change
+                agent.save_model(model)
+            if verbose and i % checkpoint_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{played} games, {played / elapsed:.1f} games/sec, {agent.count_states()} states")
+
+    if save:
+        agent.save_model(model)
+    return played / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-core self-play training for the Q-learning agent")
+    parser.add_argument('--model', default='q_learning_model.pkl')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--opponent', choices=sorted(OPPONENTS), default='self')
+    parser.add_argument('--epsilon', type=float, default=0.2, help="exploration rate used in self-play")
+    parser.add_argument('--batch-size', type=int, default=50, help="games per worker task")
+    parser.add_argument('--checkpoint-every', type=int, default=20, help="tasks between checkpoints")
+    parser.add_argument('--replay', type=int, default=0, metavar='CAPACITY',
+                        help="keep this many transitions for prioritised replay on the coordinator")
+    parser.add_argument('--replay-batches', type=int, default=8, help="replay minibatches per worker task")
+    parser.add_argument('--scaling', action='store_true',
+                        help="measure games/sec from 1 to --workers processes without saving")
+    args = parser.parse_args()
+
+    if args.scaling:
+        workers = 1
+        baseline = None
+        while True:
+            agent = QLearningAgent()
+            agent.load_model(args.model)
+            agent.epsilon = args.epsilon
+            rate = train(agent, args.model, args.games, workers, args.opponent, args.batch_size,
+                         args.checkpoint_every, save=False, verbose=False)
+            baseline = baseline or rate
+            print(f"{workers} workers: {rate:.1f} games/sec ({rate / baseline:.2f}x)")
+            if workers >= args.workers:
+                break
+            workers = min(workers * 2, args.workers)
+        return
+
+    agent = QLearningAgent()
+    agent.load_model(args.model)
+    agent.epsilon = args.epsilon
+    if args.replay:
+        agent.replay = PrioritizedReplayBuffer(args.replay)
+    states_before = agent.count_states()
+    start = time.perf_counter()
+    rate = train(agent, args.model, args.games, args.workers, args.opponent, args.batch_size, args.checkpoint_every,
+                 replay_batches=args.replay_batches if args.replay else 0)
+    print(f"Played {args.games} games in {time.perf_counter() - start:.1f}s ({rate:.1f} games/sec), "
+          f"discovered {agent.count_states() - states_before} states, {agent.count_states()} total")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from engine import Board
+
+
+class GameSession:
+    """One game kept in server memory: the engine position plus the AI's moves so far"""
+
+    def __init__(self, difficulty: str, ai_player: int):
+        self.id = secrets.token_urlsafe(12)
+        self.board = Board()
+        self.difficulty = difficulty
+        self.ai_player = ai_player
+        self.entries: List[Tuple[int, int, int]] = []  # (state, action index, actions) of the AI's moves
+        self.logged = False  # set once the finished game is in the game log
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+    def is_over(self) -> bool:
+        return self.board.winner >= 0 or self.board.is_full()
+
+
+class SessionStore:
+    """In-memory game sessions with idle eviction and a cap on how many are kept.
+
+    Sessions idle for longer than idle_timeout seconds are dropped whenever a
+    new one is created; if the store is still full, the least recently used
+    session makes room.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: 'OrderedDict[str, GameSession]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def create(self, difficulty: str, ai_player: int) -> GameSession:
+        """Start a new session, evicting idle or least recently used ones if needed"""
+        session = GameSession(difficulty, ai_player)
+        with self.lock:
+            self.evict_idle()
+            while len(self.sessions) >= self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+            self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[GameSession]:
+        """Look up a session and mark it as used, or None if it does not exist or expired"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_access > self.idle_timeout:
+                del self.sessions[session_id]
+                self.evicted += 1
+                return None
+            session.last_access = time.monotonic()
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        """Delete a session; returns whether it existed"""
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def evict_idle(self):
+        """Drop sessions idle for longer than idle_timeout; caller holds the lock"""
+        cutoff = time.monotonic() - self.idle_timeout
+        # Sessions are kept in access order, so the idle ones are at the front
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_access > cutoff:
+                break
+            del self.sessions[session.id]
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self.sessions)
@@ -0,0 +1,47 @@
+import pytest
+
+from alphabeta import MATE_BOUND, WIN_SCORE, AlphaBetaAgent, score_from_table, score_to_table
+from engine import Board, move_to_row_col
+
+
+def position(x_moves, o_moves, forced, current_player):
+    """Board with the given move indices marked"""
+    grid = [[''] * 9 for _ in range(9)]
+    for mark, moves in (('X', x_moves), ('O', o_moves)):
+        for move in moves:
+            row, col = move_to_row_col(move)
+            grid[row][col] = mark
+    return Board.from_lists(grid, None, forced, current_player)
+
+
+def mate_in_one():
+    """X owns sub-boards 0 and 1 and is sent to sub-board 2, where cell 2 wins the game (move 20)"""
+    return position([0, 1, 2, 9, 10, 11, 18, 19], [27, 31, 36, 40, 45, 49, 54, 58], (0, 2), 'X')
+
+
+@pytest.mark.parametrize('score', [0, 5, -5, MATE_BOUND - 1, -MATE_BOUND + 1, WIN_SCORE - 3, -WIN_SCORE + 7])
+def test_table_scores_round_trip(score):
+    for ply in range(0, 82, 9):
+        assert score_from_table(score_to_table(score, ply), ply) == score
+
+
+def test_table_scores_keep_the_distance_from_the_node():
+    # A win found 3 plies from the root at a node on ply 2 is a win 1 ply from that node
+    stored = score_to_table(WIN_SCORE - 3, 2)
+    assert stored == WIN_SCORE - 1
+    # Probed from a node on ply 5 it is a win 6 plies from the root
+    assert score_from_table(stored, 5) == WIN_SCORE - 6
+    assert score_from_table(score_to_table(-WIN_SCORE + 4, 3), 1) == -WIN_SCORE + 2
+    # Heuristic scores are stored as they are
+    assert score_to_table(MATE_BOUND - 1, 10) == MATE_BOUND - 1
+
+
+def test_finds_the_winning_move():
+    agent = AlphaBetaAgent(time_limit=1.0)
+    board = mate_in_one()
+    assert agent.choose_move(board) == 20
+    assert agent.last_stats['score'] == WIN_SCORE - 1
+    # A second search probes the entries of the first and still reports a win one ply away
+    assert agent.choose_move(board) == 20
+    assert agent.last_stats['score'] == WIN_SCORE - 1
+
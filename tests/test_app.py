@@ -0,0 +1,207 @@
+import random
+
+from engine import Board, move_to_action
+
+
+def play_session(client, difficulty, seed, ai_first=False):
+    """Play a whole session with random human moves, checking every reply against a local board"""
+    rng = random.Random(seed)
+    response = client.post('/api/games', json={'difficulty': difficulty, 'aiFirst': ai_first})
+    assert response.status_code == 200
+    body = response.json
+    board = Board()
+    if ai_first:
+        assert board.is_legal(body['move'])
+        board.play(body['move'])
+    else:
+        assert body['move'] is None
+    while board.legal_moves():
+        assert body['currentPlayer'] == 'XO'[board.player]
+        assert body['winner'] is None
+        move = rng.choice(board.legal_moves())
+        board.play(move)
+        response = client.post(f"/api/games/{body['gameId']}/move", json={'move': move})
+        assert response.status_code == 200
+        body = response.json
+        if body['move'] is not None:
+            assert board.is_legal(body['move'])
+            board.play(body['move'])
+        forced = board.forced if board.forced >= 0 and board.empty[board.forced] else None
+        assert body['forced'] == forced
+    assert body['winner'] == board.winner_mark()
+    assert body['draw'] == (board.winner < 0)
+    return body, board
+
+
+def test_session_plays_a_whole_game(client):
+    for seed, ai_first in enumerate((False, True)):
+        body, board = play_session(client, 'easy', seed, ai_first)
+        # The finished game takes no more moves
+        response = client.post(f"/api/games/{body['gameId']}/move", json={'move': 0})
+        assert response.status_code == 400
+
+
+def test_session_rejects_bad_moves(client):
+    game_id = client.post('/api/games', json={'difficulty': 'easy'}).json['gameId']
+    for move in (-1, 81, '40', None, 4.0):
+        assert client.post(f'/api/games/{game_id}/move', json={'move': move}).status_code == 400
+    reply = client.post(f'/api/games/{game_id}/move', json={'move': 40}).json['move']
+    # The reply sends the human to sub-board reply % 9; any other sub-board is illegal unless that one is full
+    outside = next(move for move in range(81) if move // 9 != reply % 9 and move not in (40, reply))
+    assert client.post(f'/api/games/{game_id}/move', json={'move': outside}).status_code == 400
+    assert client.post(f'/api/games/{game_id}/move', json={'move': reply}).status_code == 400
+
+
+def test_session_lifecycle(client):
+    assert client.post('/api/games', json={'difficulty': 'impossible'}).status_code == 400
+    assert client.post('/api/games/no-such-game/move', json={'move': 40}).status_code == 404
+    game_id = client.post('/api/games', json={'difficulty': 'easy'}).json['gameId']
+    assert client.delete(f'/api/games/{game_id}').json['status'] == 'success'
+    assert client.delete(f'/api/games/{game_id}').json['status'] == 'unknown'
+    assert client.post(f'/api/games/{game_id}/move', json={'move': 40}).status_code == 404
+
+
+def test_finished_medium_session_trains_the_agent(app_module, client):
+    app_module.actor.drain()
+    before = app_module.agent.learning_metrics['total_games']
+    play_session(client, 'medium', seed=5)
+    app_module.actor.drain()
+    assert app_module.agent.learning_metrics['total_games'] == before + 1
+
+
+def test_move_difficulties(client):
+    position = Board().to_state_string()
+    for difficulty in ('easy', 'medium', 'hard', 'expert'):
+        response = client.post('/api/move', json={'format': 'string', 'position': position, 'difficulty': difficulty})
+        assert response.status_code == 200
+        assert Board.from_state_string(response.json['position']).empty_total == 80
+    for difficulty in ('impossible', None, 3):
+        response = client.post('/api/move', json={'format': 'string', 'position': position, 'difficulty': difficulty})
+        assert response.status_code == 400
+
+
+def transition(board, move, wire_format='string'):
+    """/api/train body for playing move on board"""
+    after = board.copy()
+    after.play(move)
+    encode = (lambda b: str(b.key())) if wire_format == 'packed' else Board.to_state_string
+    return {'format': wire_format, 'state': encode(board), 'action': list(move_to_action(move)), 'reward': 0,
+            'nextState': encode(after), 'nextValidActions': [list(move_to_action(m)) for m in after.legal_moves()]}
+
+
+def test_train_validates_in_the_request_thread(app_module, client):
+    app_module.actor.drain()
+    applied = app_module.actor.applied
+    board = Board()
+    board.play(40)
+    good = transition(board, 36)
+    assert client.post('/api/train', json=good).status_code == 200
+    assert client.post('/api/train', json=transition(Board(), 40, 'packed')).status_code == 200
+    bad_bodies = [
+        dict(good, state='X' * 93),
+        dict(good, state=None),
+        dict(good, format='packed', state='12ab'),
+        dict(good, format='packed', state=str(3 ** 90 * 20)),
+        dict(good, format='lists'),
+        dict(good, action=[1, 1, 3, 0]),
+        dict(good, action=[1, 1]),
+        dict(good, action=[0, 0, 0, 0]),  # outside the forced sub-board: not legal in the state
+        dict(good, reward='1'),
+        dict(good, reward=None),
+        dict(good, nextValidActions=[[0, 0]]),
+        dict(good, nextValidActions='all'),
+        {key: value for key, value in good.items() if key != 'nextState'},
+    ]
+    for body in bad_bodies:
+        response = client.post('/api/train', json=body)
+        assert response.status_code == 400, body
+        assert response.json['status'] == 'error'
+    assert client.post('/api/train', json=[good]).status_code == 400
+    # Only the two valid transitions were queued
+    app_module.actor.drain()
+    assert app_module.actor.applied == applied + 2
+    assert app_module.actor.failed == 0
+
+
+def test_dropped_session_training_is_reported(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.actor, 'submit', lambda fn, *args: False)
+    body, board = play_session(client, 'medium', seed=6)
+    assert body['trainingDropped'] is True
+    perf = client.get('/api/perf').data.decode()
+    assert 'uttt_training_rejected' in perf
+
+
+def encode(board, wire_format):
+    """/api/move request fields for board in the given format"""
+    if wire_format == 'string':
+        return {'format': 'string', 'position': board.to_state_string()}
+    if wire_format == 'packed':
+        return {'format': 'packed', 'position': str(board.key())}
+    main_board, meta_board = board.to_lists('')
+    forced = None if board.forced < 0 else list(divmod(board.forced, 3))
+    return {'mainBoard': main_board, 'metaBoard': meta_board, 'lastMove': forced, 'currentPlayer': 'XO'[board.player]}
+
+
+def decode(body, wire_format, player):
+    """Board from an /api/move response in the given format"""
+    if wire_format == 'string':
+        return Board.from_state_string(body['position'])
+    if wire_format == 'packed':
+        return Board.from_key(int(body['position']))
+    return Board.from_lists(body['mainBoard'], body['metaBoard'], None, 'XO'[player])
+
+
+def test_move_encodings_agree(client):
+    rng = random.Random(7)
+    board = Board()
+    for _ in range(12):
+        board.play(rng.choice(board.legal_moves()))
+    for wire_format in ('lists', 'string', 'packed'):
+        response = client.post('/api/move', json=dict(encode(board, wire_format), difficulty='easy'))
+        assert response.status_code == 200
+        body = response.json
+        move = body['move']
+        move = (move['subBoardI'] * 3 + move['subBoardJ']) * 9 + move['subI'] * 3 + move['subJ']
+        assert board.is_legal(move)
+        after = board.copy()
+        after.play(move)
+        returned = decode(body, wire_format, after.player)
+        assert returned.masks == after.masks and returned.meta == after.meta
+        if wire_format != 'lists':
+            assert returned.key() == after.key()
+
+
+def test_move_rejects_malformed_positions(client):
+    board = Board()
+    board.play(40)
+    key = board.key()
+    lists = encode(board, 'lists')
+    bad_bodies = [
+        {'format': 'binary', 'position': str(key)},
+        {'format': 'packed', 'position': '-5'},
+        {'format': 'packed', 'position': str(3 ** 90 * 20)},
+        {'format': 'packed', 'position': str(10 ** 40)},
+        {'format': 'packed', 'position': 'abc'},
+        {'format': 'packed', 'position': None},
+        {'format': 'packed', 'position': 1.5},
+        {'format': 'packed', 'position': True},
+        {'format': 'packed', 'position': str(key - 1)},  # X to move with one X on the board
+        {'format': 'string', 'position': board.to_state_string()[:-1]},
+        {'format': 'string', 'position': 42},
+        dict(lists, mainBoard=lists['mainBoard'][:8]),
+        dict(lists, metaBoard=[['', '', '']] * 2),
+        dict(lists, lastMove=[5, 1]),
+        dict(lists, lastMove='11'),
+        dict(lists, currentPlayer='Z'),
+        dict(lists, mainBoard=[[['X']] * 9] * 9),
+    ]
+    for body in bad_bodies:
+        response = client.post('/api/move', json=body)
+        assert response.status_code == 400, body
+        assert response.json['status'] == 'error'
+    # A finished game has no move to make
+    finished = Board()
+    rng = random.Random(8)
+    while finished.legal_moves():
+        finished.play(rng.choice(finished.legal_moves()))
+    assert client.post('/api/move', json=encode(finished, 'packed')).status_code == 400
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from book import HEADER, OpeningBook, book_positions, write_book
+from engine import MOVE_SYM, Board
+
+
+def canonical_move(key):
+    """A fixed legal move of a canonical position, standing in for the searched one"""
+    moves = Board.from_key(key).legal_moves()
+    return moves[key % len(moves)]
+
+
+@pytest.fixture
+def book(tmp_path):
+    filename = str(tmp_path / 'book.bin')
+    write_book(filename, [(key, canonical_move(key)) for key in book_positions(3)], 3)
+    book = OpeningBook(filename)
+    yield book
+    book.close()
+
+
+def test_book_positions_are_sorted_canonical_keys():
+    assert book_positions(1) == [Board().canonical()[0]]
+    keys = book_positions(3)
+    assert keys == sorted(set(keys))
+    assert all(Board.from_key(key).canonical()[0] == key for key in keys)
+    # The 81 first moves fall into 15 classes under the eight symmetries
+    assert len(book_positions(2)) == 1 + 15
+    assert set(book_positions(2)) < set(keys)
+
+
+def test_find_bisects_to_every_record(tmp_path):
+    rng = random.Random(0)
+    records = sorted((rng.randrange(3 ** 90 * 20), rng.randrange(81)) for _ in range(1000))
+    filename = str(tmp_path / 'book.bin')
+    write_book(filename, records, 4)
+    book = OpeningBook(filename)
+    assert len(book) == len(records)
+    for key, move in records:
+        assert book.find(key) == move
+    keys = [key for key, _ in records]
+    for key in (0, keys[0] - 1, keys[-1] + 1, 3 ** 90 * 20 - 1) + tuple(k + 1 for k in keys[:50]):
+        if key not in keys:
+            assert book.find(key) is None
+    book.close()
+
+
+@pytest.mark.parametrize('records', [[], [(12345, 7)]])
+def test_find_in_tiny_books(tmp_path, records):
+    filename = str(tmp_path / 'book.bin')
+    write_book(filename, records, 2)
+    book = OpeningBook(filename)
+    assert book.find(12345) == (7 if records else None)
+    assert book.find(12344) is None and book.find(12346) is None
+    book.close()
+
+
+def test_lookup_maps_the_move_onto_every_orientation(book):
+    rng = random.Random(1)
+    checked = 0
+    while checked < 50:
+        board = Board()
+        for _ in range(rng.randrange(3)):
+            board.play(rng.choice(board.legal_moves()))
+        move = book.lookup(board)
+        assert board.is_legal(move)
+        if len({board.transform(g).key() for g in range(8)}) < 8:
+            continue  # a symmetric position has several equally good images of the move
+        for g in range(8):
+            # The same canonical record answers the symmetric position with the symmetric move
+            assert book.lookup(board.transform(g)) == MOVE_SYM[g][move]
+        checked += 1
+    assert book.misses == 0 and book.hits >= 50 * 9
+
+
+def test_lookup_is_out_of_book_past_the_plies(book):
+    board = Board()
+    for move in (40, 36, 4):
+        board.play(move)
+    assert book.lookup(board) is None
+    assert book.hits == book.misses == 0
+
+
+def test_rejects_bad_files(tmp_path):
+    filename = str(tmp_path / 'book.bin')
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(b'NOTABOOK', 1, 4, 0))
+    with pytest.raises(ValueError):
+        OpeningBook(filename)
+    write_book(filename, [(1, 2), (3, 4)], 4)
+    with open(filename, 'r+b') as f:
+        f.truncate(HEADER.size + 30)
+    with pytest.raises(ValueError):
+        OpeningBook(filename)
@@ -0,0 +1,190 @@
+import itertools
+import random
+
+import pytest
+
+from engine import MOVE_SYM, ROW_COL_MOVE, Board, legal_actions, move_to_action
+import medium
+
+# Row-major index (row * 9 + col) of each move index
+ROW_MAJOR = {ROW_COL_MOVE[r][c]: r * 9 + c for r in range(9) for c in range(9)}
+
+
+def list_winner(grid):
+    """The list-based 3x3 winner check the engine replaced, ' ' for none"""
+    for row in grid:
+        if row.count(row[0]) == 3 and row[0] != ' ':
+            return row[0]
+    for col in range(3):
+        if grid[0][col] == grid[1][col] == grid[2][col] != ' ':
+            return grid[0][col]
+    if grid[0][0] == grid[1][1] == grid[2][2] != ' ':
+        return grid[0][0]
+    if grid[0][2] == grid[1][1] == grid[2][0] != ' ':
+        return grid[0][2]
+    return ' '
+
+
+class ListGame:
+    """The list-based rules the engine replaced: 9x9 cells, a 3x3 meta-board and the active sub-board"""
+
+    def __init__(self):
+        self.board = [[' '] * 9 for _ in range(9)]
+        self.meta = [[' '] * 3 for _ in range(3)]
+        self.active = None
+        self.player = 'X'
+        self.winner = ' '
+
+    def sub_board(self, sub_row, sub_col):
+        return [self.board[sub_row * 3 + r][sub_col * 3:sub_col * 3 + 3] for r in range(3)]
+
+    def valid_moves(self):
+        if self.winner != ' ':
+            return []
+        moves = []
+        if self.active is not None:
+            sub_row, sub_col = self.active
+            moves = [(sub_row * 3 + r, sub_col * 3 + c) for r in range(3) for c in range(3)
+                     if self.board[sub_row * 3 + r][sub_col * 3 + c] == ' ']
+        if not moves:
+            moves = [(r, c) for r in range(9) for c in range(9) if self.board[r][c] == ' ']
+        return moves
+
+    def play(self, row, col):
+        self.board[row][col] = self.player
+        sub_row, sub_col = row // 3, col // 3
+        # The first line completed in a sub-board claims it for good
+        if self.meta[sub_row][sub_col] == ' ':
+            self.meta[sub_row][sub_col] = list_winner(self.sub_board(sub_row, sub_col))
+        self.winner = list_winner(self.meta)
+        self.active = (row % 3, col % 3)
+        self.player = 'O' if self.player == 'X' else 'X'
+
+
+def random_boards(games, seed=0):
+    """Every position of `games` random games"""
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = Board()
+        yield board.copy()
+        while board.legal_moves():
+            board.play(rng.choice(board.legal_moves()))
+            yield board.copy()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_legal_moves_and_winners_match_list_rules(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        game, board = ListGame(), Board()
+        while True:
+            expected = sorted(ROW_COL_MOVE[r][c] for r, c in game.valid_moves())
+            assert sorted(board.legal_moves()) == expected
+            last_move = game.active
+            actions = sorted(legal_actions(game.board, game.meta, last_move))
+            assert actions == sorted(move_to_action(move) for move in expected)
+            assert board.winner_mark() == (game.winner if game.winner != ' ' else None)
+            assert Board.from_lists(game.board, game.meta, last_move, game.player).key() == board.key()
+            if not expected:
+                break
+            move = rng.choice(expected)
+            board.play(move)
+            game.play(*divmod(ROW_MAJOR[move], 9))
+
+
+def test_check_winner_matches_list_rules():
+    for cells in itertools.product(' XO', repeat=9):
+        grid = [list(cells[r * 3:r * 3 + 3]) for r in range(3)]
+        expected = list_winner(grid)
+        if expected != ' ':
+            other = 'O' if expected == 'X' else 'X'
+            if list_winner([[other if cell == other else ' ' for cell in row] for row in grid]) != ' ':
+                continue  # both players have a line; the two checks may pick either
+        assert medium.check_winner(grid) == expected
+
+
+def test_undo_restores_the_position():
+    rng = random.Random(1)
+    board = Board()
+    keys = [board.key()]
+    while board.legal_moves():
+        board.play(rng.choice(board.legal_moves()))
+        keys.append(board.key())
+    while board.history:
+        keys.pop()
+        board.undo()
+        assert board.key() == keys[-1]
+
+
+def test_key_round_trip():
+    for board in random_boards(30):
+        restored = Board.from_key(board.key())
+        assert restored.key() == board.key()
+        assert restored.masks == board.masks
+        assert restored.meta == board.meta
+        assert restored.winner == board.winner
+        assert sorted(restored.legal_moves()) == sorted(board.legal_moves())
+
+
+def test_canonical_is_shared_by_all_symmetries():
+    for board in random_boards(20, seed=2):
+        key, sym = board.canonical()
+        canonical_moves = sorted(MOVE_SYM[sym][move] for move in board.legal_moves())
+        for g in range(8):
+            other = board.transform(g)
+            other_key, other_sym = other.canonical()
+            assert other_key == key
+            assert sorted(MOVE_SYM[other_sym][move] for move in other.legal_moves()) == canonical_moves
+        # The canonical key decodes to a position in the same class
+        assert Board.from_key(key).canonical()[0] == key
+
+
+def test_canonical_cache_follows_play_and_undo():
+    board = Board()
+    board.play(40)
+    before = board.canonical()
+    board.play(36)
+    assert board.canonical() == board.copy().transform(0).canonical()
+    board.undo()
+    assert board.canonical() == before
+
+
+
+def test_state_string_round_trip():
+    for board in random_boards(20, seed=3):
+        for empty in (' ', '.'):
+            restored = Board.from_state_string(board.to_state_string(empty), empty)
+            assert restored.key() == board.key()
+
+
+@pytest.mark.parametrize('tail', ['', 'n', '12', '33X', '1,2,Z', '1;2;O', 'x1X', '1,2,OO'])
+def test_state_string_rejects_bad_tails(tail):
+    with pytest.raises(ValueError):
+        Board.from_state_string(' ' * 90 + tail)
+
+
+def test_state_string_rejects_bad_cells():
+    with pytest.raises(ValueError):
+        Board.from_state_string('Q' + ' ' * 89 + 'nnX')
+
+
+@pytest.mark.parametrize('key', [-1, 3 ** 90 * 20, 10 ** 50])
+def test_from_key_rejects_out_of_range_keys(key):
+    with pytest.raises(ValueError):
+        Board.from_key(key)
+
+
+def test_from_key_rejects_inconsistent_positions():
+    board = Board()
+    board.play(40)
+    x_only = board.key()
+    flipped = board.copy()
+    flipped.player = 0  # X to move again with one X mark on the board
+    with pytest.raises(ValueError):
+        Board.from_key(flipped.key())
+    # Two X marks and no O mark
+    grid = [[''] * 9 for _ in range(9)]
+    grid[0][0] = grid[4][4] = 'X'
+    with pytest.raises(ValueError):
+        Board.from_key(Board.from_lists(grid, None, None, 'O').key())
+    assert Board.from_key(x_only).key() == x_only
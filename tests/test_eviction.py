@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+
+from engine import Board, move_to_action
+from medium import QLearningAgent
+
+
+def train(agent, games, seed):
+    """Train agent on random games through update_entries, as the app's sessions do"""
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = Board()
+        entries = []
+        while board.legal_moves():
+            move = rng.choice(board.legal_moves())
+            if board.player == 0:
+                entries.append(agent.action_index(board, move_to_action(move)))
+            board.play(move)
+        rewards = [0.0] * len(entries)
+        rewards[-1] = 0.0 if board.winner < 0 else (1.0 if board.winner == 0 else -1.0)
+        agent.update_entries(entries, rewards)
+
+
+def test_table_stays_within_max_states():
+    agent = QLearningAgent(max_states=200)
+    train(agent, 40, seed=0)
+    assert len(agent.q_table) <= 200
+    assert agent.learning_metrics['evicted_states'] > 0
+    assert agent.usage.keys() == agent.q_table.keys()
+
+
+def test_table_stays_within_max_bytes():
+    agent = QLearningAgent(max_bytes=64 * 1024)
+    train(agent, 40, seed=1)
+    assert agent.learning_metrics['evicted_states'] > 0
+    assert len(agent.q_table) <= agent.capacity()
+    assert agent.approximate_bytes() + len(agent.usage) * 104 <= 64 * 1024 * 1.1
+
+
+def test_eviction_keeps_the_more_visited_states():
+    agent = QLearningAgent(max_states=64)
+    # States 0-7 are the least recently updated but have five visits each; 8-63 have one
+    for _ in range(5):
+        for state in range(8):
+            agent.learn(state, 0, 3, 1.0)
+    for state in range(8, 64):
+        agent.learn(state, 0, 3, 1.0)
+    assert agent.learning_metrics['evicted_states'] == 0
+    agent.learn(64, 0, 3, 1.0)
+    assert agent.learning_metrics['evicted_states'] > 0
+    assert all(state in agent.q_table for state in range(8))
+    assert 64 in agent.q_table
+    # The survivors had their visit counts halved and now count as recently used
+    assert all(agent.usage[state] == 2 for state in range(8))
+
+
+def test_evicted_states_fall_back_to_the_base_table():
+    base = {state: np.full(3, 0.05, dtype=np.float32) for state in range(1000, 1010)}
+    agent = QLearningAgent(max_states=32)
+    agent.attach_table(base)
+    # Copied on write and moved towards 0, so they lose the tie on visits to the states learned below
+    for state in base:
+        agent.learn(state, 0, 3, 0.0)
+    assert agent.shadowed_states == len(base)
+    for state in range(100):
+        agent.learn(state, 0, 3, 1.0)
+    evicted = [state for state in base if state not in agent.q_table]
+    assert evicted
+    for state in evicted:
+        np.testing.assert_array_equal(agent.lookup_q_values(state), base[state])
+    assert agent.shadowed_states == sum(1 for state in agent.q_table if state in base)
+    assert agent.count_states() == len(set(agent.q_table) | set(base))
+
+
+def test_loading_a_larger_model_evicts_down_to_the_cap(tmp_path):
+    filename = str(tmp_path / 'model.pkl')
+    agent = QLearningAgent()
+    train(agent, 20, seed=2)
+    agent.save_model(filename)
+    assert len(agent.q_table) > 100
+
+    bounded = QLearningAgent(max_states=100)
+    bounded.load_model(filename)
+    assert len(bounded.q_table) <= 100
+    assert bounded.learning_metrics['evicted_states'] == len(agent.q_table) - len(bounded.q_table)
+    for state, q_values in bounded.q_table.items():
+        np.testing.assert_array_equal(q_values, agent.q_table[state])
@@ -0,0 +1,86 @@
+import os
+import random
+
+import pytest
+
+from engine import Board
+from game_log import (DATA_FILE, DRAW, NO_PLAYER, UNKNOWN_DIFFICULTY, GameLog, decode_moves, encode_moves,
+                      iter_games)
+
+
+def random_game(rng):
+    """Move indices of a random finished game"""
+    board = Board()
+    moves = []
+    while board.legal_moves():
+        move = rng.choice(board.legal_moves())
+        board.play(move)
+        moves.append(move)
+    return moves
+
+
+def test_encode_decode_round_trip():
+    rng = random.Random(0)
+    for _ in range(50):
+        moves = random_game(rng)
+        codes, board = encode_moves(moves)
+        assert len(codes) == len(moves)
+        assert decode_moves(codes) == moves
+        assert board.legal_moves() == []
+
+
+def test_encode_rejects_illegal_moves():
+    with pytest.raises(ValueError):
+        encode_moves([40, 40])
+
+
+def test_append_and_replay(tmp_path):
+    directory = str(tmp_path)
+    rng = random.Random(1)
+    games = [(random_game(rng), i % 3, ('easy', 'medium', 'hard', 'expert', None)[i % 5]) for i in range(30)]
+    log = GameLog(directory, chunk_games=8)
+    for moves, ai_player, difficulty in games:
+        log.append(moves, ai_player, difficulty, timestamp=1000)
+    log.close()
+
+    records = list(iter_games(directory))
+    assert len(records) == len(games)
+    for record, (moves, ai_player, difficulty) in zip(records, games):
+        board = Board()
+        for move in moves:
+            board.play(move)
+        assert record.moves == moves
+        assert record.ai_player == ai_player
+        assert record.difficulty == (difficulty or UNKNOWN_DIFFICULTY)
+        assert record.winner == (board.winner if board.winner >= 0 else DRAW)
+        assert record.timestamp == 1000
+
+    # Reopening counts the stored games and seeds the rolling stats without the AI-less ones
+    log = GameLog(directory)
+    assert log.games == len(games)
+    recent = log.get_metrics()['recent']
+    assert sum(stats['games'] for stats in recent.values()) == sum(1 for game in games if game[1] != NO_PLAYER)
+    log.close()
+
+
+def test_append_rejects_unfinished_games(tmp_path):
+    log = GameLog(str(tmp_path))
+    with pytest.raises(ValueError):
+        log.append([40, 36])
+    log.close()
+
+
+def test_reopening_drops_a_torn_chunk(tmp_path):
+    directory = str(tmp_path)
+    rng = random.Random(2)
+    log = GameLog(directory, chunk_games=4)
+    for _ in range(8):
+        log.append(random_game(rng), 0, 'medium')
+    log.close()
+    with open(os.path.join(directory, DATA_FILE), 'ab') as f:
+        f.write(b'half a chunk')
+
+    log = GameLog(directory)
+    log.append(random_game(rng), 1, 'hard')
+    log.close()
+    assert len(list(iter_games(directory))) == 9
@@ -0,0 +1,76 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from mapped_table import MappedQTable, convert, write_table
+
+
+def random_table(size, seed):
+    rng = np.random.default_rng(seed)
+    return {int(rng.integers(1 << 62)) << 80 | int(rng.integers(1 << 62)):
+            rng.standard_normal(int(rng.integers(1, 82))).astype(np.float32) for _ in range(size)}
+
+
+def write_model(filename, q_table):
+    with open(filename, 'wb') as f:
+        pickle.dump({'q_table': q_table, 'metrics': {'wins': 0, 'losses': 0, 'draws': 0}, 'epsilon': 0.1}, f)
+
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / 'table.qtb')
+    q_table = random_table(1000, seed=0)
+    write_table(filename, q_table)
+
+    table = MappedQTable(filename, verify=True)
+    assert len(table) == len(q_table)
+    for state, q_values in q_table.items():
+        assert state in table
+        np.testing.assert_array_equal(table.get(state), q_values)
+    assert table.get(12345) is None
+    assert {state: q_values.tolist() for state, q_values in table.items()} == \
+        {state: q_values.tolist() for state, q_values in q_table.items()}
+    table.close()
+
+
+def test_empty_table(tmp_path):
+    filename = str(tmp_path / 'table.qtb')
+    write_table(filename, {})
+    table = MappedQTable(filename, verify=True)
+    assert len(table) == 0
+    assert table.get(1) is None
+    table.close()
+
+
+def test_rejects_corrupt_files(tmp_path):
+    filename = str(tmp_path / 'table.qtb')
+    write_table(filename, random_table(10, seed=1))
+    with open(filename, 'r+b') as f:
+        f.seek(-1, 2)
+        f.write(b'\x7f')
+    with pytest.raises(ValueError):
+        MappedQTable(filename, verify=True)
+    with open(filename, 'ab') as f:
+        f.write(b'\x00')
+    with pytest.raises(ValueError):
+        MappedQTable(filename)
+
+
+def test_convert_merges_the_existing_table(tmp_path):
+    model = str(tmp_path / 'model.pkl')
+    table_file = str(tmp_path / 'table.qtb')
+    first = random_table(50, seed=2)
+    write_model(model, first)
+    assert convert(model, table_file) == 50
+
+    # A second conversion after the reset keeps the first base and lets the model override it
+    second = random_table(20, seed=3)
+    overridden = next(iter(first))
+    second[overridden] = np.zeros(3, dtype=np.float32)
+    write_model(model, second)
+    assert convert(model, table_file) == 70
+
+    table = MappedQTable(table_file, verify=True)
+    for state, q_values in {**first, **second}.items():
+        np.testing.assert_array_equal(table.get(state), q_values)
+    table.close()
@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+
+from engine import Board, move_to_action
+from medium import QLearningAgent
+from persistence import ModelStore
+
+
+def play_and_learn(agent, games, seed):
+    """Train agent on random games through update_entries, as the app's sessions do"""
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = Board()
+        entries = []
+        while board.legal_moves():
+            move = rng.choice(board.legal_moves())
+            if board.player == 0:
+                entries.append(agent.action_index(board, move_to_action(move)))
+            board.play(move)
+        rewards = [0.0] * len(entries)
+        rewards[-1] = 0.0 if board.winner < 0 else (1.0 if board.winner == 0 else -1.0)
+        agent.update_entries(entries, rewards)
+
+
+def assert_same_agent(loaded, agent):
+    assert loaded.q_table.keys() == agent.q_table.keys()
+    for state, q_values in agent.q_table.items():
+        np.testing.assert_array_equal(loaded.q_table[state], q_values)
+    for name in ('total_games', 'wins', 'losses', 'draws'):
+        assert loaded.learning_metrics[name] == agent.learning_metrics[name]
+    assert loaded.epsilon == agent.epsilon
+
+
+def test_model_store_replays_the_log(tmp_path):
+    filename = str(tmp_path / 'model.pkl')
+    agent = QLearningAgent()
+    store = ModelStore(agent, filename, flush_interval=3600)
+    store.start()
+    play_and_learn(agent, 20, seed=0)
+    store.close()
+
+    # The snapshot is the empty starting one; everything comes from the log
+    loaded = QLearningAgent()
+    loaded.load_model(filename)
+    assert_same_agent(loaded, agent)
+
+
+def test_model_store_replays_the_log_after_compaction(tmp_path):
+    filename = str(tmp_path / 'model.pkl')
+    agent = QLearningAgent()
+    store = ModelStore(agent, filename, flush_interval=3600)
+    store.start()
+    play_and_learn(agent, 10, seed=1)
+    store.compact()
+    play_and_learn(agent, 10, seed=2)
+    store.close()
+
+    loaded = QLearningAgent()
+    loaded.load_model(filename)
+    assert_same_agent(loaded, agent)
+
+
+def test_model_store_ignores_a_torn_record(tmp_path):
+    filename = str(tmp_path / 'model.pkl')
+    agent = QLearningAgent()
+    store = ModelStore(agent, filename, flush_interval=3600)
+    store.start()
+    play_and_learn(agent, 5, seed=3)
+    store.close()
+    with open(filename + '.log', 'ab') as f:
+        f.write(b'\x01\xff\x00')
+
+    loaded = QLearningAgent()
+    loaded.load_model(filename)
+    assert_same_agent(loaded, agent)
+
+
+def test_save_and_load_model(tmp_path):
+    filename = str(tmp_path / 'model.pkl')
+    agent = QLearningAgent(epsilon=0.3)
+    play_and_learn(agent, 10, seed=4)
+    agent.save_model(filename)
+
+    loaded = QLearningAgent()
+    loaded.load_model(filename)
+    assert_same_agent(loaded, agent)
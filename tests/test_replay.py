@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from medium import QLearningAgent
+from replay import PrioritizedReplayBuffer, key_to_words, words_to_key
+
+
+def assert_sums(buffer):
+    """Every internal sum-tree node holds the sum of its children"""
+    tree = buffer.tree
+    for node in range(1, buffer.capacity):
+        assert tree[node] == pytest.approx(tree[2 * node] + tree[2 * node + 1])
+    assert tree[1] == pytest.approx(tree[buffer.capacity:].sum())
+
+
+@pytest.mark.parametrize('key', [0, 1, 3 ** 90 * 20 - 1, (1 << 148) - 12345])
+def test_key_words_round_trip(key):
+    assert words_to_key(key_to_words(key)) == key
+
+
+def test_capacity_rounds_up_to_a_power_of_two():
+    assert [PrioritizedReplayBuffer(capacity).capacity for capacity in (1, 2, 3, 100, 128)] == [1, 2, 4, 128, 128]
+
+
+def test_ring_buffer_keeps_the_newest_transitions():
+    buffer = PrioritizedReplayBuffer(4)
+    for n in range(6):
+        buffer.add(3 ** 90 + n, n, 9, float(n), None if n % 2 else 3 ** 85 * n)
+    assert len(buffer) == 4
+    assert buffer.added == 6
+    assert [buffer.transition(slot) for slot in range(4)] == [
+        (3 ** 90 + 4, 4, 9, 4.0, 3 ** 85 * 4),
+        (3 ** 90 + 5, 5, 9, 5.0, None),
+        (3 ** 90 + 2, 2, 9, 2.0, 3 ** 85 * 2),
+        (3 ** 90 + 3, 3, 9, 3.0, None),
+    ]
+    assert_sums(buffer)
+
+
+def test_sampling_follows_the_priorities():
+    buffer = PrioritizedReplayBuffer(8, alpha=1.0, beta=0.5, epsilon=0.0, seed=0)
+    for n in range(5):
+        buffer.add(n, 0, 1, 0.0, None)
+    slots = np.arange(5)
+    buffer.update_priorities(slots, np.array([1.0, 2.0, 3.0, 4.0, 0.0]))
+    assert_sums(buffer)
+    assert buffer.tree[1] == pytest.approx(10.0)
+
+    counts = np.zeros(8)
+    for _ in range(500):
+        sampled, weights = buffer.sample(64)
+        np.add.at(counts, sampled, 1)
+        assert weights.max() == pytest.approx(1.0)
+        # Weights fall with priority: (N * P(i)) ** -beta, normalised by the largest
+        expected = (np.array([1.0, 2.0, 3.0, 4.0])[sampled] / 10.0 * 5) ** -0.5
+        np.testing.assert_allclose(weights, expected / expected.max())
+    # A zero priority and the unused slots are never drawn
+    assert counts[4:].sum() == 0
+    np.testing.assert_allclose(counts[:4] / counts.sum(), [0.1, 0.2, 0.3, 0.4], atol=0.01)
+
+
+def test_new_transitions_get_the_highest_priority():
+    buffer = PrioritizedReplayBuffer(8, alpha=1.0, epsilon=0.0)
+    buffer.add(1, 0, 1, 0.0, None)
+    buffer.update_priorities(np.array([0]), np.array([5.0]))
+    buffer.add(2, 0, 1, 0.0, None)
+    assert buffer.tree[buffer.capacity + 1] == 5.0
+    assert_sums(buffer)
+
+
+def test_replay_minibatch_relearns_and_reprioritises():
+    agent = QLearningAgent()
+    agent.replay = PrioritizedReplayBuffer(16, seed=1)
+    state = 3 ** 80
+    agent.learn(state, 2, 9, 1.0)
+    agent.replay.add(state, 2, 9, 1.0, None)
+    before = float(agent.q_table[state][2])
+    assert agent.replay_minibatch(8) == 8
+    after = float(agent.q_table[state][2])
+    assert before < after < 1.0
+    # The stored priority is the TD error of the last replay step, between the first and the remaining one
+    priority = agent.replay.tree[agent.replay.capacity]
+    assert (1.0 - after + 0.01) ** 0.6 < priority < (1.0 - before + 0.01) ** 0.6 < agent.replay.max_priority
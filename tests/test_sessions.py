@@ -0,0 +1,51 @@
+import pytest
+
+import sessions
+from sessions import SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable replacement for the store's time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_create_get_remove(clock):
+    store = SessionStore()
+    session = store.create('hard', 1)
+    assert store.get(session.id) is session
+    assert (session.difficulty, session.ai_player, session.board.legal_moves()) == ('hard', 1, list(range(81)))
+    assert store.remove(session.id)
+    assert not store.remove(session.id)
+    assert store.get(session.id) is None
+    assert len(store) == 0
+
+
+def test_cap_evicts_the_least_recently_used(clock):
+    store = SessionStore(max_sessions=3)
+    first, second, third = (store.create('easy', 0) for _ in range(3))
+    clock[0] += 1
+    store.get(first.id)  # second is now the least recently used
+    fourth = store.create('easy', 0)
+    assert len(store) == 3
+    assert store.get(second.id) is None
+    assert all(store.get(session.id) is session for session in (first, third, fourth))
+    assert store.evicted == 1
+
+
+def test_idle_sessions_expire(clock):
+    store = SessionStore(idle_timeout=60)
+    idle, busy = store.create('easy', 0), store.create('easy', 0)
+    clock[0] += 50
+    assert store.get(busy.id) is busy
+    clock[0] += 20
+    # idle is past the timeout and goes on the next create; busy was used 20 s ago
+    store.create('easy', 0)
+    assert len(store) == 2
+    assert store.get(idle.id) is None
+    assert store.get(busy.id) is busy
+    clock[0] += 61
+    assert store.get(busy.id) is None
+    assert store.evicted == 2
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+import pytest
+
+import trainer
+from engine import Board, move_to_action
+from medium import QLearningAgent
+from trainer import SnapshotTable, TrainingActor
+
+
+def game_entries(agent, seed):
+    """(entries, rewards) of a random game from X's side, as a session collects them"""
+    rng = random.Random(seed)
+    board = Board()
+    entries = []
+    while board.legal_moves():
+        move = rng.choice(board.legal_moves())
+        if board.player == 0:
+            entries.append(agent.action_index(board, move_to_action(move)))
+        board.play(move)
+    rewards = [0.0] * len(entries)
+    rewards[-1] = 1.0 if board.winner == 0 else -1.0 if board.winner == 1 else 0.0
+    return entries, rewards
+
+
+def test_snapshot_table_overlays_the_base():
+    base = {1: np.zeros(2), 2: np.ones(2)}
+    table = SnapshotTable(base, {2: None, 3: np.full(2, 3.0), 1: np.full(2, 5.0)})
+    assert len(table) == 2
+    assert 2 not in table and table.get(2, 'gone') == 'gone'
+    assert table.get(1)[0] == 5.0 and table.get(3)[0] == 3.0
+    assert table.get(4) is None
+    assert 1 in base and base[1][0] == 0.0
+
+
+@pytest.mark.parametrize('min_overlay', [trainer.MIN_OVERLAY, 0])
+def test_actor_publishes_every_applied_job(monkeypatch, min_overlay):
+    # min_overlay 0 folds the overlay into a new base on every publish
+    monkeypatch.setattr(trainer, 'MIN_OVERLAY', min_overlay)
+    agent = QLearningAgent()
+    actor = TrainingActor(agent, batch_size=4)
+    actor.start()
+    for seed in range(10):
+        assert actor.submit(agent.update_entries, *game_entries(agent, seed))
+    actor.drain()
+    snapshot = actor.reader.q_table
+    published = {state: snapshot.get(state).copy() for state in agent.q_table}
+    assert len(snapshot) == len(agent.q_table)
+    for state, q_values in agent.q_table.items():
+        np.testing.assert_array_equal(snapshot.get(state), q_values)
+
+    # Later training publishes a new snapshot and leaves the old one as it was
+    for seed in range(10, 20):
+        actor.submit(agent.update_entries, *game_entries(agent, seed))
+    actor.close()
+    for state, q_values in published.items():
+        np.testing.assert_array_equal(snapshot.get(state), q_values)
+    for state, q_values in agent.q_table.items():
+        np.testing.assert_array_equal(actor.reader.q_table.get(state), q_values)
+    assert actor.applied == 20 and actor.failed == 0
+    assert agent.learning_metrics['total_games'] == 20
+
+
+def test_full_queue_rejects_jobs():
+    agent = QLearningAgent()
+    actor = TrainingActor(agent, max_queue=2, submit_timeout=0.01)
+    entries, rewards = game_entries(agent, 0)
+    assert actor.submit(agent.update_entries, entries, rewards)
+    assert actor.submit(agent.update_entries, entries, rewards)
+    # The writer has not started, so the queue stays full
+    assert not actor.submit(agent.update_entries, entries, rewards)
+    assert actor.get_metrics()['rejected'] == 1
+    actor.start()
+    actor.close()
+    assert actor.applied == 2
+
+
+def test_failed_job_does_not_stop_the_actor(capsys):
+    agent = QLearningAgent()
+    actor = TrainingActor(agent)
+    actor.start()
+    actor.submit(lambda: 1 / 0)
+    actor.submit(agent.update_entries, *game_entries(agent, 1))
+    actor.close()
+    assert (actor.failed, actor.applied) == (1, 1)
+    assert 'ZeroDivisionError' in capsys.readouterr().err
+    assert len(actor.reader.q_table) == len(agent.q_table) > 0
@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+from medium import QLearningAgent
+from perf import Histogram
+
+# Snapshot overlays are folded into a fresh base dict once they reach this size or 1/8 of the base
+MIN_OVERLAY = 1024
+MISSING = object()
+
+
+class SnapshotTable:
+    """Immutable view of a Q-table published to readers: a base dict plus an overlay of newer vectors.
+
+    Neither dict nor any vector in them is modified after publishing; the
+    writer replaces vectors instead of updating them in place.
+    """
+
+    __slots__ = ('base', 'overlay', 'size')
+
+    def __init__(self, base: Dict, overlay: Dict):
+        self.base = base
+        self.overlay = overlay
+        self.size = len(base) + sum((q_values is not None) - (state in base) for state, q_values in overlay.items())
+
+    def get(self, state: int, default=None):
+        q_values = self.overlay.get(state, MISSING)
+        if q_values is MISSING:
+            return self.base.get(state, default)
+        # None in the overlay marks a state evicted since the base was taken
+        return default if q_values is None else q_values
+
+    def __contains__(self, state: int) -> bool:
+        return self.get(state) is not None
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class TrainingActor:
+    """Single writer for a QLearningAgent's Q-table.
+
+    Training calls are queued by submit() and applied by one background
+    thread in micro-batches of up to batch_size. After each batch the thread
+    publishes a new SnapshotTable to `reader`, a QLearningAgent used for move
+    selection, by swapping one attribute, so readers never see a
+    half-applied batch and never take a lock. When the queue is full,
+    submit() waits up to submit_timeout and then rejects the job. If the
+    agent has a replay buffer, each batch is followed by replay_batches
+    prioritised replay minibatches.
+    """
+
+    def __init__(self, agent: QLearningAgent, max_queue: int = 1000, batch_size: int = 32,
+                 submit_timeout: float = 0.05, replay_batches: int = 1):
+        self.agent = agent
+        self.batch_size = batch_size
+        self.submit_timeout = submit_timeout
+        self.replay_batches = replay_batches
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+
+        agent.changed_states = set()
+        self.reader = QLearningAgent(agent.learning_rate, agent.discount_factor, agent.epsilon,
+                                     agent.epsilon_decay, agent.epsilon_min)
+        self.reader.base_table = agent.base_table
+        self.reader.q_table = SnapshotTable(dict(agent.q_table), {})
+
+        self.submitted = 0
+        self.applied = 0
+        self.rejected = 0
+        self.failed = 0
+        self.replayed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_lag = 0.0  # seconds from submit to publish of the newest job
+        self.job_seconds = Histogram('uttt_training_job_seconds', 'Time to apply one queued training job')
+
+    def start(self):
+        """Start the writer thread"""
+        self.thread = threading.Thread(target=self.run, name='training-actor', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Callable, *args) -> bool:
+        """Queue fn(*args) to run on the writer thread; False if the queue stayed full"""
+        try:
+            self.queue.put((fn, args, time.monotonic()), timeout=self.submit_timeout)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def run(self):
+        """Writer loop: take a micro-batch, apply it, publish a snapshot"""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for job in batch:
+                if job is None:
+                    stop = True
+                    continue
+                fn, args, _ = job
+                start = time.perf_counter()
+                try:
+                    fn(*args)
+                    self.applied += 1
+                    self.job_seconds.observe(time.perf_counter() - start)
+                except Exception:
+                    self.failed += 1
+                    traceback.print_exc()
+            if self.agent.replay is not None and any(job is not None for job in batch):
+                try:
+                    for _ in range(self.replay_batches):
+                        self.replayed += self.agent.replay_minibatch()
+                except Exception:
+                    self.failed += 1
+                    traceback.print_exc()
+            self.publish()
+            self.batches += 1
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self.last_lag = time.monotonic() - jobs[-1][2]
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def publish(self):
+        """Swap in a snapshot holding every change applied so far"""
+        agent = self.agent
+        changed, agent.changed_states = agent.changed_states, set()
+        self.reader.epsilon = agent.epsilon
+        if not changed:
+            return
+        snapshot = self.reader.q_table
+        overlay = dict(snapshot.overlay)
+        for state in changed:
+            overlay[state] = agent.q_table.get(state)  # None if evicted
+        if len(overlay) >= max(MIN_OVERLAY, len(snapshot.base) // 8):
+            # Vectors are never modified in place, so a shallow copy is a consistent snapshot
+            self.reader.q_table = SnapshotTable(dict(agent.q_table), {})
+        else:
+            self.reader.q_table = SnapshotTable(snapshot.base, overlay)
+
+    def drain(self):
+        """Block until every job submitted so far has been applied and published"""
+        self.queue.join()
+
+    def get_metrics(self) -> Dict:
+        """Queue depth and throughput counters"""
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_depth,
+            'queue_capacity': self.queue.maxsize,
+            'submitted': self.submitted,
+            'applied': self.applied,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'replayed': self.replayed,
+            'batches': self.batches,
+            'average_batch_size': self.applied / self.batches if self.batches else 0.0,
+            'publish_lag_ms': self.last_lag * 1000.0,
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """Apply everything still queued, then stop the writer thread"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None